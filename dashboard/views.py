@@ -17,7 +17,7 @@ def vendor_dashboard(request):
     if not request.user.is_vendor:
         return redirect('become_vendor')
 
-    products = Product.objects.filter(vendor=request.user)
+    products = Product.objects.filter(vendor=request.user).select_related('primary_image')
 
     # Search & filtering params
     search_query = request.GET.get('search', '')
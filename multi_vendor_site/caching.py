@@ -0,0 +1,212 @@
+"""
+One way to cache things, whatever settings.CACHE_BACKEND points at.
+
+Keys are namespaced and versioned:
+
+    HOME = Namespace('home', timeout=300)
+    HOME.get_or_set(('banners', 'desktop'), load_banners)
+    HOME.bump()     # every `home:` key is stale, in one write
+
+`get_or_set` keeps a cold or expiring key from being recomputed by every
+worker at once:
+
+* a missing key is computed by whoever takes its lock; the others wait
+  (up to LOCK_WAIT) for the result instead of all hitting the database
+* a present key is refreshed a little *before* it expires, by one request
+  chosen at random with a probability that rises as expiry gets closer and
+  with how long the value took to compute ("XFetch"), while everyone else
+  keeps getting the cached value
+
+Hits, misses and refreshes are counted per namespace and shared through
+the cache, so `manage.py cache_stats` sees every worker's numbers
+(locmem excepted: there each process only counts itself).
+
+The compute lock, the first write of a namespace version and the shared
+counters rely on cache.add() and cache.incr() being atomic. They are on
+Redis and, within one process, on locmem. They are not on the file
+backend, where both read and then write. So with CACHE_BACKEND = 'file' and
+several workers, two of them can occasionally compute the same value, a
+fresh namespace can start with a few extra misses, and the counters are
+approximate. Values are never wrong, only recomputed. Use Redis where that
+matters.
+"""
+import atexit
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.core.cache import cache
+
+
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 2.0
+LOCK_POLL = 0.05
+# Local counters are pushed to the shared ones this often.
+STATS_FLUSH_EVENTS = 100
+STATS_FLUSH_SECONDS = 10
+STATS = ('hits', 'misses', 'refreshes', 'waits')
+_NAMESPACES_KEY = 'cache_stats:namespaces'
+
+
+def _stats_key(namespace, stat):
+    return f'cache_stats:{namespace}:{stat}'
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.flushed_at = time.monotonic()
+
+    def count(self, namespace, stat):
+        with self.lock:
+            self.pending[namespace, stat] += 1
+            due = (
+                sum(self.pending.values()) >= STATS_FLUSH_EVENTS
+                or time.monotonic() - self.flushed_at >= STATS_FLUSH_SECONDS
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.flushed_at = time.monotonic()
+        if not pending:
+            return
+        names = {namespace for namespace, _ in pending}
+        known = cache.get(_NAMESPACES_KEY, set())
+        if not names <= known:
+            cache.set(_NAMESPACES_KEY, known | names, None)
+        for (namespace, stat), count in pending.items():
+            key = _stats_key(namespace, stat)
+            # add() then incr() so concurrent flushes from other workers aren't lost.
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                cache.set(key, count, None)
+
+
+_stats = _Stats()
+
+
+def flush_stats():
+    _stats.flush()
+
+
+# Short-lived processes (commands, shells) may never reach a flush threshold.
+atexit.register(flush_stats)
+
+
+def read_stats():
+    """{namespace: {'hits': n, 'misses': n, ...}} as counted by every worker."""
+    flush_stats()
+    names = sorted(cache.get(_NAMESPACES_KEY, set()))
+    keys = {_stats_key(name, stat): (name, stat) for name in names for stat in STATS}
+    values = cache.get_many(keys)
+    result = {name: dict.fromkeys(STATS, 0) for name in names}
+    for key, (name, stat) in keys.items():
+        result[name][stat] = values.get(key, 0)
+    return result
+
+
+def reset_stats():
+    with _stats.lock:
+        _stats.pending.clear()
+    names = cache.get(_NAMESPACES_KEY, set())
+    cache.delete_many([_stats_key(name, stat) for name in names for stat in STATS] + [_NAMESPACES_KEY])
+
+
+def _refresh_early(delta, expires_at, beta):
+    """XFetch: True, ever more likely as expiry nears, for values that took `delta` seconds to compute."""
+    if expires_at is None:
+        return False
+    return time.time() - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+class Namespace:
+    def __init__(self, name, timeout=300):
+        self.name = name
+        self.timeout = timeout
+        self.version_key = f'{name}:version'
+
+    def version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            # Random rather than a counter: a version lost to eviction must
+            # never come back and revive the entries it used to name.
+            cache.add(self.version_key, uuid.uuid4().hex[:12], None)
+            version = cache.get(self.version_key)
+        return version
+
+    def bump(self):
+        """Invalidate every key in the namespace. Old entries just expire."""
+        version = uuid.uuid4().hex[:12]
+        cache.set(self.version_key, version, None)
+        return version
+
+    def key(self, parts):
+        if not isinstance(parts, (tuple, list)):
+            parts = (parts,)
+        return ':'.join([self.name, self.version(), *map(str, parts)])
+
+    def get(self, parts, default=None):
+        entry = cache.get(self.key(parts))
+        _stats.count(self.name, 'misses' if entry is None else 'hits')
+        return default if entry is None else entry[0]
+
+    def set(self, parts, value, timeout=None):
+        self._store(self.key(parts), value, 0, self.timeout if timeout is None else timeout)
+
+    def delete(self, parts):
+        cache.delete(self.key(parts))
+
+    def get_or_set(self, parts, compute, timeout=None, beta=1.0):
+        """The cached value for `parts`, or compute() stored for `timeout` seconds (None: forever)."""
+        key = self.key(parts)
+        lock_key = f'{key}:lock'
+        timeout = self.timeout if timeout is None else timeout
+
+        entry = cache.get(key)
+        if entry is not None:
+            value, delta, expires_at = entry
+            # Refresh early only if nobody else already is.
+            if not _refresh_early(delta, expires_at, beta) or not cache.add(lock_key, 1, LOCK_TIMEOUT):
+                _stats.count(self.name, 'hits')
+                return value
+            _stats.count(self.name, 'refreshes')
+        elif cache.add(lock_key, 1, LOCK_TIMEOUT):
+            _stats.count(self.name, 'misses')
+        else:
+            _stats.count(self.name, 'waits')
+            entry = self._wait(key, lock_key)
+            if entry is not None:
+                return entry[0]
+            # The other worker is slow or died; compute it ourselves.
+
+        try:
+            started = time.monotonic()
+            value = compute()
+            self._store(key, value, time.monotonic() - started, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    def _wait(self, key, lock_key):
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+            if cache.get(lock_key) is None:
+                return None
+        return None
+
+    def _store(self, key, value, delta, timeout):
+        expires_at = None if timeout is None else time.time() + timeout
+        cache.set(key, (value, delta, expires_at), timeout)
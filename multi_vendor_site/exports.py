@@ -0,0 +1,215 @@
+"""
+Streaming exports of an import-export Resource, in flat memory.
+
+The admin's export builds the whole tablib Dataset before sending a byte.
+Here rows are produced as the queryset is read, `chunk_size` at a time in
+pk order (the prefetches the resource's filter_export() adds run once per
+chunk), and written out as they come:
+
+    for block in export_stream(ProductResource(), 'csv'):
+        output.write(block)
+
+CSV and JSONL are written line by line. XLSX is a zip file, so it is
+built in openpyxl's write-only mode in a temporary file and streamed from
+there; it needs openpyxl installed.
+"""
+import csv
+import json
+import tempfile
+
+from django.contrib import admin, messages
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+CHUNK_SIZE = 500
+# Output is sent in blocks of about this many bytes rather than per row.
+BLOCK_SIZE = 64 * 1024
+
+# A background export of part of a table keeps the selected ids in the
+# job's params; larger selections are refused (a whole table needs none).
+MAX_BACKGROUND_SELECTION = 10_000
+
+# What can be exported outside the admin (export_data, background jobs),
+# through the same resources as the admin exports.
+EXPORTS = {
+    'products': 'products.admin.ProductResource',
+    'variations': 'products.admin.ProductVariationResource',
+    'orders': 'orders.admin.EcommercecheckoutsResource',
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def available_formats():
+    return [fmt for fmt in CONTENT_TYPES if fmt != 'xlsx' or openpyxl is not None]
+
+
+def _instances(queryset, chunk_size, pks):
+    """
+    `queryset` in pk order, one short query (plus its prefetches) per
+    chunk. Keyset pages rather than one long-lived cursor: a long export
+    then never holds a read lock that writers (on SQLite) have to wait for.
+    """
+    if pks is not None:
+        # Only these rows, a chunk of ids per query: tens of thousands in
+        # one pk__in would overflow the database's parameter limit.
+        pks = sorted(pks)
+        for start in range(0, len(pks), chunk_size):
+            yield from queryset.filter(pk__in=pks[start:start + chunk_size]).order_by('pk')
+        return
+    last = None
+    while True:
+        page = queryset.order_by('pk')
+        if last is not None:
+            page = page.filter(pk__gt=last)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield from chunk
+        last = chunk[-1].pk
+
+
+def iter_rows(resource, queryset=None, chunk_size=CHUNK_SIZE, progress=None, pks=None):
+    """
+    The header row, then one row per object (only those in `pks`, if
+    given), reading `chunk_size` objects at a time; `progress(rows so far)`
+    is called after each chunk.
+    """
+    if queryset is None:
+        queryset = resource.get_queryset()
+    # Where resources add the select/prefetch_related their columns need.
+    queryset = resource.filter_export(queryset)
+    yield resource.get_export_headers()
+    count = 0
+    for count, instance in enumerate(_instances(queryset, chunk_size, pks), start=1):
+        yield resource.export_resource(instance)
+        if progress and count % chunk_size == 0:
+            progress(count)
+    if progress:
+        progress(count)
+
+
+def _blocks(parts):
+    block, size = [], 0
+    for part in parts:
+        block.append(part)
+        size += len(part)
+        if size >= BLOCK_SIZE:
+            yield ''.join(block)
+            block, size = [], 0
+    if block:
+        yield ''.join(block)
+
+
+class _Echo:
+    """A file for csv.writer that hands each line back instead of storing it."""
+    def write(self, value):
+        return value
+
+
+def _csv(rows):
+    writer = csv.writer(_Echo())
+    return _blocks(writer.writerow(row) for row in rows)
+
+
+def _jsonl(rows):
+    headers = next(rows)
+    return _blocks(
+        json.dumps(dict(zip(headers, row)), ensure_ascii=False, default=str) + '\n' for row in rows
+    )
+
+
+def _xlsx(rows):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in rows:
+        sheet.append(row)
+    with tempfile.TemporaryFile() as f:
+        workbook.save(f)
+        f.seek(0)
+        yield from iter(lambda: f.read(BLOCK_SIZE), b'')
+
+
+WRITERS = {'csv': _csv, 'jsonl': _jsonl, 'xlsx': _xlsx}
+
+
+def export_stream(resource, fmt, queryset=None, chunk_size=CHUNK_SIZE, progress=None, pks=None):
+    """`resource`'s export of `queryset` in `fmt`, as an iterator of str (bytes for xlsx) blocks."""
+    if fmt not in available_formats():
+        raise ValueError(f"Can't export {fmt!r}; available: {', '.join(available_formats())}.")
+    return WRITERS[fmt](iter_rows(resource, queryset, chunk_size, progress, pks))
+
+
+def streaming_export_response(resource, fmt, queryset=None, filename='export'):
+    response = StreamingHttpResponse(export_stream(resource, fmt, queryset), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}-{timezone.now():%Y%m%d-%H%M}.{fmt}"'
+    return response
+
+
+class StreamingExportMixin:
+    """
+    Admin actions that stream the selected rows (or, with "select all",
+    every filtered row) through the admin's resource_class, or queue them
+    as a background export job for `manage.py run_jobs`.
+    """
+    actions = ['stream_export_csv', 'stream_export_jsonl', 'stream_export_xlsx', 'export_in_background']
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        if openpyxl is None:
+            actions.pop('stream_export_xlsx', None)
+        return actions
+
+    def stream_export(self, queryset, fmt):
+        resource = self.resource_class()
+        # The resource's plain queryset: the changelist's annotations aren't exported.
+        queryset = resource.get_queryset().filter(pk__in=queryset.values('pk'))
+        return streaming_export_response(resource, fmt, queryset, filename=self.model._meta.model_name)
+
+    @admin.action(description="Stream export (CSV)")
+    def stream_export_csv(self, request, queryset):
+        return self.stream_export(queryset, 'csv')
+
+    @admin.action(description="Stream export (JSON lines)")
+    def stream_export_jsonl(self, request, queryset):
+        return self.stream_export(queryset, 'jsonl')
+
+    @admin.action(description="Stream export (Excel)")
+    def stream_export_xlsx(self, request, queryset):
+        return self.stream_export(queryset, 'xlsx')
+
+    @admin.action(description="Export in the background (CSV)")
+    def export_in_background(self, request, queryset):
+        from website.jobs import submit
+
+        resource_path = f'{self.resource_class.__module__}.{self.resource_class.__qualname__}'
+        what = next(name for name, path in EXPORTS.items() if path == resource_path)
+        selected = queryset.count()
+        if selected == self.model._default_manager.count():
+            # Every row ("select all" on an unfiltered list): no ids to store.
+            pks = None
+        elif selected > MAX_BACKGROUND_SELECTION:
+            self.message_user(request, (
+                f"{selected} rows selected; a background export takes at most {MAX_BACKGROUND_SELECTION} "
+                f"unless it is of every row. Narrow the filter or use a stream export."
+            ), messages.ERROR)
+            return
+        else:
+            pks = list(queryset.values_list('pk', flat=True))
+        job = submit('export', request.user, what=what, format='csv', pks=pks)
+        self.message_user(request, format_html(
+            'Export queued as <a href="{}">job #{}</a>; the file will be there once run_jobs has run it.',
+            reverse('admin:website_job_change', args=[job.pk]), job.pk,
+        ))
@@ -50,6 +50,7 @@ SITE_ID = 1
 
 
 MIDDLEWARE = [
+    'website.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,7 +64,8 @@ ROOT_URLCONF = 'multi_vendor_site.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's, timing renders for the request metrics (website/middleware.py).
+        'BACKEND': 'website.middleware.MetricsDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'], # new
         'APP_DIRS': True,
         'OPTIONS': {
@@ -88,6 +90,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take the write lock when a transaction starts, so concurrent
+        # checkouts queue up instead of failing with "database is locked".
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        # File-backed test database: in-memory SQLite can't be shared by
+        # the threads in the stock concurrency tests.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -161,16 +169,107 @@ STATICFILES_FINDERS = [
     'compressor.finders.CompressorFinder',
 ]
 
+# `manage.py build_assets` concatenates, minifies and content-hashes these
+# into STATIC_ROOT/bundles/ (plus a purged tailwind.css when the Tailwind
+# CLI is installed); templates use the bundles when this is on and a build
+# exists, and the separate source files otherwise.
+USE_ASSET_BUNDLES = not DEBUG
+ASSET_BUNDLES = {
+    'head.js': ['js/scroll.min.js', 'js/alpine.min.js', 'js/main.js'],
+    'site.js': ['js/swiper-bundle.min.js', 'js/cart.js', 'js/product-cart.js', 'js/site.js'],
+    'site.css': ['css/swiper-bundle.min.css', 'css/main.css'],
+}
+# Tailwind v3 standalone CLI or `npx tailwindcss`.
+TAILWIND_CLI = 'tailwindcss'
+
 MEDIA_URL = '/media/'
 
 # The absolute path to the directory where media files are stored
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# /static/ and /media/ are served by website/serving.py. Hashed file names
+# are cached for a year; other files for these many seconds.
+STATIC_MAX_AGE = 60 * 60
+MEDIA_MAX_AGE = 60 * 60 * 24
+# Behind nginx, set these to `internal` locations aliasing STATIC_ROOT and
+# MEDIA_ROOT (e.g. '/_protected/static/') and Django only answers with an
+# X-Accel-Redirect header; nginx sends the file.
+STATIC_ACCEL_REDIRECT = None
+MEDIA_ACCEL_REDIRECT = None
+
+# Cache shared by the project (multi_vendor_site/caching.py):
+# 'locmem' is per process, 'file' is shared by the workers on one machine,
+# 'redis' by every machine (needs the `redis` package and CACHE_LOCATION
+# set to e.g. 'redis://127.0.0.1:6379/1'). Tests always use locmem.
+# Only Redis makes add()/incr() atomic across processes. On 'file' the
+# stampede lock is best effort and `cache_stats` counts are approximate
+# (see caching.py).
+CACHE_BACKEND = 'file'
+CACHE_LOCATION = None
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'multi-vendor-site'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', os.path.join(BASE_DIR, '.cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': CACHE_LOCATION or CACHE_BACKENDS[CACHE_BACKEND][1],
+        'KEY_PREFIX': 'mvs',
+        'TIMEOUT': 300,
+    }
+}
+if CACHE_BACKEND != 'redis':
+    # Django's default of 300 would evict the category tree under catalog counts.
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 5000}
+TEST_RUNNER = 'multi_vendor_site.test_runner.LocalCacheTestRunner'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# How shop/search/category listings page. 'offset' (the default): numbered
+# ?page= links. 'keyset': previous/next links carrying a ?cursor=, so deep
+# pages are as cheap as the first (relevance-sorted search stays numbered).
+# A ?cursor= in the URL is honoured either way.
+CATALOG_PAGINATION = 'offset'
+
+# Per-request query/latency metrics (website/middleware.py), logged to the
+# `website.requests` logger. Server-Timing headers expose them in the
+# browser's network panel. Views over their query budget log a warning;
+# with QUERY_BUDGET_RAISE they fail instead, which the test runner turns on.
+SERVER_TIMING = DEBUG
+QUERY_BUDGET_RAISE = False
+QUERY_BUDGETS = {
+    'website:home': 10,
+    'website:shop': 12,
+    'website:search': 12,
+    'website:category_detail': 12,
+    'website:product_detail': 12,
+    'website:wishlist_products_api': 3,
+    'website:track_order': 3,
+}
+
+# Threads rendering product image thumbnails/WebP/AVIF copies after uploads
+# (see products/renditions.py).
+IMAGE_RENDITION_WORKERS = 2
+# Threads checking, hashing and copying image files named by imports
+# (see products/media_ingest.py).
+MEDIA_INGEST_WORKERS = 4
+
+# Order and contact emails are queued in the database (website/outbox.py)
+# and sent by `manage.py send_outbox`. A failed send is retried after
+# OUTBOX_RETRY_DELAY seconds, doubling each time, and marked failed after
+# OUTBOX_MAX_ATTEMPTS tries (8 tries span about two hours).
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_DELAY = 60
+
+# Uploads for and files made by background jobs (website/jobs.py,
+# `manage.py run_jobs`). Kept out of MEDIA_ROOT: order exports hold
+# customer details and must only be downloadable through the admin.
+JOB_FILES_ROOT = os.path.join(BASE_DIR, 'job_files')
+
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'mail.planetmavis.com'        # SMTP host from your hosting
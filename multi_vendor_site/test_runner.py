@@ -0,0 +1,27 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .caching import flush_stats
+
+
+class LocalCacheTestRunner(DiscoverRunner):
+    """
+    Runs the tests on a private local-memory cache, so they never read or
+    clear a shared one, and fails any request over its query budget.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_settings = override_settings(
+            CACHES={
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'},
+            },
+            QUERY_BUDGET_RAISE=True,
+        )
+        self._test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        # Counted cache stats go to the test cache now, not to the real one at exit.
+        flush_stats()
+        self._test_settings.disable()
+        super().teardown_test_environment(**kwargs)
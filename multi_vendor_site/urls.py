@@ -2,17 +2,20 @@ from django.contrib import admin
 from django.contrib.sitemaps.views import sitemap
 from django.urls import path, include, re_path
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns # new
-from django.views.static import serve
 from django.conf import settings
 from django.conf.urls.static import static
+from products.views import rendition
+from website.serving import serve_media, serve_static
 
 admin.site.site_header = "Planet Mavis Admin"
 admin.site.site_title = "Planet Mavis Admin"
 admin.site.index_title = "Welcome to Planet Mavis Administration"
 
 urlpatterns = [
-    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),#new
-    re_path(r'^static/(?P<path>.*)$', serve, {'document_root': settings.STATIC_ROOT}),#new
+    re_path(r'^media/(?P<path>renditions/.*)$', rendition),
+    # Cache headers, precompressed files, ranges, sendfile (website/serving.py)
+    re_path(r'^media/(?P<path>.*)$', serve_media),
+    re_path(r'^static/(?P<path>.*)$', serve_static),
     path('admin/', admin.site.urls),
     path('', include('website.urls')),
     path('accounts/', include('accounts.urls')),  #Include the website app URLs
@@ -1,9 +1,11 @@
 from django.contrib import admin
-from .models import Ecommercecheckouts
+from .inventory import OutOfStock, rereserve_stock
+from .models import Ecommercecheckouts, OrderItem
 from products.models import DeliveryCharge
 import json
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 from django import forms
+from django.db import transaction
 from import_export import resources, fields
 from import_export.admin import ImportExportModelAdmin
 from unfold.admin import ModelAdmin
@@ -11,6 +13,8 @@ from unfold.paginator import InfinitePaginator
 from import_export.widgets import JSONWidget
 from django.urls import reverse
 
+from multi_vendor_site.exports import StreamingExportMixin
+
 
 class EcommercecheckoutsResource(resources.ModelResource):
     ordered_items = fields.Field(attribute='items_json', column_name='Ordered Products')
@@ -31,25 +35,18 @@ class EcommercecheckoutsResource(resources.ModelResource):
         )
         export_order = fields
 
+    def filter_export(self, queryset, **kwargs):
+        return super().filter_export(queryset, **kwargs).select_related('delivery_charge').prefetch_related('items')
+
     def dehydrate_ordered_items(self, checkout):
-        try:
-            items = json.loads(checkout.items_json)
-            if not items:
-                return "No items"
-
-            item_strings = []
-            for item in items:
-                name = item.get('name', 'N/A')
-                price = item.get('price', 0)
-                quantity = item.get('quantity', 0)
-                variation_data = item.get('variation', {})
-                variation_display = ', '.join(f'{k}: {v}' for k, v in variation_data.items()) if variation_data else 'None'
-                item_strings.append(f"{name} (Qty: {quantity}, Price: {price}৳, Variation: {variation_display})")
-            return "; ".join(item_strings)
-        except json.JSONDecodeError:
-            return "Invalid items JSON"
-        except Exception as e:
-            return f"Error processing items: {e}"
+        # checkout.items is prefetched for the whole export, not queried per row.
+        items = checkout.items.all()
+        if not items:
+            return "No items"
+        return "; ".join(
+            f"{item.product_name} (Qty: {item.quantity}, Price: {item.unit_price}৳, Variation: {item.variation_display or 'None'})"
+            for item in items
+        )
 
 class EcommercecheckoutsForm(forms.ModelForm):
     class Meta:
@@ -59,6 +56,20 @@ class EcommercecheckoutsForm(forms.ModelForm):
             'items_json': forms.Textarea(attrs={'rows': 4, 'cols': 70}),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        # Reopening a cancelled order takes its stock again (orders/signals.py).
+        # Try it now and undo it, so stock that's gone shows on the form rather
+        # than failing the save. self.instance still has the stored status here.
+        if self.instance.pk and self.instance.status == 'cancelled' and cleaned_data.get('status') not in (None, 'cancelled'):
+            try:
+                with transaction.atomic():
+                    rereserve_stock(self.instance)
+                    transaction.set_rollback(True)
+            except OutOfStock as e:
+                self.add_error('status', f"Not enough stock to reopen this order: {e}")
+        return cleaned_data
+
     def clean_items_json(self):
         items_json = self.cleaned_data.get('items_json')
         if items_json:
@@ -69,7 +80,7 @@ class EcommercecheckoutsForm(forms.ModelForm):
         return items_json
 
 @admin.register(Ecommercecheckouts)
-class EcommercecheckoutsAdmin(ModelAdmin, ImportExportModelAdmin):
+class EcommercecheckoutsAdmin(StreamingExportMixin, ModelAdmin, ImportExportModelAdmin):
     paginator = InfinitePaginator
     show_full_result_count = False
     resource_class = EcommercecheckoutsResource
@@ -83,7 +94,7 @@ class EcommercecheckoutsAdmin(ModelAdmin, ImportExportModelAdmin):
         'delivery_charge_link',
         'status',
         'created_at',
-        'view_items_json_summary'
+        'items_summary'
     )
     list_filter = ('status', 'created_at', 'delivery_charge')
     search_fields = ('customer_name', 'customer_phone', 'customer_address')
@@ -112,6 +123,10 @@ class EcommercecheckoutsAdmin(ModelAdmin, ImportExportModelAdmin):
             }),
         )
     
+    def get_queryset(self, request):
+        # One query for every row's items on the changelist and in exports.
+        return super().get_queryset(request).select_related('delivery_charge').prefetch_related('items')
+
     def total_amount_display(self, obj):
         return f'{obj.total_amount} ৳'
     total_amount_display.short_description = "Calculated Total Amount"
@@ -130,40 +145,41 @@ class EcommercecheckoutsAdmin(ModelAdmin, ImportExportModelAdmin):
         return "N/A"
     delivery_charge_link.short_description = "Delivery Area"
 
-    def view_items_json_summary(self, obj):
-        try:
-            items = json.loads(obj.items_json)
-            if not items:
-                return "No items"
-            summary_parts = []
-            for item in items:
-                name = item.get('name', 'Product')
-                qty = item.get('quantity', 1)
-                summary_parts.append(f"{name} (x{qty})")
-            return ", ".join(summary_parts[:3]) + ("..." if len(summary_parts) > 3 else "")
-        except json.JSONDecodeError:
-            return format_html('<span style="color: red;">Invalid JSON</span>')
-        except Exception:
-            return "Error"
-    view_items_json_summary.short_description = "Products Summary"
-    view_items_json_summary.allow_tags = True
+    def items_summary(self, obj):
+        items = obj.items.all()
+        if not items:
+            return "No items"
+        summary_parts = [f"{item.product_name} (x{item.quantity})" for item in items]
+        return ", ".join(summary_parts[:3]) + ("..." if len(summary_parts) > 3 else "")
+    items_summary.short_description = "Products Summary"
 
 
     def view_items_table_detail(self, obj):
-        try:
-            items = json.loads(obj.items_json)
-            return self.create_items_table_html(items)
-        except json.JSONDecodeError:
-            return format_html('<p style="color: red;">Error: Invalid JSON format for items.</p>')
-        except Exception as e:
-            return format_html(f'<p style="color: red;">Error displaying items: {e}</p>')
+        items = obj.items.select_related('product__primary_image')
+        return self.create_items_table_html(items)
 
     view_items_table_detail.short_description = "Ordered Products"
-    view_items_table_detail.allow_tags = True
 
 
     def create_items_table_html(self, items):
-        table_html = """
+        cell = 'border: 1px solid #ddd; padding: 8px;'
+        rows = format_html_join('', """
+                <tr>
+                    <td style="{0}">{1}</td>
+                    <td style="{0}">
+                        <img src="{2}" width="50" height="50" style="object-fit: cover; border-radius: 4px;">
+                    </td>
+                    <td style="{0}">{3} ৳</td>
+                    <td style="{0}">{4}</td>
+                    <td style="{0}">{5}</td>
+                    <td style="{0}">{6} ৳</td>
+                </tr>
+            """, (
+            (cell, item.product_name, item.image_url, f'{item.unit_price:.2f}', item.quantity,
+             item.variation_display or 'N/A', f'{item.subtotal:.2f}')
+            for item in items
+        ))
+        return format_html("""
         <table style="width: 100%; border-collapse: collapse; margin-top: 10px;">
             <thead>
                 <tr style="background-color: #f2f2f2;">
@@ -175,39 +191,6 @@ class EcommercecheckoutsAdmin(ModelAdmin, ImportExportModelAdmin):
                     <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Subtotal</th>
                 </tr>
             </thead>
-            <tbody>
-        """
-
-        for item in items:
-            item_name = item.get("name", "N/A")
-            item_image_url = item.get("image", "")
-            item_price = item.get("price", 0)
-            item_quantity = item.get("quantity", 0)
-
-            if item_image_url and not item_image_url.startswith(('http://', 'https://', '/media/')):
-                item_image_url = f'/media/{item_image_url}'
-            elif not item_image_url:
-                item_image_url = '/static/icons/default-image.webp'
-
-            variation_data = item.get('variation', {})
-            variation_display = ', '.join(f'{key}: {value}' for key, value in variation_data.items() if value) if variation_data else 'N/A'
-
-            subtotal = item_price * item_quantity
-
-            table_html += f"""
-                <tr>
-                    <td style="border: 1px solid #ddd; padding: 8px;">{item_name}</td>
-                    <td style="border: 1px solid #ddd; padding: 8px;">
-                        <img src="{item_image_url}" width="50" height="50" style="object-fit: cover; border-radius: 4px;">
-                    </td>
-                    <td style="border: 1px solid #ddd; padding: 8px;">{item_price:.2f} ৳</td>
-                    <td style="border: 1px solid #ddd; padding: 8px;">{item_quantity}</td>
-                    <td style="border: 1px solid #ddd; padding: 8px;">{variation_display}</td>
-                    <td style="border: 1px solid #ddd; padding: 8px;">{subtotal:.2f} ৳</td>
-                </tr>
-            """
-        table_html += """
-            </tbody>
+            <tbody>{}</tbody>
         </table>
-        """
-        return format_html(table_html)
\ No newline at end of file
+        """, rows)
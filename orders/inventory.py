@@ -0,0 +1,143 @@
+"""
+Stock bookkeeping for orders.
+
+An order line takes stock from its variation when it has one, otherwise
+from the product's `stock_quantity` (simple products; NULL means the
+product isn't stock-tracked and stays NULL). Lines of a variable product
+without a matching variation don't touch stock.
+
+`reserve_stock` decrements everything an order needs with one conditional
+UPDATE per table:
+
+    UPDATE products_productvariation
+       SET stock = stock - CASE id WHEN 7 THEN 2 WHEN 9 THEN 1 END
+     WHERE id IN (7, 9) AND stock >= CASE id WHEN 7 THEN 2 WHEN 9 THEN 1 END
+
+so two checkouts racing for the last unit can't both win, whatever the
+isolation level. If any row is short, nothing is taken and OutOfStock
+lists the lines that can't be filled. `release_stock` puts a cancelled
+order's stock back, and `rereserve_stock` takes it again if the order is
+reopened.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from products.detail import invalidate_product_details
+from products.models import Product, ProductVariation
+
+from .models import OrderItem
+
+
+class OutOfStock(Exception):
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__('; '.join(
+            f"{failure['product']}: {failure['available']} left, {failure['requested']} wanted"
+            for failure in failures
+        ))
+
+
+def _stock_source(item):
+    """(model, pk, stock field) an order line draws from, or None if it doesn't."""
+    if item.variation_id:
+        return ProductVariation, item.variation_id, 'stock'
+    if item.product_id and item.product.product_type == Product.SIMPLE:
+        return Product, item.product_id, 'stock_quantity'
+    return None
+
+
+def _by_source(items):
+    wanted = defaultdict(lambda: defaultdict(int))
+    lines = defaultdict(list)
+    for item in items:
+        source = _stock_source(item)
+        if source is None:
+            continue
+        model, pk, field = source
+        wanted[model, field][pk] += item.quantity
+        lines[model, pk].append(item)
+    return wanted, lines
+
+
+def _per_row(quantities):
+    return Case(*[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()], output_field=IntegerField())
+
+
+def _take(model, field, quantities):
+    """Decrement every row that has enough; returns how many did."""
+    enough = Q(**{f'{field}__gte': _per_row(quantities)})
+    if model._meta.get_field(field).null:
+        # NULL stock_quantity means "not tracked": always enough.
+        enough |= Q(**{f'{field}__isnull': True})
+    return model.objects.filter(enough, pk__in=quantities).update(**{field: F(field) - _per_row(quantities)})
+
+
+def _give_back(model, field, quantities):
+    return model.objects.filter(pk__in=quantities).update(**{field: F(field) + _per_row(quantities)})
+
+
+def reserve_stock(items):
+    """
+    Take stock for `items` (OrderItems, saved or not) and mark them
+    `stock_reserved`. Raises OutOfStock, with nothing taken, if any
+    variation or product hasn't enough left.
+    """
+    wanted, lines = _by_source(items)
+    short = []
+    try:
+        with transaction.atomic():
+            for (model, field), quantities in wanted.items():
+                if _take(model, field, quantities) != len(quantities):
+                    short.append((model, field, quantities))
+            if short:
+                raise OutOfStock([])
+    except OutOfStock:
+        # Rolled back; read what is actually left to say which lines are short.
+        failures = []
+        for model, field, quantities in short:
+            available = dict(model.objects.filter(pk__in=quantities).values_list('pk', field))
+            for pk, quantity in quantities.items():
+                stock = available.get(pk, 0)
+                if stock is not None and stock < quantity:
+                    failures.extend({
+                        'product': item.product_name,
+                        'variation': item.variation_display,
+                        'requested': item.quantity,
+                        'available': max(stock, 0),
+                    } for item in lines[model, pk])
+        raise OutOfStock(failures)
+    for item in items:
+        item.stock_reserved = _stock_source(item) is not None
+    # Plain UPDATEs send no signals; cached detail pages show stock.
+    invalidate_product_details({item.product_id for item in items if item.stock_reserved})
+    return items
+
+
+def release_stock(order):
+    """Give back the stock `order` reserved. Safe to call twice."""
+    with transaction.atomic():
+        items = list(order.items.filter(stock_reserved=True).select_related('product').select_for_update(of=('self',)))
+        if not items:
+            return 0
+        OrderItem.objects.filter(pk__in=[item.pk for item in items]).update(stock_reserved=False)
+        wanted, _ = _by_source(items)
+        for (model, field), quantities in wanted.items():
+            _give_back(model, field, quantities)
+    invalidate_product_details({item.product_id for item in items})
+    return len(items)
+
+
+def rereserve_stock(order):
+    """
+    Take stock again for the lines of `order` that gave theirs back (a
+    cancelled order reopened). Raises OutOfStock, with nothing taken, if
+    it has been sold since.
+    """
+    with transaction.atomic():
+        items = list(order.items.filter(stock_reserved=False).select_related('product').select_for_update(of=('self',)))
+        reserve_stock(items)
+        reserved = [item.pk for item in items if item.stock_reserved]
+        OrderItem.objects.filter(pk__in=reserved).update(stock_reserved=True)
+    return len(reserved)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import Ecommercecheckouts
+from orders.phone import normalize_phone
+
+
+class Command(BaseCommand):
+    help = "Recompute Ecommercecheckouts.normalized_phone in batches (after imports or raw SQL edits)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        updated = 0
+        while True:
+            orders = list(
+                Ecommercecheckouts.objects.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'customer_phone', 'normalized_phone')[:batch_size]
+            )
+            if not orders:
+                break
+            last_pk = orders[-1].pk
+            changed = []
+            for order in orders:
+                normalized = normalize_phone(order.customer_phone)
+                if order.normalized_phone != normalized:
+                    order.normalized_phone = normalized
+                    changed.append(order)
+            Ecommercecheckouts.objects.bulk_update(changed, ['normalized_phone'])
+            updated += len(changed)
+        self.stdout.write(self.style.SUCCESS(f"Updated the normalized phone of {updated} orders."))
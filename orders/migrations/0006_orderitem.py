@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:49
+
+import html
+import json
+from decimal import Decimal, InvalidOperation
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _attr(value):
+    return str(value).strip()[:50] if value else ''
+
+
+def backfill_order_items(apps, schema_editor):
+    # Historical orders: keep the price the customer was charged, and link
+    # products/variations where they can still be found by name.
+    Ecommercecheckouts = apps.get_model('orders', 'Ecommercecheckouts')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('products', 'Product')
+    ProductVariation = apps.get_model('products', 'ProductVariation')
+
+    parsed = []
+    for order_id, items_json in Ecommercecheckouts.objects.values_list('pk', 'items_json').iterator():
+        try:
+            items = json.loads(items_json or '[]')
+        except json.JSONDecodeError:
+            continue
+        if isinstance(items, list):
+            items = [item for item in items if isinstance(item, dict)]
+            for item in items:
+                # The cart copied names out of HTML-escaped template output.
+                item['name'] = html.unescape(str(item.get('name') or ''))
+            parsed.append((order_id, items))
+
+    names = {item.get('name') for _, items in parsed for item in items if item.get('name')}
+    products = {}
+    for product in Product.objects.filter(name__in=names).order_by('pk'):
+        products.setdefault(product.name, product)
+    variations = {}
+    for variation in ProductVariation.objects.filter(product__in=products.values()):
+        key = (variation.product_id, _attr(variation.color), _attr(variation.size), _attr(variation.weight))
+        variations.setdefault(key, variation)
+
+    rows = []
+    for order_id, items in parsed:
+        for item in items:
+            attributes = item.get('variation') if isinstance(item.get('variation'), dict) else {}
+            color, size, weight = (_attr(attributes.get(field)) for field in ('color', 'size', 'weight'))
+            product = products.get(item.get('name'))
+            try:
+                unit_price = Decimal(str(item.get('price') or 0)).quantize(Decimal('0.01'))
+                quantity = max(int(item.get('quantity') or 1), 1)
+            except (InvalidOperation, TypeError, ValueError):
+                continue
+            rows.append(OrderItem(
+                order_id=order_id,
+                product=product,
+                variation=variations.get((product.pk, color, size, weight)) if product else None,
+                product_name=str(item.get('name') or 'Product')[:255],
+                color=color, size=size, weight=weight,
+                unit_price=unit_price, quantity=quantity,
+            ))
+    OrderItem.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_alter_ecommercecheckouts_bkash_trx_id'),
+        ('products', '0020_product_primary_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_name', models.CharField(max_length=255)),
+                ('color', models.CharField(blank=True, default='', max_length=50)),
+                ('size', models.CharField(blank=True, default='', max_length=50)),
+                ('weight', models.CharField(blank=True, default='', max_length=50)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.ecommercecheckouts')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='products.product')),
+                ('variation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='products.productvariation')),
+            ],
+            options={
+                'ordering': ['order', 'id'],
+            },
+        ),
+        migrations.RunPython(backfill_order_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_orderitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='stock_reserved',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
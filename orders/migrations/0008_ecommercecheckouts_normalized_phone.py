@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:56
+
+import re
+
+from django.db import migrations, models
+
+
+# orders.phone.normalize_phone as it was when this migration was written;
+# copied so later changes to it can't change what the migration does.
+_BD_MOBILE_RE = re.compile(r'^(?:00|\+)?(?:88)?0?(1[3-9]\d{8})$')
+_SEPARATORS_RE = re.compile(r'[\s\-().]')
+
+
+def normalize_phone(raw):
+    if not raw:
+        return ''
+    phone = _SEPARATORS_RE.sub('', str(raw))
+    match = _BD_MOBILE_RE.match(phone)
+    if match:
+        return f'+880{match[1]}'
+    return phone[:20]
+
+
+def fill_normalized_phone(apps, schema_editor):
+    # Large tables: `manage.py backfill_normalized_phone` does the same in batches.
+    Ecommercecheckouts = apps.get_model('orders', 'Ecommercecheckouts')
+    batch = []
+    for order in Ecommercecheckouts.objects.only('pk', 'customer_phone').iterator(chunk_size=2000):
+        order.normalized_phone = normalize_phone(order.customer_phone)
+        batch.append(order)
+        if len(batch) >= 2000:
+            Ecommercecheckouts.objects.bulk_update(batch, ['normalized_phone'])
+            batch = []
+    Ecommercecheckouts.objects.bulk_update(batch, ['normalized_phone'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_orderitem_stock_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ecommercecheckouts',
+            name='normalized_phone',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='ecommercecheckouts',
+            index=models.Index(fields=['normalized_phone', 'created_at'], name='order_phone_created_idx'),
+        ),
+        migrations.RunPython(fill_normalized_phone, migrations.RunPython.noop),
+    ]
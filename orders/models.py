@@ -1,6 +1,8 @@
 from django.db import models
 from products.models import *
 
+from .phone import normalize_phone
+
 # Create your models here.
 class Ecommercecheckouts(models.Model):
     items_json  = models.CharField(max_length=1000, default='')
@@ -18,5 +20,61 @@ class Ecommercecheckouts(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     ])
+    # customer_phone as +8801XXXXXXXXX whatever way it was typed; what
+    # track_order looks orders up by.
+    normalized_phone = models.CharField(max_length=20, blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['normalized_phone', 'created_at'], name='order_phone_created_idx'),
+            # Admin changelist: newest first, optionally by status.
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.normalized_phone = normalize_phone(self.customer_phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'customer_phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_phone'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Order {self.id} by {self.customer_name}"
+
+class OrderItem(models.Model):
+    """
+    One line of an order. Name, variation and unit price are copied at
+    checkout so the order reads the same after the product changes.
+    """
+    order = models.ForeignKey(Ecommercecheckouts, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_items')
+    variation = models.ForeignKey(ProductVariation, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_items')
+    product_name = models.CharField(max_length=255)
+    color = models.CharField(max_length=50, blank=True, default='')
+    size = models.CharField(max_length=50, blank=True, default='')
+    weight = models.CharField(max_length=50, blank=True, default='')
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField(default=1)
+    # Whether this line currently holds stock (see orders/inventory.py).
+    stock_reserved = models.BooleanField(default=False, editable=False)
+
+    class Meta:
+        ordering = ['order', 'id']
+
+    @property
+    def subtotal(self):
+        return self.unit_price * self.quantity
+
+    @property
+    def variation_display(self):
+        return ', '.join(f'{key}: {value}' for key, value in (('color', self.color), ('size', self.size), ('weight', self.weight)) if value)
+
+    @property
+    def image_url(self):
+        if self.product_id and self.product.primary_image_id and self.product.primary_image.image:
+            return self.product.primary_image.image.url
+        return '/static/icons/default-image.webp'
+
     def __str__(self):
-        return f"Order {self.id} by {self.customer_name}"
\ No newline at end of file
+        return f"{self.product_name} x{self.quantity}"
@@ -0,0 +1,22 @@
+import re
+
+
+# Bangladeshi mobile numbers: 01[3-9] followed by 8 digits, written with or
+# without the 88 country code, a leading + or 00, spaces, dashes or dots.
+_BD_MOBILE_RE = re.compile(r'^(?:00|\+)?(?:88)?0?(1[3-9]\d{8})$')
+_SEPARATORS_RE = re.compile(r'[\s\-().]')
+
+
+def normalize_phone(raw):
+    """
+    One spelling per phone number, for lookups: Bangladeshi mobiles become
+    E.164 (`01712-345678`, `8801712345678` and `+880 1712 345678` are all
+    `+8801712345678`); anything else is kept with separators stripped.
+    """
+    if not raw:
+        return ''
+    phone = _SEPARATORS_RE.sub('', str(raw))
+    match = _BD_MOBILE_RE.match(phone)
+    if match:
+        return f'+880{match[1]}'
+    return phone[:20]
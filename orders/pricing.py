@@ -0,0 +1,92 @@
+import html
+from decimal import Decimal
+
+from django.db.models import Q
+
+from products.models import Product, ProductVariation
+
+from .models import OrderItem
+
+
+VARIATION_FIELDS = ('color', 'size', 'weight')
+
+
+class CartError(ValueError):
+    pass
+
+
+def _variation_key(values):
+    return tuple((values.get(field) or '').strip() for field in VARIATION_FIELDS)
+
+
+def _match_variation(variations, wanted):
+    """The variation whose attributes match every attribute the cart line names."""
+    exact = [variation for key, variation in variations if key == wanted]
+    if exact:
+        return exact[0]
+    given = [(i, value) for i, value in enumerate(wanted) if value]
+    candidates = [variation for key, variation in variations if all(key[i] == value for i, value in given)]
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def price_cart(cart_items):
+    """
+    Turn the browser's cart lines into unsaved OrderItems priced from the
+    database, ignoring whatever price the client sent. Products are found by
+    `product_id` (or by name, for carts saved before ids were added) and all
+    products and variations are loaded in two queries however long the cart.
+    Raises CartError for malformed lines or products that can't be bought.
+    """
+    lines = []
+    for item in cart_items:
+        if not isinstance(item, dict):
+            raise CartError('Invalid item format in cart')
+        try:
+            quantity = int(item.get('quantity'))
+        except (TypeError, ValueError):
+            raise CartError('Invalid item format in cart')
+        if quantity < 1:
+            raise CartError('Invalid item format in cart')
+        variation = item.get('variation') or {}
+        if not isinstance(variation, dict):
+            raise CartError('Invalid item format in cart')
+        product_id = item.get('product_id')
+        try:
+            product_id = int(product_id) if product_id not in (None, '') else None
+        except (TypeError, ValueError):
+            raise CartError('Invalid item format in cart')
+        if product_id is None and not item.get('name'):
+            raise CartError('Invalid item format in cart')
+        # Names come from HTML-escaped template output (Men&#x27;s ...).
+        name = html.unescape(str(item.get('name') or ''))
+        lines.append((product_id, name, _variation_key(variation), quantity))
+
+    ids = {product_id for product_id, _, _, _ in lines if product_id is not None}
+    names = {name for product_id, name, _, _ in lines if product_id is None}
+    products = Product.objects.filter(is_active=True).filter(Q(pk__in=ids) | Q(name__in=names))
+    by_id, by_name = {}, {}
+    for product in products:
+        by_id[product.pk] = product
+        by_name.setdefault(product.name, product)
+
+    variations = {}
+    for variation in ProductVariation.objects.filter(product_id__in=by_id):
+        key = _variation_key({field: getattr(variation, field) for field in VARIATION_FIELDS})
+        variations.setdefault(variation.product_id, []).append((key, variation))
+
+    order_items = []
+    for product_id, name, wanted, quantity in lines:
+        product = by_id.get(product_id) if product_id is not None else by_name.get(name)
+        if product is None:
+            raise CartError(f'{name or "A product in your cart"} is no longer available')
+        variation = _match_variation(variations.get(product.pk, []), wanted)
+        unit_price = variation.price if variation is not None and variation.price is not None else product.get_display_price()
+        if unit_price is None:
+            raise CartError(f'{product.name} is not available for purchase')
+        color, size, weight = _variation_key({field: getattr(variation, field) for field in VARIATION_FIELDS}) if variation else wanted
+        order_items.append(OrderItem(
+            product=product, variation=variation, product_name=product.name or '',
+            color=color, size=size, weight=weight,
+            unit_price=Decimal(unit_price), quantity=quantity,
+        ))
+    return order_items
@@ -0,0 +1,29 @@
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import receiver
+
+from .inventory import release_stock, rereserve_stock
+from .models import Ecommercecheckouts
+
+
+# Stock
+
+@receiver(pre_save, sender=Ecommercecheckouts)
+def remember_order_status(sender, instance, raw=False, **kwargs):
+    instance._status_before = None
+    if instance.pk and not raw:
+        instance._status_before = Ecommercecheckouts.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(pre_save, sender=Ecommercecheckouts)
+def rereserve_reopened_order_stock(sender, instance, raw=False, **kwargs):
+    # Before the status changes, so OutOfStock stops the save.
+    if not raw and instance._status_before == 'cancelled' and instance.status != 'cancelled':
+        rereserve_stock(instance)
+
+
+@receiver(post_save, sender=Ecommercecheckouts)
+def release_cancelled_order_stock(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    if instance.status == 'cancelled' and instance._status_before != 'cancelled':
+        release_stock(instance)
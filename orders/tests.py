@@ -1,3 +1,275 @@
-from django.test import TestCase
+import json
+import threading
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from products.models import DeliveryCharge, Product, ProductVariation
+from .inventory import OutOfStock, release_stock, reserve_stock
+from .models import Ecommercecheckouts, OrderItem
+from .phone import normalize_phone
+from .pricing import CartError, price_cart
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.zone = DeliveryCharge.objects.create(zone='Dhaka', charge=60)
+        cls.shirt = Product.objects.create(name="Men's Shirt", regular_price=1200, sale_price=1000)
+        cls.gown = Product.objects.create(name='Gown', regular_price=3000, product_type=Product.VARIABLE)
+        cls.small_gown = ProductVariation.objects.create(product=cls.gown, color='Black', size='S', price=2500, stock=3)
+        ProductVariation.objects.create(product=cls.gown, color='Black', size='M', price=2700, stock=3)
+
+    def checkout(self, cart):
+        return self.client.post(reverse('website:checkout_ecommerce'), {
+            'cart_items': json.dumps(cart),
+            'delivery_zone': 'Dhaka',
+            'customer_name': 'Rahim',
+            'customer_phone_number': '01711000000',
+            'customer_address': 'Dhaka',
+            'payment_method': 'Cash on Delivery',
+        })
+
+    def test_prices_come_from_the_database(self):
+        response = self.checkout([
+            {'product_id': self.shirt.pk, 'name': "Men's Shirt", 'price': 1, 'quantity': 2, 'variation': {}},
+            {'product_id': self.gown.pk, 'name': 'Gown', 'price': 1, 'quantity': 1, 'variation': {'color': 'Black', 'size': 'S'}},
+        ])
+        order = Ecommercecheckouts.objects.get()
+        self.assertRedirects(response, f'/order_success/?orderid={order.pk}', fetch_redirect_response=False)
+        self.assertEqual(order.total_amount, 2 * 1000 + 2500 + 60)
+
+        shirt_line, gown_line = order.items.all()
+        self.assertEqual((shirt_line.product, shirt_line.unit_price, shirt_line.quantity), (self.shirt, 1000, 2))
+        self.assertEqual((gown_line.variation, gown_line.unit_price), (self.small_gown, 2500))
+        self.assertEqual(gown_line.variation_display, 'color: Black, size: S')
+        self.assertEqual(json.loads(order.items_json)[0]['price'], 1000)
+
+        # The notification is queued with the order and sent by the worker.
+        self.assertEqual(mail.outbox, [])
+        call_command('send_outbox', stdout=StringIO())
+        self.assertIn('2500', mail.outbox[0].body)
+
+        response = self.client.get(f'/order_success/?orderid={order.pk}')
+        self.assertContains(response, 'alt="Gown"')
+
+    def test_rejects_unknown_products(self):
+        response = self.checkout([{'product_id': 999, 'name': 'Ghost', 'price': 1, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        response = self.checkout([{'product_id': self.shirt.pk, 'quantity': 0}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Ecommercecheckouts.objects.exists())
+
+    def test_carts_saved_before_product_ids(self):
+        # Older carts only carry the (HTML-escaped) name.
+        [line] = price_cart([{'name': 'Men&#x27;s Shirt', 'price': 5, 'quantity': 1, 'variation': {}}])
+        self.assertEqual((line.product, line.unit_price), (self.shirt, 1000))
+        with self.assertRaises(CartError):
+            price_cart([{'name': 'Gone', 'quantity': 1}])
+
+    def test_pricing_cost_does_not_grow_with_the_cart(self):
+        cart = [{'product_id': self.gown.pk, 'quantity': 1, 'variation': {'color': 'Black', 'size': size}} for size in 'SM']
+        with self.assertNumQueries(2):
+            price_cart(cart[:1])
+        with self.assertNumQueries(2):
+            price_cart(cart * 10 + [{'product_id': self.shirt.pk, 'quantity': 1}])
+
+    def test_admin_changelist_does_not_parse_per_row(self):
+        for _ in range(5):
+            self.checkout([{'product_id': self.shirt.pk, 'quantity': 1}, {'product_id': self.gown.pk, 'quantity': 1}])
+        self.assertEqual(OrderItem.objects.count(), 10)
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+        url = reverse('admin:orders_ecommercecheckouts_changelist')
+        self.client.get(url)
+        # Session, user, delivery-zone filter, the page of orders, and all their items.
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertContains(response, 'Gown (x1)', count=5)
+
+
+class StockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        DeliveryCharge.objects.create(zone='Dhaka', charge=60)
+        cls.shirt = Product.objects.create(name='Shirt', regular_price=1000, stock_quantity=5)
+        cls.untracked = Product.objects.create(name='Gift card', regular_price=500, stock_quantity=None)
+        cls.gown = Product.objects.create(name='Gown', regular_price=3000, product_type=Product.VARIABLE)
+        cls.small_gown = ProductVariation.objects.create(product=cls.gown, size='S', price=2500, stock=2)
+
+    def checkout(self, cart):
+        return self.client.post(reverse('website:checkout_ecommerce'), {
+            'cart_items': json.dumps(cart),
+            'delivery_zone': 'Dhaka',
+            'customer_name': 'Rahim',
+            'customer_phone_number': '01711000000',
+            'customer_address': 'Dhaka',
+        })
+
+    def assertStock(self, shirt, small_gown):
+        self.shirt.refresh_from_db()
+        self.small_gown.refresh_from_db()
+        self.assertEqual((self.shirt.stock_quantity, self.small_gown.stock), (shirt, small_gown))
+
+    def test_checkout_takes_stock_and_cancelling_returns_it(self):
+        self.checkout([
+            {'product_id': self.shirt.pk, 'quantity': 3},
+            {'product_id': self.untracked.pk, 'quantity': 9},
+            {'product_id': self.gown.pk, 'quantity': 1, 'variation': {'size': 'S'}},
+            {'product_id': self.gown.pk, 'quantity': 1, 'variation': {'size': 'S'}},
+        ])
+        self.assertStock(2, 0)
+        order = Ecommercecheckouts.objects.get()
+        self.assertEqual([item.stock_reserved for item in order.items.all()], [True, True, True, True])
+
+        order.status = 'cancelled'
+        order.save()
+        self.assertStock(5, 2)
+        self.untracked.refresh_from_db()
+        self.assertIsNone(self.untracked.stock_quantity)
+        # Saving the cancelled order again doesn't give the stock back twice.
+        order.save()
+        self.assertEqual(release_stock(order), 0)
+        self.assertStock(5, 2)
+
+    def test_reopening_a_cancelled_order_takes_its_stock_again(self):
+        self.checkout([
+            {'product_id': self.shirt.pk, 'quantity': 3},
+            {'product_id': self.gown.pk, 'quantity': 2, 'variation': {'size': 'S'}},
+        ])
+        order = Ecommercecheckouts.objects.get()
+        order.status = 'cancelled'
+        order.save()
+        order.status = 'processing'
+        order.save()
+        self.assertStock(2, 0)
+        self.assertTrue(all(item.stock_reserved for item in order.items.all()))
+
+        # Sold to someone else while cancelled: the order stays cancelled.
+        order.status = 'cancelled'
+        order.save()
+        ProductVariation.objects.filter(pk=self.small_gown.pk).update(stock=1)
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin_user)
+        form = {
+            'customer_name': order.customer_name, 'customer_phone': order.customer_phone,
+            'customer_address': order.customer_address, 'delivery_charge': order.delivery_charge_id,
+            'payment_method': 'Cash on Delivery', 'status': 'processing', 'items_json': order.items_json,
+        }
+        response = self.client.post(reverse('admin:orders_ecommercecheckouts_change', args=[order.pk]), form)
+        self.assertContains(response, 'Not enough stock to reopen this order: Gown: 1 left, 2 wanted')
+        order.status = 'processing'
+        with self.assertRaises(OutOfStock):
+            order.save()
+        self.assertEqual(Ecommercecheckouts.objects.get().status, 'cancelled')
+        self.assertStock(5, 1)
+
+        ProductVariation.objects.filter(pk=self.small_gown.pk).update(stock=2)
+        response = self.client.post(reverse('admin:orders_ecommercecheckouts_change', args=[order.pk]), form)
+        self.assertEqual(response.status_code, 302)
+        self.assertStock(2, 0)
+
+    def test_sold_out_lines_roll_back_the_whole_order(self):
+        response = self.checkout([
+            {'product_id': self.shirt.pk, 'quantity': 3},
+            {'product_id': self.gown.pk, 'quantity': 3, 'variation': {'size': 'S'}},
+        ])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['unavailable'], [
+            {'product': 'Gown', 'variation': 'size: S', 'requested': 3, 'available': 2},
+        ])
+        self.assertFalse(Ecommercecheckouts.objects.exists())
+        self.assertStock(5, 2)
+
+    def test_one_update_per_table(self):
+        items = [
+            OrderItem(product=self.shirt, product_name='Shirt', unit_price=1, quantity=1),
+            OrderItem(product=self.gown, variation=self.small_gown, product_name='Gown', unit_price=1, quantity=1),
+            OrderItem(product=self.gown, variation=self.small_gown, product_name='Gown', unit_price=1, quantity=1),
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            reserve_stock(items)
+        self.assertEqual([query['sql'].split()[0] for query in queries if 'SAVEPOINT' not in query['sql']], ['UPDATE', 'UPDATE'])
+        self.assertStock(4, 0)
+        with self.assertRaises(OutOfStock):
+            reserve_stock(items)
+        self.assertStock(4, 0)
+
+
+class StockConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('needs a file-backed test database shared between threads')
+        gown = Product.objects.create(name='Gown', regular_price=3000, product_type=Product.VARIABLE)
+        self.variation = ProductVariation.objects.create(product=gown, size='S', price=2500, stock=5)
+
+    def test_parallel_checkouts_never_oversell(self):
+        results = []
+        start = threading.Barrier(20)
+
+        def buy():
+            item = OrderItem(product_id=self.variation.product_id, variation_id=self.variation.pk,
+                             product_name='Gown', unit_price=2500, quantity=1)
+            start.wait()
+            try:
+                with transaction.atomic():
+                    reserve_stock([item])
+                results.append(True)
+            except OutOfStock:
+                results.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.variation.refresh_from_db()
+        self.assertEqual((results.count(True), results.count(False)), (5, 15))
+        self.assertEqual(self.variation.stock, 0)
+
+
+class TrackOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        zone = DeliveryCharge.objects.create(zone='Dhaka', charge=60)
+        for i, phone in enumerate(['01712345678', '+8801712345678', '8801712 345678'] * 9 + ['01812345678']):
+            Ecommercecheckouts.objects.create(
+                customer_name=f'Customer {i}', customer_phone=phone, customer_address='Dhaka',
+                delivery_charge=zone, total_amount=100 + i, status='processing',
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_normalize_phone(self):
+        for raw in ['01712345678', '+8801712345678', '8801712345678', '008801712345678', '+880 1712-345678', '1712345678']:
+            self.assertEqual(normalize_phone(raw), '+8801712345678', raw)
+        self.assertEqual(normalize_phone('+44 20 7946 0958'), '+442079460958')
+        self.assertEqual(normalize_phone(None), '')
+
+    def test_any_spelling_finds_every_order_a_page_at_a_time(self):
+        url = reverse('website:track_order')
+        self.client.get(url)
+        # The page of orders is the only query.
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {'phone_number': '+880 1712 345678'})
+        orders = response.context['orders']
+        self.assertEqual(len(orders), 20)
+        self.assertEqual(orders[0].customer_name, 'Customer 26')
+
+        response = self.client.post(url, {'phone_number': '01712345678', 'cursor': orders.next_cursor})
+        self.assertEqual([order.customer_name for order in response.context['orders']], [f'Customer {i}' for i in range(6, -1, -1)])
+        self.assertFalse(response.context['orders'].has_next())
+
+        response = self.client.post(url, {'phone_number': '01912345678'})
+        self.assertContains(response, 'No orders found')
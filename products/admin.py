@@ -1,17 +1,27 @@
-import os
+import logging
+from collections import Counter
+
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
-from django.db.models import Sum
-from django.conf import settings
-from django.core.files import File
+from django.db.models import Count, OuterRef, Subquery, Sum
 from django.db import transaction 
 
+import tablib
 from import_export import resources, fields
 from import_export.admin import ImportExportModelAdmin
 from import_export.widgets import ForeignKeyWidget, ManyToManyWidget
 
+from multi_vendor_site.exports import StreamingExportMixin
+from website.home import invalidate_home
+
 from .models import *
+from .bulk_import import refresh_derived, resolve_categories, resolve_vendors, split_names, sync_images, sync_variations
+from .category_tree import get_category_tree
+from .detail import invalidate_product_details
+from .facets import facet_values, refresh_product_facets
+from .media_ingest import ingest
+from .renditions import rendition_url, schedule_renditions
 from unfold.admin import ModelAdmin
 from unfold.paginator import InfinitePaginator
 from unfold.admin import TabularInline
@@ -19,6 +29,8 @@ from unfold.admin import TabularInline
 from django.contrib.auth import get_user_model
 User = get_user_model() 
 
+logger = logging.getLogger(__name__)
+
 
 class ProductImageInline(TabularInline):
     model = ProductImage
@@ -28,7 +40,7 @@ class ProductImageInline(TabularInline):
 
     def image_thumbnail(self, obj):
         if obj.image:
-            return format_html('<img src="{}" width="100" height="100" style="object-fit: cover; border-radius: 4px;" />', obj.image.url)
+            return format_html('<img src="{}" width="100" height="100" style="object-fit: cover; border-radius: 4px;" />', rendition_url(obj.image, 'thumb'))
         return "No Image"
     image_thumbnail.short_description = "Thumbnail"
 
@@ -79,33 +91,25 @@ class ProductImageResource(resources.ModelResource):
             return product_image.image.name 
         return ''
 
-    def before_import_row(self, row, **kwargs):
-        image_file_path = row.get('image_path', '').strip()
-        self._current_image_abs_path = None
-        self._current_image_filename = None
-
-        if image_file_path:
-            abs_path = os.path.join(settings.MEDIA_ROOT, image_file_path)
-            if os.path.exists(abs_path):
-                self._current_image_abs_path = abs_path
-                self._current_image_filename = os.path.basename(abs_path)
-            else:
-                self.errors.append(f"Image file not found at {abs_path} for row: {row}")
-                row['image_path'] = None 
-
-    def after_import_instance(self, instance, new, **kwargs):
-        if self._current_image_abs_path and self._current_image_filename:
-            try:
-                with open(self._current_image_abs_path, 'rb') as f:
-                    instance.image.save(self._current_image_filename, File(f, name=self._current_image_filename), save=False)
-                    instance.save(update_fields=['image']) 
-            except Exception as e:
-                self.errors.append(f"Error saving image '{self._current_image_filename}' for ProductImage ID {instance.id}: {e}")
-        elif not instance.image and instance.pk and 'image_path' in kwargs['row'] and not kwargs['row']['image_path']:
-            if instance.image:
-                instance.image.delete(save=False)
-                instance.image = None
-                instance.save(update_fields=['image'])
+    def import_data(self, dataset, dry_run=False, **kwargs):
+        # before_import isn't told whether this is the admin's preview.
+        self._dry_run = dry_run
+        # before_import rewrites image_path; keep the caller's dataset intact.
+        dataset = tablib.Dataset(*dataset, headers=dataset.headers)
+        return super().import_data(dataset, dry_run=dry_run, **kwargs)
+
+    def before_import(self, dataset, **kwargs):
+        # Every file the import names, resolved in parallel before any row:
+        # stored ones are linked in place, others copied once by content hash
+        # (the preview only resolves them; its rows are rolled back anyway).
+        if 'image_path' not in dataset.headers:
+            return
+        paths = [(path or '').strip() for path in dataset['image_path']]
+        ingestion = ingest(paths, dry_run=getattr(self, '_dry_run', False))
+        if ingestion.missing:
+            logger.warning("Product image import: %s", ingestion.summary())
+        del dataset['image_path']
+        dataset.append_col([ingestion.names.get(path) for path in paths], header='image_path')
 
     class Meta:
         model = ProductImage
@@ -129,6 +133,9 @@ class ProductVariationResource(resources.ModelResource):
         export_order = ('product', 'size', 'weight', 'color', 'price', 'stock')
         skip_unchanged = True
 
+    def filter_export(self, queryset, **kwargs):
+        return super().filter_export(queryset, **kwargs).select_related('product')
+
 
 class ProductResource(resources.ModelResource):
     vendor = fields.Field(
@@ -145,6 +152,13 @@ class ProductResource(resources.ModelResource):
     exported_images = fields.Field(column_name='exported_images', readonly=True)
     exported_variations = fields.Field(column_name='exported_variations', readonly=True)
 
+    def filter_export(self, queryset, **kwargs):
+        # Exports read every product's vendor, categories, images and variations.
+        # Not in get_queryset(): the import's instance loader gets each row
+        # through that, and would run the prefetches once per row.
+        queryset = super().filter_export(queryset, **kwargs)
+        return queryset.select_related('vendor').prefetch_related('categories', 'images', 'variations')
+
     def dehydrate_exported_images(self, product):
         return '|'.join([
             f"{img.name or 'Unnamed'}:{img.image.name if img.image else ''}:{img.alt_text or ''}:{int(img.is_featured)}:{img.order}"
@@ -157,88 +171,38 @@ class ProductResource(resources.ModelResource):
             for var in product.variations.all()
         ])
 
-    def before_import(self, dataset, using_transactions=None, dry_run=None, **kwargs):
-        self._row_data_by_slug = {}
-        for row in dataset.dict:
-            slug = row.get('slug')
-            if slug:
-                self._row_data_by_slug[slug] = row
-
-    def before_import_row(self, row, **kwargs):
-        category_names = row.get("category_names", "")
-        for name in category_names.split("|"):
-            name = name.strip()
-            if name:
-                Category.objects.get_or_create(name=name)
-
-        vendor_username = row.get("vendor_username")
-        if vendor_username:
-            User.objects.get_or_create(username=vendor_username)
-
-    @transaction.atomic 
-    def after_import_instance(self, instance, new, **kwargs):
-        row_data = self._row_data_by_slug.get(instance.slug)
-        if not row_data:
-            return 
-
-        images_data_str = row_data.get('exported_images', '')
-        if images_data_str:
-            instance.images.all().delete() 
-            for image_entry in images_data_str.split('|'):
-                parts = image_entry.split(':')
-                if len(parts) < 5: 
-                    continue
-
-                img_name, rel_path, alt_text, is_featured_str, order_str = [p.strip() for p in parts[:5]]
-                
-                is_featured = bool(int(is_featured_str)) if is_featured_str.isdigit() else False
-                order = int(order_str) if order_str.isdigit() else 0
-
-                abs_path = os.path.join(settings.MEDIA_ROOT, rel_path)
-                
-                if os.path.exists(abs_path):
-                    try:
-                        with open(abs_path, 'rb') as f:
-                            filename = os.path.basename(abs_path)
-                            ProductImage.objects.create(
-                                product=instance,
-                                image=File(f, name=filename),
-                                name=img_name if img_name != 'Unnamed' else None, 
-                                alt_text=alt_text if alt_text != 'Unnamed' else None,
-                                is_featured=is_featured,
-                                order=order
-                            )
-                    except Exception as e:
-                        self.errors.append(f"Error saving image '{rel_path}' for product '{instance.slug}': {e}")
-                else:
-                    self.errors.append(f"Image file not found at '{abs_path}' for product '{instance.slug}'")
-
-        variations_data_str = row_data.get('exported_variations', '')
-        if variations_data_str and instance.product_type == Product.VARIABLE:
-            instance.variations.all().delete() 
-            for variation_entry in variations_data_str.split('|'):
-                parts = variation_entry.split(':')
-                if len(parts) < 5: 
-                    continue
-
-                size, weight, color, price_str, stock_str = [p.strip() for p in parts[:5]]
-
-                price = float(price_str) if price_str else None
-                stock = int(stock_str) if stock_str.isdigit() else 0 
-
-                try:
-                    ProductVariation.objects.create(
-                        product=instance,
-                        size=size if size else None,
-                        weight=weight if weight else None,
-                        color=color if color else None,
-                        price=price,
-                        stock=stock,
-                    )
-                except Exception as e:
-                    self.errors.append(f"Error creating variation '{variation_entry}' for product '{instance.slug}': {e}")
-        elif instance.product_type == Product.SIMPLE:
-            instance.variations.all().delete()
+    def before_import(self, dataset, **kwargs):
+        # Every category and vendor the file names, resolved in two queries
+        # up front instead of a get_or_create per row.
+        rows = dataset.dict
+        resolve_categories({name for row in rows for name in split_names(row.get('category_names'))})
+        resolve_vendors({(row.get('vendor_username') or '').strip() for row in rows} - {''})
+
+    def after_import(self, dataset, result, **kwargs):
+        # Images and variations aren't model fields: diff them against what
+        # is stored for every imported product in one pass, then refresh what
+        # the row signals couldn't know about yet.
+        rows = {row['slug']: row for row in dataset.dict if row.get('slug')}
+        product_rows = [(product, rows[product.slug]) for product in Product.objects.filter(slug__in=rows)]
+        product_ids = [product.pk for product, _ in product_rows]
+        stats, errors = Counter(), []
+        # Bulk writes send no signals: recount what the products carried before and after.
+        facets_before = facet_values(product_ids)
+        sync_variations(product_rows, stats)
+        # The admin's preview is rolled back; it must not copy files into storage either.
+        dry_run = kwargs.get('dry_run', False)
+        new_images = sync_images(product_rows, stats, errors, dry_run=dry_run)
+        for error in errors:
+            logger.warning("Product import: %s", error)
+        if dry_run:
+            return
+        refresh_derived(product_ids)
+        refresh_product_facets(product_ids, facets_before)
+        # Nor does a product row skipped as unchanged, so drop the cached pages here.
+        transaction.on_commit(lambda: invalidate_product_details(product_ids))
+        transaction.on_commit(lambda: invalidate_home('products'))
+        for name in new_images:
+            transaction.on_commit(lambda name=name: schedule_renditions(name))
 
     class Meta:
         model = Product
@@ -264,14 +228,14 @@ class ProductResource(resources.ModelResource):
 
 
 @admin.register(Product)
-class ProductAdmin(ModelAdmin, ImportExportModelAdmin):
+class ProductAdmin(StreamingExportMixin, ModelAdmin, ImportExportModelAdmin):
     paginator = InfinitePaginator
     show_full_result_count = False
     resource_class = ProductResource
     inlines = [ProductImageInline, ProductVariationInline]
     list_display = (
-        'name_display', 'vendor_display', 'product_type', 'get_display_price',
-        'stock_quantity_display', 'is_active', 'is_featured', 'created_at'
+        'name_display', 'image_thumbnail', 'vendor_display', 'product_type', 'get_display_price',
+        'stock_quantity_display', 'variation_count', 'is_active', 'is_featured', 'created_at'
     )
     list_filter = ('product_type', 'is_active', 'is_featured', 'vendor', 'categories')
     search_fields = ('name', 'vendor__username', 'short_description', 'description') 
@@ -279,22 +243,42 @@ class ProductAdmin(ModelAdmin, ImportExportModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
     filter_horizontal = ('categories',) 
 
+    def get_queryset(self, request):
+        # Per-product totals as subqueries rather than JOIN + GROUP BY, so the
+        # categories filter's join can't multiply them.
+        variations = ProductVariation.objects.filter(product=OuterRef('pk')).order_by().values('product')
+        return super().get_queryset(request).select_related('vendor', 'primary_image').annotate(
+            total_variation_stock=Subquery(variations.annotate(total=Sum('stock')).values('total')),
+            variation_count=Subquery(variations.annotate(count=Count('pk')).values('count')),
+        )
+
     def name_display(self, obj):
         return obj.name or "---"
     name_display.short_description = "Name"
 
+    def image_thumbnail(self, obj):
+        if obj.primary_image and obj.primary_image.image:
+            return format_html('<img src="{}" width="40" height="40" style="object-fit: cover; border-radius: 4px;" />', rendition_url(obj.primary_image.image, 'thumb'))
+        return "No Image"
+    image_thumbnail.short_description = "Image"
+
     def vendor_display(self, obj):
         return obj.vendor.username if obj.vendor else "---"
     vendor_display.short_description = "Vendor"
+    vendor_display.admin_order_field = 'vendor__username'
 
     def stock_quantity_display(self, obj):
         if obj.product_type == Product.SIMPLE:
             return obj.stock_quantity if obj.stock_quantity is not None else "---"
         else: 
-            total_stock = obj.variations.aggregate(Sum('stock'))['stock__sum']
-            return total_stock if total_stock is not None else "---"
+            return obj.total_variation_stock if obj.total_variation_stock is not None else "---"
     stock_quantity_display.short_description = "Stock"
 
+    def variation_count(self, obj):
+        return obj.variation_count or 0
+    variation_count.short_description = "Variations"
+    variation_count.admin_order_field = 'variation_count'
+
     def get_display_price(self, obj):
         price = obj.get_display_price()
         return f"৳{price:.2f}" if price is not None else "---"
@@ -326,11 +310,12 @@ class ProductAdmin(ModelAdmin, ImportExportModelAdmin):
 
 
 @admin.register(ProductVariation)
-class ProductVariationAdmin(ModelAdmin, ImportExportModelAdmin):
+class ProductVariationAdmin(StreamingExportMixin, ModelAdmin, ImportExportModelAdmin):
     paginator = InfinitePaginator
     show_full_result_count = False
     resource_class = ProductVariationResource
     list_display = ('product_display', 'size_display', 'color_display', 'weight_display', 'price_display', 'stock_display')
+    list_select_related = ('product',)
     list_filter = ('product__product_type', 'product')
     search_fields = ('product__name', 'size', 'color', 'weight')
 
@@ -365,6 +350,7 @@ class ProductImageAdmin(ModelAdmin, ImportExportModelAdmin):
     show_full_result_count = False
     resource_class = ProductImageResource
     list_display = ('product_display', 'name_display', 'image_thumbnail', 'is_featured', 'order')
+    list_select_related = ('product',)
     list_filter = ('product__name', 'is_featured')
     search_fields = ('product__name', 'name', 'alt_text')
     readonly_fields = ('image_thumbnail',)
@@ -379,7 +365,7 @@ class ProductImageAdmin(ModelAdmin, ImportExportModelAdmin):
 
     def image_thumbnail(self, obj):
         if obj.image and hasattr(obj.image, 'url'):
-            return format_html('<img src="{}" width="50" height="auto" style="object-fit: contain; border-radius: 4px;" />', obj.image.url)
+            return format_html('<img src="{}" width="50" height="auto" style="object-fit: contain; border-radius: 4px;" />', rendition_url(obj.image, 'thumb'))
         return "No Image"
     image_thumbnail.short_description = "Thumbnail"
 
@@ -391,6 +377,7 @@ class CategoryAdmin(ModelAdmin, ImportExportModelAdmin):
     resource_class = CategoryResource
     list_display = ('name_display', 'parent_display', 'slug_display', 'group_name_display', 'image_thumbnail', 'view_on_site_link')
     list_filter = ('parent', 'group_name',)
+    list_select_related = ('parent',)
     search_fields = ('name', 'slug', 'group_name')
     prepopulated_fields = {"slug": ("name",)}
 
@@ -417,10 +404,14 @@ class CategoryAdmin(ModelAdmin, ImportExportModelAdmin):
     image_thumbnail.short_description = "Image"
 
     def view_on_site_link(self, obj):
-        try:
-            return format_html('<a href="{}" target="_blank">View on Site</a>', obj.get_absolute_url())
-        except Exception: 
+        # The tree snapshot has every parent loaded; obj only has its own.
+        category = get_category_tree().by_id.get(obj.pk)
+        if category is None or not category.slug:
             return "N/A"
+        return format_html(
+            '<a href="{}" target="_blank">View on Site</a>',
+            reverse('website:category_detail', kwargs={'full_slug': category.get_full_slug()}),
+        )
     view_on_site_link.short_description = "Frontend URL"
 
 @admin.register(DeliveryCharge)
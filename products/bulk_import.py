@@ -0,0 +1,396 @@
+"""
+Set-based product import for large catalog CSVs, in the column layout
+ProductResource exports (vendor_username, category_names,
+exported_images, exported_variations, ...).
+
+Rows are handled `batch_size` at a time. For each chunk:
+
+* every category and vendor it names is looked up with one query, and
+  the missing ones are created
+* products are matched by slug with one query, then written with
+  bulk_create / bulk_update (unchanged rows aren't written at all)
+* category links, variations and images are diffed against what is
+  stored: only new rows are inserted, changed ones updated and dropped
+  ones deleted. Image files go through products/media_ingest.py:
+  stored ones are linked, others copied once by content hash
+* effective_price, primary_image and the search index are refreshed
+  with a few set-based statements
+
+Bulk writes send no model signals, so once every chunk is in, facet
+counts are rebuilt in one pass and the page caches dropped.
+"""
+import os
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .detail import invalidate_product_details
+from .facets import rebuild_facets
+from .media_ingest import ingest
+from .models import Category, Product, ProductImage, ProductVariation
+from .renditions import schedule_renditions
+from .search import get_search_backend
+
+
+def _text(value):
+    value = (value or '').strip()
+    return value or None
+
+
+def _decimal(value):
+    value = _text(value)
+    if value is None:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"{value!r} is not a number")
+
+
+def _price(value):
+    # Product.save() clamps negative prices to 0; so does the import.
+    value = _decimal(value)
+    return None if value is None else max(value, Decimal(0))
+
+
+def _int(value):
+    value = _text(value)
+    return None if value is None else int(Decimal(value))
+
+
+def _bool(value):
+    return (_text(value) or '').lower() in ('1', 'true', 'yes', 'y', 't', 'on')
+
+
+# CSV column -> parser, for the plain Product columns.
+PRODUCT_COLUMNS = {
+    'name': _text,
+    'short_description': _text,
+    'description': _text,
+    'product_type': lambda value: _text(value) or Product.SIMPLE,
+    'regular_price': _price,
+    'sale_price': _price,
+    'stock_quantity': _int,
+    'is_active': _bool,
+    'is_featured': _bool,
+    'seo_title': _text,
+    'meta_description': _text,
+}
+
+
+def split_names(value, separator='|'):
+    return [name.strip() for name in (value or '').split(separator) if name.strip()]
+
+
+def resolve_categories(names, stats=None):
+    """{name: id} for `names`, creating the missing categories."""
+    names = set(names)
+    found = dict(Category.objects.filter(name__in=names).values_list('name', 'pk'))
+    for name in names - found.keys():
+        # One by one: save() picks a unique slug and the materialized path.
+        category = Category(name=name)
+        category.save()
+        found[name] = category.pk
+        if stats is not None:
+            stats['categories_created'] += 1
+    return found
+
+
+def resolve_vendors(usernames, stats=None):
+    """{username: id} for `usernames`, creating accounts (without a usable password) for new ones."""
+    User = get_user_model()
+    usernames = set(usernames)
+    found = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+    missing = usernames - found.keys()
+    if missing:
+        User.objects.bulk_create([User(username=username, password=make_password(None)) for username in missing])
+        found.update(User.objects.filter(username__in=missing).values_list('username', 'pk'))
+        if stats is not None:
+            stats['vendors_created'] += len(missing)
+    return found
+
+
+def sync_categories(product_rows, category_ids, stats):
+    """Make each product's categories exactly its row's `category_names`."""
+    Link = Product.categories.through
+    wanted = {
+        (product.pk, category_ids[name])
+        for product, row in product_rows
+        for name in split_names(row.get('category_names'))
+    }
+    stored = {
+        (product_id, category_id): pk
+        for pk, product_id, category_id in Link.objects.filter(
+            product_id__in=[product.pk for product, _ in product_rows]
+        ).values_list('pk', 'product_id', 'category_id')
+    }
+    Link.objects.bulk_create([Link(product_id=p, category_id=c) for p, c in wanted - stored.keys()])
+    Link.objects.filter(pk__in=[pk for link, pk in stored.items() if link not in wanted]).delete()
+    stats['category_links_changed'] += len(wanted ^ stored.keys())
+
+
+def _variation_key(size, weight, color):
+    return (size or None, weight or None, color or None)
+
+
+def parse_variations(value):
+    """{(size, weight, color): (price, stock)} from `size:weight:color:price:stock|...`."""
+    variations = {}
+    for entry in (value or '').split('|'):
+        parts = [part.strip() for part in entry.split(':')]
+        if len(parts) < 5:
+            continue
+        size, weight, color, price, stock = parts[:5]
+        variations[_variation_key(size, weight, color)] = (_decimal(price), _int(stock) or 0)
+    return variations
+
+
+def sync_variations(product_rows, stats):
+    """
+    Variable products get exactly the variations in `exported_variations`
+    (rows that leave it empty keep theirs); simple products lose any.
+    """
+    wanted = {}
+    for product, row in product_rows:
+        if product.product_type == Product.SIMPLE:
+            wanted[product.pk] = {}
+        elif _text(row.get('exported_variations')):
+            wanted[product.pk] = parse_variations(row['exported_variations'])
+    if not wanted:
+        return
+
+    to_update, to_delete = [], []
+    stored = defaultdict(set)
+    for variation in ProductVariation.objects.filter(product_id__in=wanted):
+        key = _variation_key(variation.size, variation.weight, variation.color)
+        stored[variation.product_id].add(key)
+        if key not in wanted[variation.product_id]:
+            to_delete.append(variation.pk)
+            continue
+        price, stock = wanted[variation.product_id][key]
+        if (variation.price, variation.stock) != (price, stock):
+            variation.price, variation.stock = price, stock
+            to_update.append(variation)
+    to_create = [
+        ProductVariation(product_id=product_id, size=size, weight=weight, color=color, price=price, stock=stock)
+        for product_id, variations in wanted.items()
+        for (size, weight, color), (price, stock) in variations.items()
+        if (size, weight, color) not in stored[product_id]
+    ]
+
+    # Deletes go through the ORM so the cart/checkout caches and facets hear about them.
+    ProductVariation.objects.filter(pk__in=to_delete).delete()
+    ProductVariation.objects.bulk_update(to_update, ['price', 'stock'])
+    ProductVariation.objects.bulk_create(to_create)
+    stats['variations_created'] += len(to_create)
+    stats['variations_updated'] += len(to_update)
+    stats['variations_deleted'] += len(to_delete)
+
+
+def parse_images(value):
+    """[(storage name, name, alt text, is_featured, order)] from `name:path:alt:featured:order|...`."""
+    images = []
+    for entry in (value or '').split('|'):
+        parts = [part.strip() for part in entry.split(':')]
+        if len(parts) < 5 or not parts[1]:
+            continue
+        name, path, alt_text, is_featured, order = parts[:5]
+        images.append((
+            path,
+            name if name and name != 'Unnamed' else None,
+            alt_text if alt_text and alt_text != 'Unnamed' else None,
+            is_featured.isdigit() and bool(int(is_featured)),
+            int(order) if order.isdigit() else 0,
+        ))
+    return images
+
+
+def sync_images(product_rows, stats, errors, source_dir=None, dry_run=False):
+    """
+    Products whose row lists `exported_images` get exactly those images.
+    Returns the storage names of newly attached files, for renditions.
+    """
+    wanted = {
+        product.pk: (product, parse_images(row['exported_images']))
+        for product, row in product_rows
+        if _text(row.get('exported_images'))
+    }
+    if not wanted:
+        return []
+
+    stored = defaultdict(dict)
+    for image in ProductImage.objects.filter(product_id__in=wanted):
+        stored[image.product_id][image.image.name] = image
+
+    # Files already attached to their product need no storage access at all.
+    ingestion = ingest(
+        {path for product_id, (_, images) in wanted.items() for path, *_ in images if path not in stored[product_id]},
+        source_dir=source_dir, dry_run=dry_run,
+    )
+    if ingestion.missing:
+        errors.append(f"{len(ingestion.missing)} image files not found: {', '.join(sorted(ingestion.missing))}")
+    stats['image_files_copied'] += ingestion.copied
+    stats['image_files_deduplicated'] += ingestion.deduplicated
+
+    to_create, to_update, to_delete = [], [], []
+    for product_id, (product, images) in wanted.items():
+        images = [
+            (path if path in stored[product_id] else ingestion.names.get(path), path, *details)
+            for path, *details in images
+        ]
+        listed = {stored_name for stored_name, *_ in images}
+        to_delete += [image.pk for stored_name, image in stored[product_id].items() if stored_name not in listed]
+        names = {image.name for stored_name, image in stored[product_id].items() if stored_name in listed}
+        for stored_name, path, name, alt_text, is_featured, order in images:
+            if stored_name is None:
+                continue
+            image = stored[product_id].get(stored_name)
+            if image is None:
+                # What ProductImage.save() does: a per-product unique name from the file name.
+                name = base = name or os.path.splitext(os.path.basename(path))[0]
+                counter = 1
+                while name in names:
+                    name, counter = f'{base}-{counter}', counter + 1
+                names.add(name)
+                to_create.append(ProductImage(
+                    product_id=product_id, image=stored_name, name=name,
+                    alt_text=alt_text, is_featured=is_featured, order=order,
+                ))
+            elif (image.name, image.alt_text or None, image.is_featured, image.order) != (name or image.name, alt_text, is_featured, order):
+                image.name, image.alt_text, image.is_featured, image.order = name or image.name, alt_text, is_featured, order
+                to_update.append(image)
+
+    ProductImage.objects.filter(pk__in=to_delete).delete()
+    ProductImage.objects.bulk_update(to_update, ['name', 'alt_text', 'is_featured', 'order'])
+    ProductImage.objects.bulk_create(to_create)
+    stats['images_created'] += len(to_create)
+    stats['images_updated'] += len(to_update)
+    stats['images_deleted'] += len(to_delete)
+    return list({image.image.name for image in to_create})
+
+
+def refresh_derived(product_ids):
+    """What the row signals would have maintained: prices, primary images, the search index."""
+    products = Product.objects.filter(pk__in=product_ids)
+    products.update_effective_price()
+    products.update_primary_image()
+    get_search_backend().index_products(product_ids)
+
+
+class ProductImporter:
+    def __init__(self, batch_size=1000, dry_run=False, source_dir=None):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.source_dir = source_dir
+        self.stats = Counter()
+        self.errors = []
+        self.changed = False
+
+    def run(self, rows, progress=None):
+        """
+        Import an iterable of CSV row dicts; returns the stats Counter (with
+        `seconds`). `progress(stats)` is called after every chunk; if it
+        raises, the chunks already committed stay and are finished properly.
+        """
+        started = time.monotonic()
+        chunk = []
+        try:
+            # Line numbers as a spreadsheet shows them: the header is line 1.
+            for line, row in enumerate(rows, start=2):
+                chunk.append((line, row))
+                if len(chunk) >= self.batch_size:
+                    self.import_chunk(chunk)
+                    chunk = []
+                    if progress:
+                        progress(self.stats)
+            if chunk:
+                self.import_chunk(chunk)
+                if progress:
+                    progress(self.stats)
+        finally:
+            if self.changed and not self.dry_run:
+                rebuild_facets()
+                from website.home import invalidate_home
+                invalidate_home()
+                invalidate_product_details()
+            self.stats['seconds'] = time.monotonic() - started
+        return self.stats
+
+    def import_chunk(self, lines):
+        with transaction.atomic():
+            new_images = self._import_chunk(lines)
+            if self.dry_run:
+                transaction.set_rollback(True)
+                return
+            for name in new_images:
+                transaction.on_commit(lambda name=name: schedule_renditions(name))
+
+    def _import_chunk(self, lines):
+        stats = self.stats
+        rows = {}
+        for line, row in lines:
+            stats['rows'] += 1
+            try:
+                values = {column: parse(row[column]) for column, parse in PRODUCT_COLUMNS.items() if column in row}
+            except (ValueError, ArithmeticError) as e:
+                self.errors.append(f"line {line}: {e}")
+                continue
+            slug = _text(row.get('slug')) or slugify(values.get('name') or '', allow_unicode=True)
+            if not slug:
+                self.errors.append(f"line {line}: no slug or name")
+                continue
+            # A slug repeated in the file: the last row wins, as it would row by row.
+            rows[slug] = (row, values)
+
+        category_ids = resolve_categories(
+            {name for row, _ in rows.values() for name in split_names(row.get('category_names'))}, stats
+        )
+        vendor_ids = resolve_vendors({_text(row.get('vendor_username')) for row, _ in rows.values()} - {None}, stats)
+        existing = {product.slug: product for product in Product.objects.filter(slug__in=rows)}
+
+        now = timezone.now()
+        to_create, to_update, changed_fields = [], [], set()
+        for slug, (row, values) in rows.items():
+            if 'vendor_username' in row:
+                values['vendor_id'] = vendor_ids.get(_text(row['vendor_username']))
+            product = existing.get(slug)
+            if product is None:
+                to_create.append(Product(slug=slug, **values))
+                continue
+            changed = {field for field, value in values.items() if getattr(product, field) != value}
+            if changed:
+                for field in changed:
+                    setattr(product, field, values[field])
+                product.updated_at = now
+                changed_fields |= changed
+                to_update.append(product)
+
+        Product.objects.bulk_create(to_create)
+        if any(product.pk is None for product in to_create):
+            # Databases that can't return ids from a bulk insert.
+            ids = dict(Product.objects.filter(slug__in=[p.slug for p in to_create]).values_list('slug', 'pk'))
+            for product in to_create:
+                product.pk = ids[product.slug]
+        if to_update:
+            Product.objects.bulk_update(to_update, sorted(changed_fields | {'updated_at'}))
+        stats['products_created'] += len(to_create)
+        stats['products_updated'] += len(to_update)
+        stats['products_unchanged'] += len(existing) - len(to_update)
+
+        products = {product.slug: product for product in [*existing.values(), *to_create]}
+        product_rows = [(products[slug], row) for slug, (row, _) in rows.items()]
+        before = +stats
+        sync_categories([(p, row) for p, row in product_rows if 'category_names' in row], category_ids, stats)
+        sync_variations(product_rows, stats)
+        new_images = sync_images(product_rows, stats, self.errors, self.source_dir, self.dry_run)
+        # A chunk that matched the database exactly needs nothing refreshed.
+        if to_create or to_update or stats != before:
+            refresh_derived([product.pk for product, _ in product_rows])
+            self.changed = True
+        return new_images
@@ -0,0 +1,273 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Count, Exists, F, OuterRef, Q, Min, Max, Value
+
+from .models import Category, Product, ProductFacet, ProductVariation, subtree_range
+from .pagination import KeysetPaginator
+from .search import get_search_backend
+
+
+PAGE_SIZE = 50
+
+FACET_FIELDS = ('color', 'size', 'weight')
+FACET_KEYS = {'color': 'colors', 'size': 'sizes', 'weight': 'weights'}
+
+
+class FacetValue(str):
+    """A filter value that also knows how many listed products carry it."""
+
+    def __new__(cls, value, count):
+        facet_value = super().__new__(cls, value)
+        facet_value.count = count
+        return facet_value
+
+
+class CatalogQuery:
+    """
+    Compiles listing request parameters (price, color/size/weight, search,
+    category, sort) into a single product queryset and the facet data the
+    shop, search and category pages render.
+
+    Every multi-valued filter is expressed as an EXISTS subquery, so the
+    listing never joins products against variations/categories and never
+    needs DISTINCT. The number of queries is fixed no matter how many
+    filters are selected:
+
+        price bounds (1) + facets (1, +1 for counts when filtered)
+        + count (1) + page (1) + images (1)
+
+    plus one query to look up the category path when `?category=` is given.
+    """
+
+    SORT_OPTIONS = {
+        '-created_at': 'Newest',
+        'created_at': 'Oldest',
+        'name': 'Name (A-Z)',
+        '-name': 'Name (Z-A)',
+        'price': 'Price (Low to High)',
+        '-price': 'Price (High to Low)',
+    }
+    DEFAULT_SORT = '-created_at'
+    RELEVANCE = 'relevance'
+
+    # Keys the old category page used, kept so bookmarked URLs still sort.
+    SORT_ALIASES = {
+        'default': '-created_at',
+        'name_asc': 'name',
+        'name_desc': '-name',
+        'price_asc': 'price',
+        'price_desc': '-price',
+        'regular_price': 'price',
+        '-regular_price': '-price',
+    }
+
+    # Sort keys that don't name a model field directly.
+    SORT_FIELDS = {
+        'price': 'effective_price',
+        '-price': '-effective_price',
+    }
+
+    def __init__(self, params, category=None, include_descendants=False):
+        # `category` fixes the scope of the listing (category pages); a
+        # `?category=` parameter narrows the results to that category and
+        # everything below it (shop/search).
+        self.params = params
+        self.category = category
+        self.include_descendants = include_descendants
+
+        self.search_query = (params.get('search') or '').strip()
+        self.selected_colors = params.getlist('color')
+        self.selected_sizes = params.getlist('size')
+        self.selected_weights = params.getlist('weight')
+        self.min_price = self._parse_price(params.get('min_price'))
+        self.max_price = self._parse_price(params.get('max_price'))
+
+        self.sort_options = dict(self.SORT_OPTIONS)
+        default_sort = self.DEFAULT_SORT
+        if self.search_query and get_search_backend().ranked:
+            # Ranked backends sort search results by relevance unless asked otherwise.
+            self.sort_options = {self.RELEVANCE: 'Relevance', **self.sort_options}
+            default_sort = self.RELEVANCE
+
+        sort_by = params.get('sort_by') or default_sort
+        sort_by = self.SORT_ALIASES.get(sort_by, sort_by)
+        self.sort_by = sort_by if sort_by in self.sort_options else default_sort
+
+        self.filter_category_slug = params.get('category') or ''
+        self.cursor = params.get('cursor') or ''
+        self._filtered = None
+        self._bounds = None
+        self._facets = None
+
+    @staticmethod
+    def _parse_price(value):
+        try:
+            return float(value) if value not in (None, '') else None
+        except ValueError:
+            return None
+
+    def _in_subtree(self, path):
+        lower, upper = subtree_range(path)
+        through = Product.categories.through
+        return Exists(through.objects.filter(
+            product_id=OuterRef('pk'), category__path__gte=lower, category__path__lt=upper
+        ))
+
+    def scope(self):
+        """Active products the page is about, before any user filters."""
+        products = Product.objects.filter(is_active=True)
+        if self.category is not None:
+            if self.include_descendants:
+                products = products.filter(self._in_subtree(self.category.path))
+            else:
+                products = products.filter(
+                    Exists(Product.categories.through.objects.filter(product_id=OuterRef('pk'), category_id=self.category.pk))
+                )
+        return products
+
+    def filtered(self):
+        if self._filtered is None:
+            self._filtered = self._build_filtered()
+        return self._filtered
+
+    def _build_filtered(self):
+        products = self.scope()
+
+        if self.filter_category_slug:
+            slug = self.filter_category_slug.split('/')[-1]
+            path = Category.objects.filter(slug=slug).values_list('path', flat=True).first()
+            if path:
+                products = products.filter(self._in_subtree(path))
+
+        # effective_price is what the customer pays; (is_active, effective_price)
+        # is indexed, so this is a range scan.
+        if self.min_price is not None:
+            products = products.filter(effective_price__gte=self.min_price)
+        if self.max_price is not None:
+            products = products.filter(effective_price__lte=self.max_price)
+
+        if self.search_query:
+            products = get_search_backend().filter(products, self.search_query)
+
+        # A single variation has to satisfy every selected attribute.
+        variation_filters = Q()
+        if self.selected_colors:
+            variation_filters &= Q(color__in=self.selected_colors)
+        if self.selected_sizes:
+            variation_filters &= Q(size__in=self.selected_sizes)
+        if self.selected_weights:
+            variation_filters &= Q(weight__in=self.selected_weights)
+        if variation_filters:
+            products = products.filter(Exists(
+                ProductVariation.objects.filter(variation_filters, product_id=OuterRef('pk'))
+            ))
+
+        return products
+
+    def ordered(self):
+        if self.sort_by == self.RELEVANCE:
+            # bm25 scores are negative; lower is more relevant.
+            ranked = get_search_backend().rank(self.filtered(), self.search_query)
+            return ranked.order_by('search_rank', '-id').with_card_data(categories=False)
+        field = self.SORT_FIELDS.get(self.sort_by, self.sort_by)
+        # Same order as the keyset pages: unpriced/unnamed products last.
+        if field.startswith('-'):
+            order = (F(field[1:]).desc(nulls_last=True), F('id').desc())
+        else:
+            order = (F(field).asc(nulls_last=True), F('id').asc())
+        return self.filtered().order_by(*order).with_card_data(categories=False)
+
+    def price_bounds(self):
+        if self._bounds is None:
+            agg = self.scope().aggregate(min_p=Min('effective_price'), max_p=Max('effective_price'))
+            min_p = agg['min_p'] if agg['min_p'] is not None else 0
+            max_p = agg['max_p'] if agg['max_p'] is not None else 1000
+            self._bounds = (min_p, max_p + 100)
+        return self._bounds
+
+    def is_filtered(self):
+        return bool(
+            self.filter_category_slug or self.search_query or
+            self.min_price is not None or self.max_price is not None or
+            self.selected_colors or self.selected_sizes or self.selected_weights
+        )
+
+    def _facet_counts(self, products):
+        """{(facet_type, value): products} over `products`, in one UNION query."""
+        product_ids = products.values('pk')
+        parts = [
+            ProductVariation.objects.filter(product_id__in=product_ids, **{f'{field}__gt': ''})
+            .annotate(facet_type=Value(field), facet_value=F(field))
+            .values_list('facet_type', 'facet_value')
+            .annotate(n=Count('product_id', distinct=True))
+            .order_by()
+            for field in FACET_FIELDS
+        ]
+        return {(facet_type, value): count for facet_type, value, count in parts[0].union(*parts[1:], all=True)}
+
+    def facets(self):
+        """
+        Filter values for the page's scope, read from the ProductFacet index.
+        Each value carries the number of products it matches: the indexed
+        count for an unfiltered page, otherwise a count over the current
+        result set.
+        """
+        if self._facets is None:
+            if self.category is not None and self.include_descendants:
+                # The index holds direct category membership only; a subtree is counted live.
+                rows = sorted((facet_type, value, count) for (facet_type, value), count in self._facet_counts(self.scope()).items())
+            else:
+                rows = ProductFacet.objects.filter(category=self.category).values_list('facet_type', 'value', 'product_count')
+            counts = self._facet_counts(self.filtered()) if self.is_filtered() else None
+            self._facets = {'colors': [], 'sizes': [], 'weights': []}
+            for facet_type, value, count in rows:
+                if counts is not None:
+                    count = counts.get((facet_type, value), 0)
+                self._facets[FACET_KEYS[facet_type]].append(FacetValue(value, count))
+        return self._facets
+
+    def page(self, number, per_page=PAGE_SIZE):
+        return Paginator(self.ordered(), per_page).get_page(number)
+
+    def uses_keyset(self, page_number=None):
+        """
+        Cursor pagination when a `?cursor=` is given, or by default with
+        settings.CATALOG_PAGINATION = 'keyset'. Numbered `?page=` links keep
+        working, and relevance order (computed per query) always uses offsets.
+        """
+        if self.sort_by == self.RELEVANCE:
+            return False
+        if self.cursor:
+            return True
+        return getattr(settings, 'CATALOG_PAGINATION', 'offset') == 'keyset' and not page_number
+
+    def keyset_paginator(self, per_page=PAGE_SIZE):
+        ordering = self.SORT_FIELDS.get(self.sort_by, self.sort_by)
+        return KeysetPaginator(self.filtered().with_card_data(categories=False), ordering, per_page)
+
+    def keyset_page(self, cursor=None, per_page=PAGE_SIZE):
+        return self.keyset_paginator(per_page).page(cursor)
+
+    def context(self, page_number):
+        """Template context shared by the three listing pages."""
+        min_price, max_price = self.price_bounds()
+        selected_min = self.min_price if self.min_price is not None else min_price
+        selected_max = self.max_price if self.max_price is not None else max_price
+        if selected_max < selected_min:
+            selected_max = selected_min
+
+        return {
+            'products': self.keyset_page(self.cursor) if self.uses_keyset(page_number) else self.page(page_number),
+            'min_price': min_price,
+            'max_price': max_price,
+            'selected_min': selected_min,
+            'selected_max': selected_max,
+            'available_filters': self.facets(),
+            'selected_colors': self.selected_colors,
+            'selected_sizes': self.selected_sizes,
+            'selected_weights': self.selected_weights,
+            'sort_options': self.sort_options,
+            'current_sort': self.sort_by,
+            'search_query': self.search_query,
+            'current_category': self.filter_category_slug,
+        }
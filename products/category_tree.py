@@ -0,0 +1,66 @@
+from collections import defaultdict
+from functools import cached_property
+
+from multi_vendor_site.caching import Namespace
+
+from .models import Category
+
+
+TREE_TIMEOUT = 60 * 60 * 24
+TREE_CACHE = Namespace('category_tree', timeout=TREE_TIMEOUT)
+
+# (version, CategoryTree) for this process, checked against the shared
+# version key so a write in any worker invalidates every worker.
+_local_tree = (None, None)
+
+
+class CategoryTree:
+    """
+    Every category, loaded with one query, with parent links wired up in
+    memory so get_full_slug() and the menus never touch the database.
+    """
+
+    def __init__(self, categories):
+        by_id = {category.pk: category for category in categories}
+        children = defaultdict(list)
+        for category in categories:
+            if category.parent_id in by_id:
+                category.parent = by_id[category.parent_id]
+                children[category.parent_id].append(category)
+
+        self.all = categories
+        self.roots = [category for category in categories if category.parent_id is None]
+
+        # {root id: {group name: [children and grandchildren]}} for the navbar.
+        self.mega_menu = {}
+        for root in self.roots:
+            grouped = defaultdict(list)
+            for child in children[root.pk]:
+                group = child.group_name or "Other"
+                grouped[group].append(child)
+                grouped[group].extend(children[child.pk])
+            self.mega_menu[root.pk] = dict(grouped)
+
+    @cached_property
+    def by_id(self):
+        return {category.pk: category for category in self.all}
+
+    @classmethod
+    def build(cls):
+        return cls(list(Category.objects.all()))
+
+
+def get_category_tree():
+    global _local_tree
+    version = TREE_CACHE.version()
+    local_version, tree = _local_tree
+    if local_version == version:
+        return tree
+
+    tree = TREE_CACHE.get_or_set('tree', CategoryTree.build)
+    _local_tree = (version, tree)
+    return tree
+
+
+def bump_category_tree_version():
+    return TREE_CACHE.bump()
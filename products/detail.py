@@ -0,0 +1,86 @@
+"""
+Cached product detail pages.
+
+`detail_bundle(product_id)` is everything product_detail.html needs,
+built with a handful of queries and cached until a write to the product,
+its images, variations or categories (products/signals.py) or a stock
+change (orders/inventory.py) drops it. Slugs resolve through a cached
+slug -> id map, so a warm detail page runs no queries at all.
+"""
+import hashlib
+import json
+
+from multi_vendor_site.caching import Namespace
+
+from .category_tree import get_category_tree
+from .models import Product
+
+
+DETAIL_CACHE = Namespace('product_detail', timeout=60 * 60)
+RELATED_PRODUCTS = 5
+
+
+def _slug_key(slug):
+    # Slugs come from the URL: hash them so any text makes a valid key.
+    return ('slug', hashlib.md5(slug.encode()).hexdigest())
+
+
+def product_id_for_slug(slug):
+    """The id of the product at `slug`, or None (also cached, so bad links stay cheap)."""
+    return DETAIL_CACHE.get_or_set(
+        _slug_key(slug), lambda: Product.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    )
+
+
+def _options(variations, attribute):
+    """Distinct non-empty values of `attribute`, in variation order."""
+    return list(dict.fromkeys(value for value in (getattr(v, attribute) for v in variations) if value))
+
+
+def build_detail_bundle(product_id):
+    product = Product.objects.select_related('primary_image').filter(pk=product_id).first()
+    if product is None:
+        return None
+    variations = list(product.variations.order_by('pk'))
+    category_ids = list(product.categories.values_list('pk', flat=True))
+    # Tree categories have their parents wired up, so category links cost nothing.
+    tree = get_category_tree().by_id
+    related_ids = list(
+        Product.categories.through.objects
+        .filter(category_id__in=category_ids, product__is_active=True)
+        .exclude(product_id=product_id)
+        .values_list('product_id', flat=True).distinct()[:RELATED_PRODUCTS]
+    )
+    return {
+        'product': product,
+        'images': list(product.images.all()),
+        'product_categories': [tree[pk] for pk in category_ids if pk in tree],
+        'variations': variations,
+        'variations_json': json.dumps([
+            {
+                'id': v.pk, 'color': v.color, 'size': v.size, 'weight': v.weight,
+                'price': float(v.price) if v.price is not None else None, 'stock': v.stock,
+            }
+            for v in variations
+        ]),
+        'colors': _options(variations, 'color'),
+        'sizes': _options(variations, 'size'),
+        'weights': _options(variations, 'weight'),
+        'related_ids': related_ids,
+    }
+
+
+def detail_bundle(product_id):
+    return DETAIL_CACHE.get_or_set(('bundle', product_id), lambda: build_detail_bundle(product_id))
+
+
+def invalidate_product_details(product_ids=None, slugs=()):
+    """Drop the bundles of `product_ids` (every bundle and slug if None) and the `slugs` lookups."""
+    if product_ids is None:
+        DETAIL_CACHE.bump()
+        return
+    for product_id in product_ids:
+        DETAIL_CACHE.delete(('bundle', product_id))
+    for slug in slugs:
+        if slug:
+            DETAIL_CACHE.delete(_slug_key(slug))
@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Product, ProductFacet, ProductVariation
+
+
+FACET_TYPES = (ProductFacet.COLOR, ProductFacet.SIZE, ProductFacet.WEIGHT)
+
+
+def facet_values(product_ids):
+    """{facet_type: {values}} carried by the variations of `product_ids`."""
+    values = {facet_type: set() for facet_type in FACET_TYPES}
+    rows = ProductVariation.objects.filter(product_id__in=product_ids).values_list(*FACET_TYPES).distinct()
+    for row in rows:
+        for facet_type, value in zip(FACET_TYPES, row):
+            if value:
+                values[facet_type].add(value)
+    return values
+
+
+def merge_values(*value_maps):
+    merged = {facet_type: set() for facet_type in FACET_TYPES}
+    for value_map in value_maps:
+        for facet_type, values in (value_map or {}).items():
+            merged[facet_type] |= values
+    return merged
+
+
+def count_facets(facet_type, values=None):
+    """
+    Unsaved ProductFacet rows for `values` of `facet_type` (every value when
+    None): one global row plus one per category, each counting distinct
+    active products.
+    """
+    variations = ProductVariation.objects.filter(product__is_active=True, **{f'{facet_type}__gt': ''})
+    memberships = Product.categories.through.objects.filter(
+        product__is_active=True, **{f'product__variations__{facet_type}__gt': ''}
+    )
+    if values is not None:
+        variations = variations.filter(**{f'{facet_type}__in': values})
+        memberships = memberships.filter(**{f'product__variations__{facet_type}__in': values})
+
+    rows = [
+        ProductFacet(facet_type=facet_type, value=value, product_count=count)
+        for value, count in variations.values_list(facet_type).annotate(n=Count('product_id', distinct=True))
+    ]
+    rows += [
+        ProductFacet(facet_type=facet_type, value=value, category_id=category_id, product_count=count)
+        for category_id, value, count in memberships.values_list(
+            'category_id', f'product__variations__{facet_type}'
+        ).annotate(n=Count('product_id', distinct=True))
+    ]
+    return rows
+
+
+def refresh_facets(values):
+    """Recount the index rows for the given {facet_type: {values}}."""
+    with transaction.atomic():
+        for facet_type, type_values in values.items():
+            type_values = {value for value in type_values if value}
+            if not type_values:
+                continue
+            ProductFacet.objects.filter(facet_type=facet_type, value__in=type_values).delete()
+            ProductFacet.objects.bulk_create(count_facets(facet_type, type_values))
+
+
+def refresh_product_facets(product_ids, extra_values=None):
+    """Recount every value the given products carry, plus `extra_values`."""
+    refresh_facets(merge_values(facet_values(product_ids), extra_values))
+
+
+def rebuild_facets(batch_size=1000):
+    with transaction.atomic():
+        ProductFacet.objects.all().delete()
+        rows = [row for facet_type in FACET_TYPES for row in count_facets(facet_type)]
+        ProductFacet.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
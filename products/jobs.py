@@ -0,0 +1,21 @@
+import csv
+
+from website.jobs import job_storage, register
+
+from .bulk_import import ProductImporter
+
+
+@register('import_products')
+def import_products(job, progress, file, batch_size=1000, dry_run=False):
+    """Import `file` (a product CSV in job_storage()) with the bulk importer."""
+    path = job_storage().path(file)
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        total = sum(1 for _ in csv.DictReader(f))
+    progress(0, total, "Dry run" if dry_run else "Importing", force=True)
+
+    importer = ProductImporter(batch_size=batch_size, dry_run=dry_run)
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        stats = importer.run(csv.DictReader(f), progress=lambda stats: progress(stats['rows']))
+    if importer.errors:
+        progress(message=f"{len(importer.errors)} rows with problems", force=True)
+    return {**stats, 'errors': importer.errors[:100]}
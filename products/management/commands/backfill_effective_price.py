@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Recompute Product.effective_price in batches (after bulk imports or raw SQL edits)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(product_ids), batch_size):
+            Product.objects.filter(pk__in=product_ids[start:start + batch_size]).update_effective_price()
+        self.stdout.write(self.style.SUCCESS(f"Updated effective price for {len(product_ids)} products."))
@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from products.models import ProductImage
+from products.renditions import generate_renditions
+
+
+class Command(BaseCommand):
+    help = "Render the resized WebP/AVIF copies of every product image that doesn't have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        names = set(ProductImage.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True))
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {pool.submit(generate_renditions, name): name for name in names}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{futures[future]}: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Rendered {len(names) - failed} images ({failed} failed)."))
@@ -0,0 +1,39 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.bulk_import import ProductImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a product CSV in the admin export format with set-based writes "
+        "(for catalogs too large for the admin import)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file, as exported from the Product admin.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Import, report, then roll everything back.")
+        parser.add_argument('--media-dir', help="Where image paths that aren't in media storage yet are read from.")
+
+    def handle(self, *args, **options):
+        importer = ProductImporter(
+            batch_size=options['batch_size'], dry_run=options['dry_run'], source_dir=options['media_dir']
+        )
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as f:
+                stats = importer.run(csv.DictReader(f))
+        except OSError as e:
+            raise CommandError(e)
+
+        for key in sorted(stats):
+            if key not in ('rows', 'seconds'):
+                self.stdout.write(f"{key}: {stats[key]}")
+        for error in importer.errors:
+            self.stderr.write(self.style.WARNING(error))
+        rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Checked' if options['dry_run'] else 'Imported'} {stats['rows']} rows in {stats['seconds']:.1f}s "
+            f"({rate:.0f} rows/s, {len(importer.errors)} errors)."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = "Rebuild the color/size/weight facet index from product variations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_facets(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt facet index: {count} rows."))
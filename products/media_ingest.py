@@ -0,0 +1,118 @@
+"""
+Getting the image files an import names into media storage.
+
+A path in an import row is one of:
+
+* a file already in storage (what exports write, e.g.
+  `product_images/2025/07/dress.jpg`): linked as it is, no bytes read
+* a file on disk, absolute or relative to `source_dir`: copied into
+  storage under a name made from its content hash, so the same picture
+  is only ever stored once, however many rows or imports name it
+* neither: reported as missing
+
+Lookups, hashing and copies run in a thread pool (storage calls are I/O,
+remote ones especially). Renditions of new files are left to the
+ProductImage signal / the importer, which schedule them in the
+renditions pool.
+"""
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+
+IMPORT_DIR = 'product_images/imported'
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class Ingestion:
+    def __init__(self):
+        self.names = {}
+        self.missing = []
+        self.linked = self.copied = self.deduplicated = 0
+
+    def summary(self):
+        text = (
+            f"{self.linked} linked, {self.copied} copied, "
+            f"{self.deduplicated} already stored, {len(self.missing)} missing"
+        )
+        if self.missing:
+            text += ': ' + ', '.join(self.missing)
+        return text
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hashed_name(digest, source):
+    extension = os.path.splitext(source)[1].lower()
+    return f'{IMPORT_DIR}/{digest[:2]}/{digest[:20]}{extension}'
+
+
+def _locate(path, source_dir, storage):
+    """('stored', name), ('file', (local path, hashed name)) or ('missing', path)."""
+    media_root = os.path.abspath(settings.MEDIA_ROOT)
+    if os.path.isabs(path) and os.path.commonpath([media_root, os.path.abspath(path)]) == media_root:
+        # An absolute path into MEDIA_ROOT is a stored file by another name.
+        path = os.path.relpath(path, media_root).replace(os.sep, '/')
+    if not os.path.isabs(path) and '..' not in path.split('/') and storage.exists(path):
+        return 'stored', path
+    local = path if os.path.isabs(path) else os.path.join(source_dir, path) if source_dir else None
+    if local and os.path.isfile(local):
+        return 'file', (local, hashed_name(_hash_file(local), local))
+    return 'missing', path
+
+
+def _copy(local, name, storage):
+    """Store `local` as `name` unless an identical file is already there; True if copied."""
+    if storage.exists(name):
+        return False
+    with open(local, 'rb') as f:
+        saved = storage.save(name, File(f))
+    if saved != name:
+        # Another worker stored the same content first; keep theirs.
+        storage.delete(saved)
+        return False
+    return True
+
+
+def ingest(paths, source_dir=None, workers=None, storage=default_storage, dry_run=False):
+    """
+    Resolve every path in `paths` to a storage name, copying files that
+    aren't stored yet (with `dry_run`, only counting them).
+    `Ingestion.names` maps each path found to its name.
+    """
+    paths = list(dict.fromkeys(path.strip() for path in paths if path and path.strip()))
+    result = Ingestion()
+    if not paths:
+        return result
+    workers = workers or getattr(settings, 'MEDIA_INGEST_WORKERS', 4)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-ingest') as pool:
+        located = dict(zip(paths, pool.map(lambda path: _locate(path, source_dir, storage), paths)))
+        copies = {}
+        for path, (kind, value) in located.items():
+            if kind == 'stored':
+                result.names[path] = value
+                result.linked += 1
+            elif kind == 'file':
+                local, name = value
+                result.names[path] = name
+                # Identical content under several paths is copied once.
+                copies.setdefault(name, local)
+            else:
+                result.missing.append(path)
+        if dry_run:
+            copied = [not exists for exists in pool.map(storage.exists, copies)]
+        else:
+            copied = list(pool.map(lambda item: _copy(item[1], item[0], storage), copies.items()))
+    result.copied = sum(copied)
+    result.deduplicated = sum(kind == 'file' for kind, _ in located.values()) - result.copied
+    return result
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def build_facets(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductVariation = apps.get_model('products', 'ProductVariation')
+    ProductFacet = apps.get_model('products', 'ProductFacet')
+    through = Product.categories.through
+
+    rows = []
+    for facet_type in ('color', 'size', 'weight'):
+        variations = ProductVariation.objects.filter(product__is_active=True, **{f'{facet_type}__gt': ''})
+        for value, count in variations.values_list(facet_type).annotate(n=Count('product_id', distinct=True)):
+            rows.append(ProductFacet(facet_type=facet_type, value=value, product_count=count))
+
+        memberships = through.objects.filter(product__is_active=True, **{f'product__variations__{facet_type}__gt': ''})
+        for category_id, value, count in memberships.values_list(
+            'category_id', f'product__variations__{facet_type}'
+        ).annotate(n=Count('product_id', distinct=True)):
+            rows.append(ProductFacet(facet_type=facet_type, value=value, category_id=category_id, product_count=count))
+    ProductFacet.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_alter_product_stock_quantity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet_type', models.CharField(choices=[('color', 'Color'), ('size', 'Size'), ('weight', 'Weight')], max_length=20)),
+                ('value', models.CharField(max_length=50)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='products.category')),
+            ],
+            options={
+                'ordering': ['facet_type', 'value'],
+                'indexes': [models.Index(fields=['category', 'facet_type', 'value'], name='productfacet_lookup_idx'), models.Index(fields=['facet_type', 'value'], name='productfacet_value_idx')],
+            },
+        ),
+        migrations.RunPython(build_facets, migrations.RunPython.noop),
+    ]
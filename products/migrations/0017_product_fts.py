@@ -0,0 +1,62 @@
+import html
+
+from django.db import migrations, OperationalError
+from django.utils.html import strip_tags
+
+
+def create_fts_table(apps, schema_editor):
+    # Full-text search is a SQLite-only optimization; other databases keep
+    # using the ORM search backend.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts USING fts5("
+            "name, body, categories, attributes, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    except OperationalError:
+        return  # SQLite built without FTS5
+
+    # Index the existing products through the historical models, the way
+    # FTS5SearchBackend.documents() does at this point in history.
+    Product = apps.get_model('products', 'Product')
+    ProductVariation = apps.get_model('products', 'ProductVariation')
+    categories, attributes = {}, {}
+    for product_id, name in Product.categories.through.objects.values_list('product_id', 'category__name'):
+        categories.setdefault(product_id, []).append(name or '')
+    for product_id, *values in ProductVariation.objects.values_list('product_id', 'color', 'size', 'weight'):
+        attributes.setdefault(product_id, set()).update(value for value in values if value)
+    rows = [
+        (
+            pk,
+            name or '',
+            ' '.join(html.unescape(strip_tags(text)) for text in (short_description, description) if text),
+            ' '.join(categories.get(pk, [])),
+            ' '.join(sorted(attributes.get(pk, []))),
+        )
+        for pk, name, short_description, description in Product.objects.values_list(
+            'pk', 'name', 'short_description', 'description'
+        ).iterator()
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO products_product_fts (rowid, name, body, categories, attributes) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS products_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_productfacet'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:38
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    parents = dict(Category.objects.values_list('pk', 'parent_id'))
+
+    def path_of(pk, seen=()):
+        parent_id = parents.get(pk)
+        if parent_id is None or parent_id in seen or parent_id not in parents:
+            return f"/{pk}/"
+        return f"{path_of(parent_id, seen + (pk,))}{pk}/"
+
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.path = path_of(category.pk)
+    Category.objects.bulk_update(categories, ['path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_product_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Materialized ids from the root, e.g. /1/5/12/', max_length=255),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Min, OuterRef, Subquery, When
+from django.db.models.functions import Coalesce
+
+
+def fill_effective_prices(apps, schema_editor):
+    # Mirrors products.models.effective_price_expression() with historical models.
+    Product = apps.get_model('products', 'Product')
+    ProductVariation = apps.get_model('products', 'ProductVariation')
+    cheapest_variation = ProductVariation.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+        price=Min('price')
+    ).values('price')
+    Product.objects.update(effective_price=Coalesce(
+        'sale_price',
+        'regular_price',
+        Case(When(product_type='variable', then=Subquery(cheapest_variation))),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_category_path'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, help_text='Price customers pay, used for price filters and sorting. Maintained automatically.', max_digits=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'effective_price'], name='product_active_price_idx'),
+        ),
+        migrations.RunPython(fill_effective_prices, migrations.RunPython.noop),
+    ]
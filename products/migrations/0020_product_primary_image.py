@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def fill_primary_images(apps, schema_editor):
+    # Mirrors products.models.primary_image_expression() with historical models.
+    Product = apps.get_model('products', 'Product')
+    ProductImage = apps.get_model('products', 'ProductImage')
+    Product.objects.update(primary_image=Subquery(
+        ProductImage.objects.filter(product=OuterRef('pk')).exclude(image='').exclude(image__isnull=True)
+        .order_by(F('is_featured').desc(nulls_last=True), 'order', 'pk').values('pk')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0019_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Image shown on product cards. Maintained automatically.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.productimage'),
+        ),
+        migrations.RunPython(fill_primary_images, migrations.RunPython.noop),
+    ]
@@ -6,25 +6,101 @@ from ckeditor.fields import RichTextField
 from django.core.validators import MinValueValidator
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
+from django.core.exceptions import ValidationError
+from django.db.models import Case, F, Min, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Concat, Substr
 
 User = settings.AUTH_USER_MODEL
 
 
+def subtree_range(path):
+    """
+    (lower, upper) bounds of every path in the subtree rooted at `path`.
+    Paths look like '/1/5/12/'; '0' sorts right after '/', so a plain range
+    scan on the indexed column finds the whole subtree.
+    """
+    return path, path[:-1] + '0'
+
+
+class CategoryQuerySet(models.QuerySet):
+    def descendants(self, category, include_self=False):
+        if not category.path:
+            return self.none()
+        lower, upper = subtree_range(category.path)
+        descendants = self.filter(path__gte=lower, path__lt=upper)
+        if not include_self:
+            descendants = descendants.exclude(pk=category.pk)
+        return descendants
+
+    def ancestors(self, category, include_self=False):
+        ids = category.path_ids()
+        if not include_self:
+            ids = ids[:-1]
+        # An ancestor's path is a prefix of its descendants', so this is root-first.
+        return self.filter(pk__in=ids).order_by('path')
+
+
 class Category(models.Model):
     name = models.CharField(max_length=255, unique=True, blank=True, null=True, verbose_name=_("Category Name"))
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='children', verbose_name=_("Parent Category"))
     slug = models.SlugField(max_length=255, unique=True, blank=True, null=True, verbose_name=_("Category Slug"))
     group_name = models.CharField(max_length=100, blank=True, null=True, help_text=_("A way to group categories (e.g., 'Gender', 'Brand', 'Department')"))
     image = models.ImageField(upload_to='category_images/', blank=True, null=True, verbose_name=_("Category Image"))
-    
-    def get_full_slug(self):
+    path = models.CharField(max_length=255, blank=True, default='', editable=False, db_index=True, help_text=_("Materialized ids from the root, e.g. /1/5/12/"))
+
+    objects = CategoryQuerySet.as_manager()
+
+    def path_ids(self):
+        return [int(pk) for pk in self.path.strip('/').split('/') if pk]
+
+    def get_descendants(self, include_self=False):
+        return Category.objects.descendants(self, include_self=include_self)
+
+    def get_ancestors(self, include_self=False):
+        return Category.objects.ancestors(self, include_self=include_self)
+
+    @property
+    def full_slug(self):
+        # Walk parents already loaded in memory (e.g. children fetched through
+        # parent.children); otherwise fetch the whole chain in one query.
         slugs = []
         category = self
-        while category:
-            slugs.insert(0, category.slug)
-            category = category.parent
-        return '/'.join(slugs)
-    
+        while category is not None:
+            slugs.insert(0, category.slug or '')
+            if category.parent_id is None:
+                return '/'.join(slugs)
+            category = category.parent if Category.parent.is_cached(category) else None
+        return '/'.join(slug or '' for slug in self.get_ancestors(include_self=True).values_list('slug', flat=True))
+
+    def get_full_slug(self):
+        return self.full_slug
+
+    def clean(self):
+        if self.pk and self.parent_id and self._is_own_descendant(self.parent_id):
+            raise ValidationError({'parent': _("A category cannot be moved under itself or its subcategories.")})
+
+    def _is_own_descendant(self, category_id):
+        parent_path = Category.objects.filter(pk=category_id).values_list('path', flat=True).first() or ''
+        return category_id == self.pk or (bool(self.path) and parent_path.startswith(self.path))
+
+    def _update_path(self):
+        """Store this category's path and move its whole subtree with one UPDATE."""
+        parent_path = '/'
+        if self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or '/'
+        new_path = f"{parent_path}{self.pk}/"
+        old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+        if new_path == old_path:
+            self.path = new_path
+            return
+
+        Category.objects.filter(pk=self.pk).update(path=new_path)
+        if old_path:
+            lower, upper = subtree_range(old_path)
+            Category.objects.filter(path__gte=lower, path__lt=upper).exclude(pk=self.pk).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1))
+            )
+        self.path = new_path
 
     def save(self, *args, **kwargs):
         if not self.name:
@@ -48,7 +124,11 @@ class Category(models.Model):
             self.slug = f"{base_slug}-{counter}"
             counter += 1
 
+        if self.pk and self.parent_id and self._is_own_descendant(self.parent_id):
+            raise ValueError("A category cannot be moved under itself or its subcategories.")
+
         super().save(*args, **kwargs)
+        self._update_path()
 
     def __str__(self):
         return self.name or f"Unnamed Category ({self.id})"
@@ -64,6 +144,29 @@ class Category(models.Model):
         verbose_name = _("Category")
         verbose_name_plural = _("Categories")
         ordering = ['group_name', 'name']
+        indexes = [
+            models.Index(fields=['group_name', 'name'], name='category_group_name_idx'),
+        ]
+
+
+class ProductQuerySet(models.QuerySet):
+    def update_effective_price(self):
+        """Recompute effective_price for every product in the queryset with one UPDATE."""
+        return self.update(effective_price=effective_price_expression())
+
+    def update_primary_image(self):
+        """Repoint primary_image for every product in the queryset with one UPDATE."""
+        return self.update(primary_image=primary_image_expression())
+
+    def with_card_data(self, categories=True):
+        """
+        Everything a product card renders: the primary image joined in, and
+        category names prefetched (one extra query) unless `categories` is off.
+        """
+        products = self.select_related('primary_image')
+        if categories:
+            products = products.prefetch_related('categories')
+        return products
 
 
 class Product(models.Model):
@@ -84,6 +187,8 @@ class Product(models.Model):
     
     regular_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0.0)], blank=True, null=True) 
     sale_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, validators=[MinValueValidator(0.0)])
+    primary_image = models.ForeignKey('ProductImage', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+', help_text="Image shown on product cards. Maintained automatically.")
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False, help_text="Price customers pay, used for price filters and sorting. Maintained automatically.")
     
     stock_quantity = models.PositiveIntegerField(default=10, blank=True, null=True) 
     
@@ -96,8 +201,19 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, null=True) 
     updated_at = models.DateTimeField(auto_now=True, null=True) 
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Listing sorts and the price filter over active products, and the
+            # home page's featured products, newest first. Partial indexes:
+            # boolean columns are too unselective to lead a composite one.
+            models.Index(fields=['effective_price', 'id'], condition=Q(is_active=True), name='product_active_price_idx'),
+            models.Index(fields=['created_at', 'id'], condition=Q(is_active=True), name='product_active_created_idx'),
+            models.Index(fields=['name', 'id'], condition=Q(is_active=True), name='product_active_name_idx'),
+            models.Index(fields=['created_at'], condition=Q(is_featured=True), name='product_featured_created_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.name:
@@ -126,8 +242,16 @@ class Product(models.Model):
         if self.sale_price is not None and self.sale_price < 0:
             self.sale_price = 0
 
+        self.effective_price = self.get_effective_price()
         super().save(*args, **kwargs)
 
+    def get_effective_price(self):
+        # Same rule as effective_price_expression(), evaluated in Python.
+        price = self.get_display_price()
+        if price is None and self.product_type == self.VARIABLE and self.pk:
+            price = self.variations.aggregate(price=Min('price'))['price']
+        return price
+
     def get_display_price(self):
         if self.sale_price is not None:
             return self.sale_price
@@ -198,8 +322,41 @@ class ProductVariation(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     stock = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # Covers the color/size/weight EXISTS filters and facet counts
+            # without touching the table.
+            models.Index(fields=['product', 'color', 'size', 'weight'], name='variation_attributes_idx'),
+        ]
+
     def __str__(self):
         return f"{self.product.name} - {self.size or ''} {self.weight or ''} {self.color or ''}".strip()
+
+
+def primary_image_expression():
+    """
+    SQL for a product's main image: featured images first, then by `order`,
+    skipping image rows without a file.
+    """
+    return Subquery(
+        ProductImage.objects.filter(product=OuterRef('pk')).exclude(image='').exclude(image__isnull=True)
+        .order_by(F('is_featured').desc(nulls_last=True), 'order', 'pk').values('pk')[:1]
+    )
+
+
+def effective_price_expression():
+    """
+    SQL for a product's effective price: the sale price, else the regular
+    price, else (for variable products) the cheapest variation.
+    """
+    cheapest_variation = ProductVariation.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+        price=Min('price')
+    ).values('price')
+    return Coalesce(
+        'sale_price',
+        'regular_price',
+        Case(When(product_type=Product.VARIABLE, then=Subquery(cheapest_variation))),
+    )
     
 
 class DeliveryCharge(models.Model):
@@ -207,4 +364,35 @@ class DeliveryCharge(models.Model):
     charge = models.DecimalField(max_digits=10, decimal_places=2)  # Delivery Charge Amount
 
     def __str__(self):
-        return f"{self.zone} - {self.charge}"
\ No newline at end of file
+        return f"{self.zone} - {self.charge}"
+
+class ProductFacet(models.Model):
+    """
+    Materialized color/size/weight filter values with the number of active
+    products carrying each one, globally (category empty) and per category.
+    Kept current by the signal handlers in products/signals.py; rebuild it
+    from scratch with `manage.py rebuild_facets`.
+    """
+    COLOR = 'color'
+    SIZE = 'size'
+    WEIGHT = 'weight'
+
+    FACET_TYPE_CHOICES = [
+        (COLOR, 'Color'),
+        (SIZE, 'Size'),
+        (WEIGHT, 'Weight'),
+    ]
+    facet_type = models.CharField(max_length=20, choices=FACET_TYPE_CHOICES)
+    value = models.CharField(max_length=50)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='facets', blank=True, null=True)
+    product_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['facet_type', 'value']
+        indexes = [
+            models.Index(fields=['category', 'facet_type', 'value'], name='productfacet_lookup_idx'),
+            models.Index(fields=['facet_type', 'value'], name='productfacet_value_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_facet_type_display()}: {self.value} ({self.product_count})"
@@ -0,0 +1,163 @@
+import hashlib
+import math
+from collections.abc import Sequence
+
+from django.core import signing
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+from multi_vendor_site.caching import Namespace
+
+
+CURSOR_SALT = 'products.pagination.cursor'
+COUNT_TIMEOUT = 60 * 5
+COUNT_CACHE = Namespace('catalog_count', timeout=COUNT_TIMEOUT)
+
+
+def encode_cursor(position):
+    return signing.dumps(position, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token):
+    """The position stored in `token`, or None if it is missing or tampered with."""
+    if not token:
+        return None
+    try:
+        return signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+
+
+def cached_count(queryset, timeout=COUNT_TIMEOUT):
+    """
+    COUNT(*) of `queryset`, cached for a few minutes per distinct query.
+    Listings only show it as "page x of y", so a slightly stale total is fine.
+    """
+    sql, params = queryset.query.sql_with_params()
+    key = hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+    return COUNT_CACHE.get_or_set(key, queryset.count, timeout)
+
+
+class KeysetPage(Sequence):
+    """Quacks like django.core.paginator.Page for the listing templates."""
+    is_keyset = True
+
+    def __init__(self, object_list, number, paginator, previous_cursor=None, next_cursor=None):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Seek pagination on (`ordering`, pk): each page is
+    `WHERE (field, pk) > (last value, last pk) ORDER BY field, pk LIMIT n`,
+    so page 500 costs the same as page 1. NULLs (in nullable fields) sort
+    last in either direction. Pages are addressed by opaque signed cursors
+    instead of numbers, and the total is an approximate cached count.
+    """
+
+    def __init__(self, object_list, ordering, per_page):
+        self.object_list = object_list
+        self.ordering = ordering
+        self.descending = ordering.startswith('-')
+        self.field = ordering.lstrip('-')
+        self.nullable = object_list.model._meta.get_field(self.field).null
+        self.per_page = per_page
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list.order_by())
+
+    @cached_property
+    def num_pages(self):
+        return max(1, math.ceil(self.count / self.per_page))
+
+    def _order(self, queryset, backwards):
+        descending = self.descending != backwards
+        nulls = {}
+        if self.nullable:
+            nulls = {'nulls_first': True} if backwards else {'nulls_last': True}
+        column = F(self.field).desc(**nulls) if descending else F(self.field).asc(**nulls)
+        pk = F('pk').desc() if descending else F('pk').asc()
+        return queryset.order_by(column, pk)
+
+    def _seek(self, value, pk, backwards):
+        """Rows after (value, pk) in page order, or before it when going backwards."""
+        field = self.field
+        forward_op = 'lt' if self.descending else 'gt'
+        op = {'lt': 'gt', 'gt': 'lt'}[forward_op] if backwards else forward_op
+        if value is None:
+            if backwards:
+                return Q(**{f'{field}__isnull': False}) | Q(**{f'{field}__isnull': True, f'pk__{op}': pk})
+            return Q(**{f'{field}__isnull': True, f'pk__{op}': pk})
+        # The redundant `field >= value` (or <=) lets the database start an
+        # index range scan at the cursor instead of filtering from the top.
+        seek = Q(**{f'{field}__{op}e': value}) & (Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'pk__{op}': pk}))
+        if self.nullable and not backwards:
+            seek |= Q(**{f'{field}__isnull': True})
+        return seek
+
+    def _cursor(self, obj, number, backwards):
+        value = getattr(obj, self.field)
+        if value is not None:
+            value = self.object_list.model._meta.get_field(self.field).value_to_string(obj)
+        return encode_cursor({
+            'o': self.ordering, 'v': value, 'pk': obj.pk, 'n': number, 'd': 'p' if backwards else 'n',
+        })
+
+    def seek_queryset(self, value=None, pk=None, backwards=False):
+        """The query for the rows after (value, pk), or the first page when pk is None."""
+        queryset = self.object_list
+        if pk is not None:
+            queryset = queryset.filter(self._seek(value, pk, backwards))
+        return self._order(queryset, backwards)[:self.per_page + 1]
+
+    def page(self, cursor=None):
+        position = decode_cursor(cursor)
+        if position is not None and position.get('o') != self.ordering:
+            # Cursor from a different sort order: start over.
+            position = None
+
+        backwards = False
+        number = 1
+        value = pk = None
+        if position is not None:
+            backwards = position['d'] == 'p'
+            number = position['n']
+            value, pk = position['v'], position['pk']
+            if value is not None:
+                value = self.object_list.model._meta.get_field(self.field).to_python(value)
+
+        rows = list(self.seek_queryset(value, pk, backwards))
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = position is not None, has_more
+
+        previous_cursor = next_cursor = None
+        if rows and has_previous:
+            previous_cursor = self._cursor(rows[0], number - 1, backwards=True)
+        if rows and has_next:
+            next_cursor = self._cursor(rows[-1], number + 1, backwards=False)
+        return KeysetPage(rows, number, self, previous_cursor, next_cursor)
@@ -0,0 +1,147 @@
+"""
+Resized WebP/AVIF copies of product images.
+
+Every original `product_images/2025/07/dress.jpg` gets one file per
+rendition width and format, stored next to the other media under a name
+derived only from the original:
+
+    renditions/product_images/2025/07/dress.jpg-480w.webp
+
+They are rendered in a background thread pool after an image is saved,
+on first request through products.views.rendition for anything missing,
+or in bulk with `manage.py generate_renditions`.
+"""
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+
+logger = logging.getLogger(__name__)
+
+RENDITION_DIR = 'renditions'
+
+# name: (widths, `sizes` attribute for srcset)
+RENDITIONS = {
+    'thumb': ((100, 200), '100px'),
+    'card': ((320, 480, 640), '(min-width: 1280px) 20vw, (min-width: 1024px) 25vw, (min-width: 768px) 33vw, 50vw'),
+    'zoom': ((1024, 1600), '100vw'),
+}
+WIDTHS = {width for widths, _ in RENDITIONS.values() for width in widths}
+
+# Preferred first; AVIF only when this Pillow build can encode it.
+FORMATS = [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+CONTENT_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+QUALITY = {'avif': 55, 'webp': 80}
+
+_RENDITION_RE = re.compile(rf'^{RENDITION_DIR}/(?P<original>.+)-(?P<width>\d+)w\.(?P<fmt>[a-z]+)$')
+
+
+def rendition_name(original_name, width, fmt):
+    return f"{RENDITION_DIR}/{original_name}-{width}w.{fmt}"
+
+
+def parse_rendition_name(name):
+    """(original name, width, format) for a rendition path, or None if it isn't one we make."""
+    match = _RENDITION_RE.match(name)
+    if not match:
+        return None
+    width, fmt = int(match['width']), match['fmt']
+    if width not in WIDTHS or fmt not in FORMATS or '..' in match['original'].split('/'):
+        return None
+    return match['original'], width, fmt
+
+
+def render(original, width, fmt):
+    """Bytes of `original` (a file object) scaled down to `width` in `fmt`."""
+    with Image.open(original) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.mode in ('LA', 'P', 'PA') else 'RGB')
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        output = BytesIO()
+        image.save(output, fmt.upper(), quality=QUALITY[fmt])
+    return output.getvalue()
+
+
+def generate_rendition(original_name, width, fmt, storage=default_storage):
+    name = rendition_name(original_name, width, fmt)
+    if storage.exists(name):
+        return name
+    with storage.open(original_name, 'rb') as original:
+        content = render(original, width, fmt)
+    saved = storage.save(name, ContentFile(content))
+    if saved != name:
+        # Another worker got there first; keep theirs.
+        storage.delete(saved)
+    return name
+
+
+def generate_renditions(original_name, storage=default_storage):
+    """Every rendition of `original_name`; returns how many files exist afterwards."""
+    count = 0
+    for widths, _ in RENDITIONS.values():
+        for width in widths:
+            for fmt in FORMATS:
+                generate_rendition(original_name, width, fmt, storage)
+                count += 1
+    return count
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_RENDITION_WORKERS', 2), thread_name_prefix='renditions'
+            )
+    return _executor
+
+
+def _generate_logged(original_name):
+    try:
+        return generate_renditions(original_name)
+    except Exception:
+        logger.exception("Could not render %s", original_name)
+        raise
+
+
+def schedule_renditions(original_name):
+    """Render `original_name` in the worker pool; returns the Future."""
+    return get_executor().submit(_generate_logged, original_name)
+
+
+def rendition_url(image, rendition='card', fmt='webp'):
+    """URL of the widest `rendition` of an ImageFieldFile (rendered on first request)."""
+    if not image:
+        return ''
+    if fmt not in FORMATS:
+        return image.url
+    widths, _ = RENDITIONS[rendition]
+    return default_storage.url(rendition_name(image.name, widths[-1], fmt))
+
+
+def rendition_sources(image, rendition='card'):
+    """[{'type', 'srcset', 'sizes'}] for <source> tags in a <picture>, best format first."""
+    if not image:
+        return []
+    widths, sizes = RENDITIONS[rendition]
+    return [
+        {
+            'type': CONTENT_TYPES[fmt],
+            'srcset': ', '.join(f"{default_storage.url(rendition_name(image.name, width, fmt))} {width}w" for width in widths),
+            'sizes': sizes,
+        }
+        for fmt in FORMATS
+    ]
@@ -0,0 +1,162 @@
+import html
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+from django.utils.module_loading import import_string
+
+from .models import Product, ProductVariation
+
+
+FTS_TABLE = 'products_product_fts'
+
+# bm25 column weights: name, body, categories, attributes
+FTS_WEIGHTS = (10.0, 1.0, 4.0, 2.0)
+
+
+class ORMSearchBackend:
+    """
+    Substring search over product text and category names. Works on every
+    database, but LIKE '%term%' cannot use an index.
+    """
+    ranked = False
+
+    def filter(self, products, query):
+        through = Product.categories.through
+        in_matching_category = Exists(through.objects.filter(
+            product_id=OuterRef('pk'), category__name__icontains=query
+        ))
+        return products.filter(
+            Q(name__icontains=query) |
+            Q(short_description__icontains=query) |
+            Q(description__icontains=query) |
+            in_matching_category
+        )
+
+    def rank(self, products, query):
+        return products
+
+    def index_products(self, product_ids):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def rebuild(self, batch_size=500):
+        return 0
+
+
+class FTS5SearchBackend(ORMSearchBackend):
+    """
+    SQLite FTS5 index over product name, tag-stripped descriptions, category
+    names and variation attributes, with bm25 ranking and prefix matching.
+    The virtual table is created by products/migrations/0017; rows are kept
+    in sync by products/signals.py.
+    """
+    ranked = True
+
+    @staticmethod
+    def match_expression(query):
+        # Every word must match, each as a prefix: `red dre` -> "red"* "dre"*
+        terms = re.findall(r'\w+', query)
+        return ' '.join('"%s"*' % term for term in terms)
+
+    def filter(self, products, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return products.none()
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression])
+        return products.filter(pk__in=matches)
+
+    def rank(self, products, query):
+        """
+        Annotate `search_rank` (bm25, lower is better). Kept apart from
+        filter() so counts and non-relevance sorts skip the per-row subquery.
+        """
+        expression = self.match_expression(query)
+        if not expression:
+            return products
+        rank = RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {", ".join(map(str, FTS_WEIGHTS))}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {Product._meta.db_table}.id',
+            [expression],
+        )
+        return products.annotate(search_rank=rank)
+
+    def documents(self, product_ids):
+        """(rowid, name, body, categories, attributes) rows for `product_ids`."""
+        categories = {}
+        through = Product.categories.through
+        for product_id, name in through.objects.filter(product_id__in=product_ids).values_list('product_id', 'category__name'):
+            categories.setdefault(product_id, []).append(name or '')
+
+        attributes = {}
+        for product_id, *values in ProductVariation.objects.filter(product_id__in=product_ids).values_list(
+            'product_id', 'color', 'size', 'weight'
+        ):
+            attributes.setdefault(product_id, set()).update(value for value in values if value)
+
+        products = Product.objects.filter(pk__in=product_ids).values_list(
+            'pk', 'name', 'short_description', 'description'
+        )
+        for pk, name, short_description, description in products:
+            body = ' '.join(html.unescape(strip_tags(text)) for text in (short_description, description) if text)
+            yield (
+                pk,
+                name or '',
+                body,
+                ' '.join(categories.get(pk, [])),
+                ' '.join(sorted(attributes.get(pk, []))),
+            )
+
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        with connection.cursor() as cursor:
+            placeholders = ', '.join(['%s'] * len(product_ids))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+
+    def index_products(self, product_ids):
+        product_ids = list(product_ids)
+        self.remove_products(product_ids)
+        rows = list(self.documents(product_ids))
+        if rows:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, name, body, categories, attributes) VALUES (%s, %s, %s, %s, %s)',
+                    rows,
+                )
+
+    def rebuild(self, batch_size=500):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        product_ids = list(Product.objects.values_list('pk', flat=True))
+        for start in range(0, len(product_ids), batch_size):
+            self.index_products(product_ids[start:start + batch_size])
+        return len(product_ids)
+
+
+_backend = None
+
+
+def fts5_available():
+    return connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+
+
+def get_search_backend():
+    """
+    The backend named by settings.PRODUCT_SEARCH_BACKEND, or FTS5 when the
+    index table exists on SQLite, else the ORM fallback.
+    """
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+        if backend_path:
+            _backend = import_string(backend_path)()
+        else:
+            _backend = FTS5SearchBackend() if fts5_available() else ORMSearchBackend()
+    return _backend
@@ -0,0 +1,225 @@
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .category_tree import bump_category_tree_version
+from .detail import invalidate_product_details
+from .facets import FACET_TYPES, facet_values, merge_values, refresh_facets, refresh_product_facets
+from .models import Category, Product, ProductImage, ProductVariation, subtree_range
+from .renditions import schedule_renditions
+from .search import get_search_backend
+
+
+def _variation_values(row):
+    return {facet_type: {value} for facet_type, value in zip(FACET_TYPES, row) if value}
+
+
+# Facet index
+
+@receiver(pre_save, sender=ProductVariation)
+def remember_variation_facets(sender, instance, raw=False, **kwargs):
+    instance._facet_values_before = None
+    if instance.pk and not raw:
+        row = ProductVariation.objects.filter(pk=instance.pk).values_list(*FACET_TYPES).first()
+        if row:
+            instance._facet_values_before = _variation_values(row)
+
+
+@receiver(post_save, sender=ProductVariation)
+def update_variation_facets(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    current = _variation_values([getattr(instance, facet_type) for facet_type in FACET_TYPES])
+    refresh_facets(merge_values(getattr(instance, '_facet_values_before', None), current))
+
+
+@receiver(post_delete, sender=ProductVariation)
+def remove_variation_facets(sender, instance, **kwargs):
+    refresh_facets(merge_values(_variation_values([getattr(instance, facet_type) for facet_type in FACET_TYPES])))
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_visibility(sender, instance, raw=False, **kwargs):
+    # The old slug too, for the detail page cache's slug map.
+    instance._was_active = instance._slug_before = None
+    if instance.pk and not raw:
+        row = Product.objects.filter(pk=instance.pk).values_list('is_active', 'slug').first()
+        if row:
+            instance._was_active, instance._slug_before = row
+
+
+@receiver(post_save, sender=Product)
+def update_product_facets(sender, instance, created, raw=False, **kwargs):
+    # A new product has no variations yet; only visibility changes matter.
+    if raw or created or getattr(instance, '_was_active', None) == instance.is_active:
+        return
+    refresh_product_facets([instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def update_category_facets(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # pk_set is empty for clears, so remember who was attached.
+        instance._cleared_product_ids = list(instance.products.values_list('pk', flat=True)) if reverse else [instance.pk]
+        instance._facet_values_before = facet_values(instance._cleared_product_ids)
+    elif action == 'post_clear':
+        refresh_facets(getattr(instance, '_facet_values_before', None) or {})
+        get_search_backend().index_products(getattr(instance, '_cleared_product_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        product_ids = list(pk_set) if reverse else [instance.pk]
+        refresh_product_facets(product_ids)
+        get_search_backend().index_products(product_ids)
+
+
+# Effective price
+
+@receiver(post_save, sender=ProductVariation)
+@receiver(post_delete, sender=ProductVariation)
+def update_variation_product_price(sender, instance, raw=False, **kwargs):
+    # Variable products without a base price are listed at their cheapest variation.
+    if instance.product_id and not raw:
+        Product.objects.filter(pk=instance.product_id).update_effective_price()
+
+
+# Primary image
+
+@receiver(pre_save, sender=ProductImage)
+def remember_image_product(sender, instance, raw=False, **kwargs):
+    instance._product_id_before = instance._image_name_before = None
+    if instance.pk and not raw:
+        row = ProductImage.objects.filter(pk=instance.pk).values_list('product_id', 'image').first()
+        if row:
+            instance._product_id_before, instance._image_name_before = row
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def update_primary_image(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # An image moved to another product changes both products' cards.
+    product_ids = {instance.product_id, getattr(instance, '_product_id_before', None)} - {None}
+    if product_ids:
+        Product.objects.filter(pk__in=product_ids).update_primary_image()
+
+
+# Image renditions
+
+@receiver(post_save, sender=ProductImage)
+def render_image_renditions(sender, instance, raw=False, **kwargs):
+    # Off the request thread, once the new file is committed.
+    name = instance.image.name if instance.image else None
+    if raw or not name or name == getattr(instance, '_image_name_before', None):
+        return
+    transaction.on_commit(lambda: schedule_renditions(name))
+
+
+# Search index
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(post_save, sender=ProductVariation)
+@receiver(post_delete, sender=ProductVariation)
+def index_variation_product(sender, instance, raw=False, **kwargs):
+    if instance.product_id and not raw:
+        get_search_backend().index_products([instance.product_id])
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_name(sender, instance, raw=False, **kwargs):
+    instance._name_before = None
+    if instance.pk and not raw:
+        instance._name_before = Category.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    if raw or created or getattr(instance, '_name_before', None) == instance.name:
+        return
+    get_search_backend().index_products(instance.products.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_products(sender, instance, **kwargs):
+    # The links go with the category, so note whose index rows name it now.
+    instance._indexed_product_ids = list(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def reindex_deleted_category_products(sender, instance, **kwargs):
+    product_ids = getattr(instance, '_indexed_product_ids', None)
+    if product_ids:
+        get_search_backend().index_products(product_ids)
+
+
+# Category tree
+
+@receiver(pre_delete, sender=Category)
+def reroot_subcategories(sender, instance, **kwargs):
+    # Children are detached with SET_NULL, which bypasses save(); cut the
+    # deleted category's prefix off every path below it in one UPDATE.
+    if not instance.path:
+        return
+    lower, upper = subtree_range(instance.path)
+    Category.objects.filter(path__gte=lower, path__lt=upper).exclude(pk=instance.pk).update(
+        path=Concat(Value('/'), Substr('path', len(instance.path) + 1))
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    bump_category_tree_version()
+
+
+# Detail page cache
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_detail(sender, instance, **kwargs):
+    invalidate_product_details([instance.pk], slugs={instance.slug, getattr(instance, '_slug_before', None)})
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_image_product_detail(sender, instance, **kwargs):
+    invalidate_product_details({instance.product_id, getattr(instance, '_product_id_before', None)} - {None})
+
+
+@receiver(post_save, sender=ProductVariation)
+@receiver(post_delete, sender=ProductVariation)
+def invalidate_variation_product_detail(sender, instance, **kwargs):
+    if instance.product_id:
+        invalidate_product_details([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def invalidate_category_product_details(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_product_details([instance.pk])
+    elif pk_set:
+        invalidate_product_details(pk_set)
+    else:
+        # category.products.clear(): every product that was in it.
+        invalidate_product_details(getattr(instance, '_cleared_product_ids', None))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_all_product_details(sender, **kwargs):
+    # Names and links of categories show on every product in them, and on
+    # the products under renamed or moved subcategories.
+    invalidate_product_details()
@@ -1,3 +1,746 @@
+import json
+import shutil
+import tempfile
+from io import BytesIO
+
+import tablib
+from import_export.instance_loaders import ModelInstanceLoader
+from PIL import Image as PILImage
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import QueryDict
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from multi_vendor_site.exports import export_stream
+
+from .admin import ProductImageResource, ProductResource
+from .bulk_import import ProductImporter
+from .media_ingest import ingest
+from .catalog import CatalogQuery
+from .detail import detail_bundle
+from .facets import rebuild_facets
+from .models import Category, Product, ProductFacet, ProductImage, ProductVariation
+from .renditions import CONTENT_TYPES, FORMATS, rendition_name, rendition_sources, rendition_url, schedule_renditions
+from .search import FTS5SearchBackend, ORMSearchBackend, get_search_backend
+
+
+class CatalogQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.women = Category.objects.create(name='Women')
+        cls.dresses = Category.objects.create(name='Dresses', parent=cls.women)
+        cls.men = Category.objects.create(name='Men')
+
+        cls.red_dress = Product.objects.create(name='Red Dress', regular_price=1200, product_type=Product.VARIABLE)
+        cls.red_dress.categories.add(cls.dresses)
+        ProductVariation.objects.create(product=cls.red_dress, color='Red', size='M', stock=3)
+        ProductVariation.objects.create(product=cls.red_dress, color='Blue', size='L', stock=3)
+
+        cls.shirt = Product.objects.create(name='Oxford Shirt', regular_price=800, sale_price=600)
+        cls.shirt.categories.add(cls.men)
+        ProductVariation.objects.create(product=cls.shirt, color='White', size='M', stock=5)
+
+        cls.hidden = Product.objects.create(name='Hidden Dress', regular_price=100, is_active=False)
+        cls.hidden.categories.add(cls.dresses)
+
+    def run_catalog(self, query_string, category=None):
+        catalog = CatalogQuery(QueryDict(query_string), category=category)
+        context = catalog.context(1)
+        return context, list(context['products'])
+
+    def test_filters(self):
+        _, products = self.run_catalog('')
+        self.assertEqual(set(products), {self.red_dress, self.shirt})
+
+        _, products = self.run_catalog('category=women')
+        self.assertEqual(products, [self.red_dress])
+
+        _, products = self.run_catalog('search=oxford')
+        self.assertEqual(products, [self.shirt])
+
+        _, products = self.run_catalog('search=dresses')
+        self.assertEqual(products, [self.red_dress])
+
+        _, products = self.run_catalog('min_price=500&max_price=700')
+        self.assertEqual(products, [self.shirt])
+
+        # Color and size have to match on the same variation.
+        _, products = self.run_catalog('color=Red&size=M')
+        self.assertEqual(products, [self.red_dress])
+        _, products = self.run_catalog('color=Red&size=L')
+        self.assertEqual(products, [])
+
+    def test_sort_and_legacy_aliases(self):
+        context, products = self.run_catalog('sort_by=name')
+        self.assertEqual(products, [self.shirt, self.red_dress])
+        context, products = self.run_catalog('sort_by=price_desc')
+        self.assertEqual(context['current_sort'], '-price')
+        self.assertEqual(products, [self.red_dress, self.shirt])
+        context, _ = self.run_catalog('sort_by=regular_price')
+        self.assertEqual(context['current_sort'], 'price')
+
+    def test_effective_price(self):
+        self.assertEqual(self.shirt.effective_price, 600)
+
+        # A variable product without a base price is listed at its cheapest variation.
+        gown = Product.objects.create(name='Gown', product_type=Product.VARIABLE)
+        self.assertIsNone(gown.effective_price)
+        cheap = ProductVariation.objects.create(product=gown, price=400, stock=1)
+        ProductVariation.objects.create(product=gown, price=900, stock=1)
+        gown.refresh_from_db()
+        self.assertEqual(gown.effective_price, 400)
+
+        _, products = self.run_catalog('min_price=300&max_price=500')
+        self.assertEqual(products, [gown])
+        _, products = self.run_catalog('sort_by=price')
+        self.assertEqual(products, [gown, self.shirt, self.red_dress])
+
+        cheap.delete()
+        gown.refresh_from_db()
+        self.assertEqual(gown.effective_price, 900)
+        gown.sale_price = 850
+        gown.save()
+        self.assertEqual(Product.objects.get(pk=gown.pk).effective_price, 850)
+
+    def test_category_scope_facets(self):
+        context, products = self.run_catalog('', category=self.women)
+        self.assertEqual(products, [])
+        context, products = self.run_catalog('', category=self.dresses)
+        self.assertEqual(products, [self.red_dress])
+        self.assertEqual(context['available_filters']['colors'], ['Blue', 'Red'])
+        self.assertEqual(context['available_filters']['sizes'], ['L', 'M'])
+
+    def test_facet_counts_follow_filters(self):
+        context, _ = self.run_catalog('')
+        self.assertEqual({size: size.count for size in context['available_filters']['sizes']}, {'L': 1, 'M': 2})
+        context, _ = self.run_catalog('category=women')
+        self.assertEqual({size: size.count for size in context['available_filters']['sizes']}, {'L': 1, 'M': 1})
+
+
+    def test_query_count_is_independent_of_filters(self):
+        # Benchmark: the listing costs the same number of queries with no
+        # filters as with every filter selected at once.
+        query_strings = [
+            'color=Red',
+            'color=Red&color=Blue&size=M&size=L',
+            'color=Red&color=White&size=M&min_price=10&max_price=5000&search=dress&sort_by=-name',
+        ]
+        counts = []
+        for query_string in query_strings:
+            with CaptureQueriesContext(connection) as ctx:
+                self.run_catalog(query_string)
+            counts.append(len(ctx.captured_queries))
+            for query in ctx.captured_queries:
+                self.assertNotIn('SELECT DISTINCT "products_product"', query['sql'])
+        self.assertEqual(len(set(counts)), 1, counts)
+        self.assertLessEqual(counts[0], 6)
+
+        # Unfiltered pages take their facet counts straight from the index.
+        with self.assertNumQueries(counts[0] - 1):
+            self.run_catalog('')
+
+        # Resolving a category subtree costs one query however deep it is.
+        with self.assertNumQueries(counts[0] + 1):
+            self.run_catalog('category=women&color=Red&search=dress')
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Duplicate prices and names plus unpriced products exercise the pk
+        # tie-breaker and NULL handling.
+        for i, price in enumerate([300, 100, 300, None, 200, 100, None, 300]):
+            Product.objects.create(name=f'Item {i % 3}', regular_price=price)
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, query_string, per_page=3):
+        catalog = CatalogQuery(QueryDict(query_string))
+        pages = [catalog.keyset_page(per_page=per_page)]
+        while pages[-1].has_next():
+            pages.append(catalog.keyset_page(pages[-1].next_cursor, per_page=per_page))
+        return catalog, pages
+
+    def test_pages_match_offset_order(self):
+        for sort in ['-created_at', 'created_at', 'name', '-name', 'price', '-price']:
+            catalog, pages = self.walk(f'sort_by={sort}')
+            self.assertEqual([product for page in pages for product in page], list(catalog.ordered()), sort)
+            self.assertEqual([page.number for page in pages], [1, 2, 3])
+            self.assertEqual(pages[0].paginator.num_pages, 3)
+
+            # And back again from the last page.
+            page, backwards = pages[-1], []
+            while page.has_previous():
+                page = catalog.keyset_page(page.previous_cursor, per_page=3)
+                backwards.insert(0, list(page))
+            self.assertEqual(backwards, [list(page) for page in pages[:-1]], sort)
+            self.assertEqual(page.number, 1)
+
+    def test_deep_pages_cost_the_same(self):
+        catalog, pages = self.walk('sort_by=price', per_page=1)
+        with self.assertNumQueries(1):
+            catalog.keyset_page(per_page=1)
+        with self.assertNumQueries(1):
+            catalog.keyset_page(pages[-2].next_cursor, per_page=1)
+
+    def test_bad_or_stale_cursors_start_over(self):
+        catalog, pages = self.walk('sort_by=price')
+        first = [product.pk for product in pages[0]]
+        self.assertEqual([product.pk for product in catalog.keyset_page('garbage', per_page=3)], first)
+
+        other = CatalogQuery(QueryDict('sort_by=name'))
+        self.assertEqual(other.keyset_page(pages[1].next_cursor, per_page=3).number, 1)
+
+    def test_listing_views(self):
+        # Numbered pages unless keyset pagination is switched on.
+        response = self.client.get(reverse('website:shop'), {'sort_by': 'price'})
+        self.assertFalse(hasattr(response.context['products'], 'is_keyset'))
+        with self.settings(CATALOG_PAGINATION='keyset'):
+            response = self.client.get(reverse('website:shop'), {'sort_by': 'price'})
+        page = response.context['products']
+        self.assertTrue(page.is_keyset)
+        self.assertFalse(page.has_other_pages())
+        _, pages = self.walk('sort_by=price')
+        response = self.client.get(reverse('website:shop'), {'sort_by': 'price', 'cursor': pages[0].next_cursor})
+        self.assertEqual(response.context['products'].number, 2)
+        self.assertEqual(list(response.context['products']), [product for page in pages[1:] for product in page])
+        # Numbered links from before keep working.
+        response = self.client.get(reverse('website:shop'), {'page': 1})
+        self.assertEqual(response.context['products'].number, 1)
+        self.assertFalse(hasattr(response.context['products'], 'is_keyset'))
+
+
+class PrimaryImageTests(TestCase):
+    def test_follows_image_writes(self):
+        product = Product.objects.create(name='Dress', regular_price=10)
+        other = Product.objects.create(name='Shirt', regular_price=10)
+        ProductImage.objects.create(product=product, name='blank')
+        self.assertIsNone(Product.objects.get(pk=product.pk).primary_image)
+
+        back = ProductImage.objects.create(product=product, image='product_images/back.jpg', order=2)
+        side = ProductImage.objects.create(product=product, image='product_images/side.jpg', order=1)
+        self.assertEqual(Product.objects.get(pk=product.pk).primary_image, side)
+
+        # A featured image wins over `order`.
+        back.is_featured = True
+        back.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).primary_image, back)
+
+        back.product = other
+        back.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).primary_image, side)
+        self.assertEqual(Product.objects.get(pk=other.pk).primary_image, back)
+
+        side.delete()
+        self.assertIsNone(Product.objects.get(pk=product.pk).primary_image)
+
+    def test_card_data_query_count(self):
+        category = Category.objects.create(name='Dresses')
+        for i in range(10):
+            product = Product.objects.create(name=f'Dress {i}', regular_price=10)
+            product.categories.add(category)
+            ProductImage.objects.create(product=product, image=f'product_images/{i}.jpg')
+        with self.assertNumQueries(2):
+            cards = [
+                (product.primary_image.image.url, [c.name for c in product.categories.all()])
+                for product in Product.objects.with_card_data()
+            ]
+        self.assertEqual(len(cards), 10)
+
+
+class RenditionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        upload = BytesIO()
+        PILImage.new('RGB', (2000, 1000), 'red').save(upload, 'JPEG')
+        self.product = Product.objects.create(name='Dress', regular_price=10)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.image = ProductImage.objects.create(
+                product=self.product, image=SimpleUploadedFile('dress.jpg', upload.getvalue())
+            )
+        self.render_callbacks = callbacks
+
+    def test_generate_and_serve(self):
+        name = self.image.image.name
+        self.assertEqual(len(self.render_callbacks), 1)
+        self.assertEqual(schedule_renditions(name).result(), 7 * len(FORMATS))
+        with default_storage.open(rendition_name(name, 480, 'webp')) as f:
+            self.assertEqual(PILImage.open(f).size, (480, 240))
+
+        sources = rendition_sources(self.image.image, 'card')
+        self.assertEqual([source['type'] for source in sources], [CONTENT_TYPES[fmt] for fmt in FORMATS])
+        self.assertIn(f'/media/{rendition_name(name, 640, "webp")} 640w', sources[-1]['srcset'])
+
+    def test_rendered_on_first_request(self):
+        url = rendition_url(self.image.image, 'thumb')
+        self.assertFalse(default_storage.exists(rendition_name(self.image.image.name, 200, 'webp')))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertTrue(default_storage.exists(rendition_name(self.image.image.name, 200, 'webp')))
+
+        # Only the configured sizes, and only for files that exist.
+        self.assertEqual(self.client.get(url.replace('-200w', '-201w')).status_code, 404)
+        self.assertEqual(self.client.get(url.replace('dress', 'missing')).status_code, 404)
+
+
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        self.women = Category.objects.create(name='Women')
+        self.dress = Product.objects.create(name='Dress', regular_price=1000)
+        self.dress.categories.add(self.women)
+        self.variation = ProductVariation.objects.create(product=self.dress, color='Red', size='M')
+
+    def facets(self):
+        return set(ProductFacet.objects.values_list('facet_type', 'value', 'category_id', 'product_count'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.facets()
+        rebuild_facets()
+        self.assertEqual(incremental, self.facets())
+
+    def test_variation_changes(self):
+        self.assertEqual(self.facets(), {
+            ('color', 'Red', None, 1), ('color', 'Red', self.women.pk, 1),
+            ('size', 'M', None, 1), ('size', 'M', self.women.pk, 1),
+        })
+        self.variation.color = 'Blue'
+        self.variation.save()
+        self.assertIn(('color', 'Blue', None, 1), self.facets())
+        self.assertNotIn(('color', 'Red', None, 1), self.facets())
+        self.assertMatchesRebuild()
+
+        self.variation.delete()
+        self.assertEqual(self.facets(), set())
+
+    def test_product_visibility_and_categories(self):
+        self.dress.is_active = False
+        self.dress.save()
+        self.assertEqual(self.facets(), set())
+        self.dress.is_active = True
+        self.dress.save()
+        self.assertMatchesRebuild()
+
+        self.dress.categories.clear()
+        self.assertEqual(self.facets(), {('color', 'Red', None, 1), ('size', 'M', None, 1)})
+        self.women.products.add(self.dress)
+        self.assertMatchesRebuild()
+        self.assertIn(('size', 'M', self.women.pk, 1), self.facets())
+
+
+class SearchBackendTests(TestCase):
+    def setUp(self):
+        self.backend = get_search_backend()
+        self.sarees = Category.objects.create(name='Sarees')
+        self.saree = Product.objects.create(
+            name='Banarasi Silk', description='<p>Hand&nbsp;woven <strong>zari</strong> border</p>'
+        )
+        self.saree.categories.add(self.sarees)
+        ProductVariation.objects.create(product=self.saree, color='Maroon')
+        self.shirt = Product.objects.create(name='Oxford Shirt', short_description='Classic cotton')
+
+    def search(self, query):
+        return list(self.backend.filter(Product.objects.all(), query))
+
+    def test_index_follows_writes(self):
+        self.assertIsInstance(self.backend, FTS5SearchBackend)
+        self.assertEqual(self.search('banar'), [self.saree])
+        self.assertEqual(self.search('zari woven'), [self.saree])
+        self.assertEqual(self.search('strong'), [])  # markup is not indexed
+        self.assertEqual(self.search('maroon'), [self.saree])
+        self.assertEqual(self.search('sarees'), [self.saree])
+
+        self.sarees.name = 'Ethnic'
+        self.sarees.save()
+        self.assertEqual(self.search('ethnic'), [self.saree])
+        self.assertEqual(self.search('sarees'), [])
+        self.sarees.delete()
+        self.assertEqual(self.search('ethnic'), [])
+        self.assertEqual(self.search('banar'), [self.saree])
+
+        self.shirt.name = 'Linen Shirt'
+        self.shirt.save()
+        self.assertEqual(self.search('linen'), [self.shirt])
+
+        self.saree.delete()
+        self.assertEqual(self.search('banarasi'), [])
+
+    def test_ranking_and_orm_fallback(self):
+        other = Product.objects.create(name='Cotton Kurti', description='shirt collar')
+        matches = self.backend.filter(Product.objects.all(), 'shirt')
+        self.assertNotIn('bm25', str(matches.query))
+        results = self.backend.rank(matches, 'shirt').order_by('search_rank')
+        self.assertEqual(list(results), [self.shirt, other])
+
+        relevance = CatalogQuery(QueryDict('search=shirt')).ordered()
+        self.assertIn('bm25', str(relevance.query))
+        by_name = CatalogQuery(QueryDict('search=shirt&sort_by=name_asc')).ordered()
+        self.assertNotIn('bm25', str(by_name.query))
+
+        fallback = ORMSearchBackend().filter(Product.objects.all(), 'shirt')
+        self.assertEqual(set(fallback), {self.shirt, other})
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        self.women = Category.objects.create(name='Women')
+        self.clothing = Category.objects.create(name='Clothing', parent=self.women)
+        self.dresses = Category.objects.create(name='Dresses', parent=self.clothing)
+        self.men = Category.objects.create(name='Men')
+
+    def refresh(self, *categories):
+        for category in categories:
+            category.refresh_from_db()
+
+    def test_paths_and_lookups(self):
+        self.assertEqual(self.dresses.path, f'/{self.women.pk}/{self.clothing.pk}/{self.dresses.pk}/')
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.women.get_descendants()), [self.clothing, self.dresses])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.dresses.get_ancestors()), [self.women, self.clothing])
+        fresh = Category.objects.get(pk=self.dresses.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(fresh.full_slug, 'women/clothing/dresses')
+        self.assertEqual(list(Category.objects.descendants(self.men)), [])
+
+    def test_reparent_moves_subtree(self):
+        self.clothing.parent = self.men
+        self.clothing.save()
+        self.refresh(self.dresses)
+        self.assertEqual(self.dresses.path, f'/{self.men.pk}/{self.clothing.pk}/{self.dresses.pk}/')
+        self.assertEqual(list(self.women.get_descendants()), [])
+        self.assertEqual(self.dresses.get_full_slug(), 'men/clothing/dresses')
+
+        self.clothing.parent = self.dresses
+        with self.assertRaises(ValueError):
+            self.clothing.save()
+
+    def test_delete_reroots_children(self):
+        self.women.delete()
+        self.refresh(self.clothing, self.dresses)
+        self.assertIsNone(self.clothing.parent_id)
+        self.assertEqual(self.clothing.path, f'/{self.clothing.pk}/')
+        self.assertEqual(self.dresses.path, f'/{self.clothing.pk}/{self.dresses.pk}/')
+
+    def test_catalog_subtree(self):
+        dress = Product.objects.create(name='Dress', regular_price=10)
+        dress.categories.add(self.dresses)
+        ProductVariation.objects.create(product=dress, color='Red')
+
+        catalog = CatalogQuery(QueryDict(''), category=self.women)
+        self.assertEqual(list(catalog.ordered()), [])
+        catalog = CatalogQuery(QueryDict(''), category=self.women, include_descendants=True)
+        self.assertEqual(list(catalog.ordered()), [dress])
+        self.assertEqual(catalog.facets()['colors'], ['Red'])
+        self.assertEqual(list(CatalogQuery(QueryDict('category=women')).ordered()), [dress])
+
+
+class AdminChangelistTests(TestCase):
+    CHANGELISTS = ('product', 'productvariation', 'productimage', 'category')
+
+    def setUp(self):
+        cache.clear()
+        self.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(self.admin)
+        self.created = 0
+
+    def add_products(self, count):
+        root = Category.objects.create(name=f'Root {self.created}')
+        for i in range(self.created, self.created + count):
+            vendor = get_user_model().objects.create_user(f'vendor{i}')
+            category = Category.objects.create(name=f'Category {i}', parent=root)
+            product = Product.objects.create(
+                name=f'Dress {i}', regular_price=10, vendor=vendor, product_type=Product.VARIABLE
+            )
+            product.categories.add(category)
+            for size in 'SML':
+                ProductVariation.objects.create(product=product, size=size, stock=i)
+            ProductImage.objects.create(product=product, image=f'product_images/{i}.jpg')
+        self.created += count
+
+    def queries(self, model):
+        url = reverse(f'admin:products_{model}_changelist')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_changelists_run_a_constant_number_of_queries(self):
+        self.add_products(5)
+        small = {model: self.queries(model)[0] for model in self.CHANGELISTS}
+        self.add_products(95)
+        large = {model: self.queries(model)[0] for model in self.CHANGELISTS}
+        self.assertEqual(large, small)
+
+    def test_product_changelist_shows_annotated_totals(self):
+        self.add_products(2)
+        _, response = self.queries('product')
+        product = response.context['cl'].result_list[0]
+        self.assertEqual((product.variation_count, product.total_variation_stock), (3, 3 * int(product.name.split()[-1])))
+        # Filtering through categories joins them; the totals must not multiply.
+        product.categories.add(Category.objects.create(name='Sale'))
+        response = self.client.get(reverse('admin:products_product_changelist') + f'?categories__id__exact={product.categories.first().pk}')
+        self.assertEqual(response.context['cl'].result_list[0].variation_count, 3)
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def row(self, slug, **values):
+        row = {
+            'name': slug.title(), 'slug': slug, 'product_type': 'simple', 'vendor_username': 'vendor',
+            'category_names': 'Women|Dresses', 'regular_price': '100.00', 'sale_price': '',
+            'stock_quantity': '5', 'is_active': '1', 'is_featured': '0',
+            'exported_images': '', 'exported_variations': '',
+        }
+        row.update(values)
+        return row
+
+    def run_import(self, rows, **kwargs):
+        importer = ProductImporter(**kwargs)
+        stats = importer.run(rows)
+        return stats, importer.errors
+
+    def test_creates_then_applies_only_the_differences(self):
+        stats, errors = self.run_import([
+            self.row('red-dress', product_type='variable', exported_variations='S::Red:120:3|M::Red:130:0'),
+            self.row('shirt', sale_price='80', category_names='Men'),
+        ])
+        self.assertEqual(errors, [])
+        self.assertEqual((stats['products_created'], stats['categories_created'], stats['vendors_created']), (2, 3, 1))
+        dress = Product.objects.get(slug='red-dress')
+        self.assertEqual(dress.vendor.username, 'vendor')
+        self.assertEqual(set(dress.categories.values_list('name', flat=True)), {'Women', 'Dresses'})
+        self.assertEqual(sorted(dress.variations.values_list('size', 'price', 'stock')), [('M', 130, 0), ('S', 120, 3)])
+        self.assertEqual(dress.effective_price, 100)
+        self.assertEqual(Product.objects.get(slug='shirt').effective_price, 80)
+        self.assertEqual(get_search_backend().filter(Product.objects.all(), 'shirt').get().slug, 'shirt')
+
+        stats, _ = self.run_import([
+            self.row('red-dress', product_type='variable', regular_price='', exported_variations='S::Red:110:3|L::Red:150:1'),
+            self.row('shirt', sale_price='80', category_names='Men'),
+        ])
+        self.assertEqual((stats['products_updated'], stats['products_unchanged']), (1, 1))
+        self.assertEqual(
+            (stats['variations_created'], stats['variations_updated'], stats['variations_deleted']), (1, 1, 1)
+        )
+        dress.refresh_from_db()
+        self.assertEqual(sorted(dress.variations.values_list('size', 'price')), [('L', 150), ('S', 110)])
+        self.assertEqual(dress.effective_price, 110)
+
+    def test_images_reference_stored_files(self):
+        path = default_storage.save('product_images/imported/dress.jpg', BytesIO(b'jpeg'))
+        with self.captureOnCommitCallbacks() as callbacks:
+            _, errors = self.run_import([
+                self.row('dress', exported_images=f'Unnamed:{path}::1:0|Back:product_images/missing.jpg::0:1'),
+            ])
+        self.assertEqual(errors, ["1 image files not found: product_images/missing.jpg"])
+        image = ProductImage.objects.get()
+        self.assertEqual((image.image.name, image.name, image.is_featured), (path, 'dress', True))
+        self.assertEqual(Product.objects.get(slug='dress').primary_image, image)
+        self.assertEqual(len(callbacks), 1)
+
+        # Listed again: left alone; no longer listed: removed.
+        stats, _ = self.run_import([self.row('dress', exported_images=f'dress:{path}::1:0')])
+        self.assertEqual(stats['images_created'] + stats['images_updated'], 0)
+        self.run_import([self.row('dress', exported_images='x:product_images/other.jpg::0:0')])
+        self.assertFalse(ProductImage.objects.exists())
+
+    def test_dry_run_and_bad_rows(self):
+        stats, errors = self.run_import([self.row('dress'), self.row('bad', regular_price='ten')], dry_run=True)
+        self.assertEqual((stats['rows'], stats['products_created']), (2, 1))
+        self.assertEqual(errors, ["line 3: 'ten' is not a number"])
+        self.assertFalse(Product.objects.exists())
+
+    def admin_import(self, *rows, dry_run=False):
+        dataset = tablib.Dataset(headers=list(rows[0]))
+        for row in rows:
+            dataset.append(list(row.values()))
+        result = ProductResource().import_data(dataset, dry_run=dry_run)
+        self.assertFalse(result.has_errors())
+        return result
+
+    def test_admin_import_refreshes_facets(self):
+        self.admin_import(self.row('dress', product_type='variable', exported_variations='M::Red:10:1'))
+        facets = lambda: set(ProductFacet.objects.filter(category=None).values_list('facet_type', 'value'))
+        self.assertEqual(facets(), {('color', 'Red'), ('size', 'M')})
+        self.admin_import(self.row('dress', product_type='variable', exported_variations='L::Blue:99:7'))
+        self.assertEqual(facets(), {('color', 'Blue'), ('size', 'L')})
+
+    def test_admin_import_drops_cached_details(self):
+        self.admin_import(self.row('dress', product_type='variable', exported_variations='M::Red:10:1'))
+        dress = Product.objects.get(slug='dress')
+        self.assertEqual(json.loads(detail_bundle(dress.pk)['variations_json'])[0]['stock'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin_import(self.row('dress', product_type='variable', exported_variations='M::Red:99:7'))
+        variation = json.loads(detail_bundle(dress.pk)['variations_json'])[0]
+        self.assertEqual((variation['price'], variation['stock']), (99, 7))
+
+    def test_admin_preview_copies_no_files(self):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as source:
+            source.write(b'jpeg')
+            source.flush()
+            row = self.row('dress', exported_images=f'front:{source.name}::1:0')
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.admin_import(row, dry_run=True)
+            self.assertFalse(default_storage.exists('product_images/imported'))
+            self.assertEqual(callbacks, [])
+            self.admin_import(row)
+        image = ProductImage.objects.get()
+        self.assertTrue(image.image.name.startswith('product_images/imported/'))
+        self.assertTrue(default_storage.exists(image.image.name))
+
+    def test_queries_per_chunk_do_not_grow_with_rows(self):
+        self.run_import([self.row('seed',product_type='variable', exported_variations='S::Red:1:1')])
+
+        def queries(count, prefix):
+            rows = [
+                self.row(f'{prefix}-{i}', product_type='variable', exported_variations='S::Red:1:1|M::Red:2:1')
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as captured:
+                self.run_import(rows, batch_size=100)
+            return len(captured)
+
+        self.assertEqual(queries(5, 'small'), queries(50, 'large'))
+
+
+class MediaIngestTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.source_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source_dir)
+
+    def write_source(self, name, content):
+        with open(f'{self.source_dir}/{name}', 'wb') as f:
+            f.write(content)
+
+    def test_links_stored_files_and_copies_others_once(self):
+        stored = default_storage.save('product_images/dress.jpg', BytesIO(b'dress'))
+        self.write_source('front.jpg', b'shirt')
+        self.write_source('copy-of-front.jpg', b'shirt')
+
+        paths = [stored, 'front.jpg', 'copy-of-front.jpg', 'gone.jpg']
+        ingestion = ingest(paths, source_dir=self.source_dir)
+        self.assertEqual((ingestion.linked, ingestion.copied, ingestion.deduplicated), (1, 1, 1))
+        self.assertEqual(ingestion.missing, ['gone.jpg'])
+        self.assertEqual(ingestion.names[stored], stored)
+        self.assertEqual(ingestion.names['front.jpg'], ingestion.names['copy-of-front.jpg'])
+        with default_storage.open(ingestion.names['front.jpg']) as f:
+            self.assertEqual(f.read(), b'shirt')
+
+        # Again: nothing left to copy.
+        again = ingest(paths, source_dir=self.source_dir)
+        self.assertEqual((again.copied, again.deduplicated), (0, 2))
+        self.assertEqual(again.names, ingestion.names)
+
+    def test_image_resource_links_instead_of_copying(self):
+        product = Product.objects.create(name='Dress', regular_price=10)
+        stored = default_storage.save('product_images/dress.jpg', BytesIO(b'dress'))
+        dataset = tablib.Dataset(headers=['product_slug', 'name', 'alt_text', 'is_featured', 'order', 'image_path'])
+        dataset.append([product.slug, 'front', '', '1', '0', stored])
+        dataset.append([product.slug, 'back', '', '0', '1', 'product_images/gone.jpg'])
+        with self.assertLogs('products.admin', 'WARNING') as logs:
+            result = ProductImageResource().import_data(dataset)
+        self.assertFalse(result.has_errors())
+        self.assertIn('1 missing: product_images/gone.jpg', logs.output[0])
+        self.assertEqual(dict(ProductImage.objects.values_list('name', 'image')), {'front': stored, 'back': ''})
+        self.assertEqual(default_storage.listdir('product_images')[1], ['dress.jpg'])
+
+    def test_image_resource_preview_copies_nothing(self):
+        product = Product.objects.create(name='Dress', regular_price=10)
+        self.write_source('front.jpg', b'front')
+        dataset = tablib.Dataset(headers=['product_slug', 'name', 'alt_text', 'is_featured', 'order', 'image_path'])
+        dataset.append([product.slug, 'front', '', '1', '0', f'{self.source_dir}/front.jpg'])
+        with self.captureOnCommitCallbacks() as callbacks:
+            result = ProductImageResource().import_data(dataset, dry_run=True)
+        self.assertFalse(result.has_errors())
+        self.assertFalse(default_storage.exists('product_images'))
+        self.assertEqual(callbacks, [])
+
+        self.assertEqual(list(dataset['image_path']), [f'{self.source_dir}/front.jpg'])
+
+        ProductImageResource().import_data(dataset)
+        stored = ProductImage.objects.get().image.name
+        self.assertTrue(stored.startswith('product_images/'))
+        self.assertTrue(default_storage.exists(stored))
+
+
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.created = 0
+
+    def add_products(self, count):
+        category = Category.objects.create(name=f'Category {self.created}')
+        for i in range(self.created, self.created + count):
+            product = Product.objects.create(name=f'Dress {i}', regular_price=10, product_type=Product.VARIABLE)
+            product.categories.add(category)
+            ProductVariation.objects.create(product=product, size='M', price=12, stock=i)
+            ProductImage.objects.create(product=product, image=f'product_images/{i}.jpg')
+        self.created += count
+
+    def test_csv_matches_the_admin_export(self):
+        self.add_products(3)
+        streamed = ''.join(export_stream(ProductResource(), 'csv', chunk_size=2)).splitlines()
+        exported = ProductResource().export().csv.splitlines()
+        self.assertEqual(streamed[0], exported[0])
+        self.assertEqual(sorted(streamed[1:]), sorted(exported[1:]))
+
+    def test_jsonl_rows_are_keyed_by_header(self):
+        self.add_products(2)
+        rows = [json.loads(line) for line in ''.join(export_stream(ProductResource(), 'jsonl')).splitlines()]
+        self.assertEqual({row['slug'] for row in rows}, {'dress-0', 'dress-1'})
+        self.assertEqual({row['exported_variations'] for row in rows}, {'M:::12.00:', 'M:::12.00:1'})
+
+    def test_queries_grow_per_chunk_not_per_row(self):
+        def queries(count):
+            self.add_products(count)
+            with CaptureQueriesContext(connection) as captured:
+                for _ in export_stream(ProductResource(), 'csv', chunk_size=10):
+                    pass
+            return len(captured)
+
+        # A query and one per prefetch for each chunk of 10, then the empty page that ends it.
+        self.assertEqual(queries(10), 4 + 1)
+        self.assertEqual(queries(20), 4 * 3 + 1)
+
+    def test_import_lookups_skip_export_prefetches(self):
+        self.add_products(1)
+        resource = ProductResource()
+        loader = ModelInstanceLoader(resource)
+        with self.assertNumQueries(1):
+            loader.get_instance({'slug': 'dress-0'})
 
-# Create your tests here.
+    def test_admin_action_streams_the_selection(self):
+        self.add_products(3)
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin_user)
+        response = self.client.post(reverse('admin:products_product_changelist'), {
+            'action': 'stream_export_csv', '_selected_action': list(Product.objects.values_list('pk', flat=True)[:2]),
+        })
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="product-', response['Content-Disposition'])
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 3)
@@ -1,3 +1,22 @@
-from django.shortcuts import render
+from django.http import Http404
 
-# Create your views here.
+from website.serving import serve_media
+
+from .renditions import generate_rendition, parse_rendition_name
+
+
+def rendition(request, path):
+    """
+    Serve an image rendition from MEDIA_ROOT, rendering it first if this is
+    the first request for it. Once the file exists the web server can serve
+    it directly (e.g. nginx `try_files $uri @django`).
+    """
+    parsed = parse_rendition_name(path)
+    if parsed is None:
+        raise Http404("Unknown rendition")
+    try:
+        generate_rendition(*parsed)
+    except OSError:
+        # Missing or unreadable original.
+        raise Http404("Image not found")
+    return serve_media(request, path)
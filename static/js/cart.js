@@ -0,0 +1,139 @@
+document.addEventListener("DOMContentLoaded", function () {
+    const toggleButton = document.getElementById("toggle-sidebar");
+    const closeButton = document.getElementById("close-sidebar");
+    const sidebar = document.getElementById("sidebar");
+    const cartItemsContainer = document.getElementById("cart-items");
+    const totalPriceElement = document.getElementById("total-price");
+    const clearCartButton = document.getElementById("clear-cart");
+    const cartActionButton = document.getElementById('cart-action-buttons');
+
+    // Toggle sidebar open/close
+    toggleButton.addEventListener("click", function () {
+        sidebar.style.transform = sidebar.style.transform === "translateX(100%)" ? "translateX(0)" : "translateX(100%)";
+        updateCartSidebar(); // Update the sidebar when opened
+    });
+
+    // Close sidebar
+    closeButton.addEventListener("click", function () {
+        sidebar.style.transform = "translateX(100%)";
+    });
+// Close sidebar when clicking anywhere outside of it (but not on the toggle button)
+document.addEventListener("click", function (event) {
+    const isClickInsideSidebar = sidebar.contains(event.target);
+    const isClickOnToggleButton = toggleButton.contains(event.target);
+
+    // If the click is outside the sidebar and not on the toggle button, close the sidebar
+    if (!isClickInsideSidebar && !isClickOnToggleButton) {
+        sidebar.style.transform = "translateX(100%)";
+    }
+});
+
+// Prevent sidebar from closing when clicking the plus or minus buttons inside the sidebar
+cartItemsContainer.addEventListener("click", function (event) {
+    const target = event.target;
+    if (target.classList.contains("increase-quantity") || target.classList.contains("decrease-quantity")) {
+        event.stopPropagation(); // Prevent click from bubbling up to document
+    }
+});
+
+
+    // Function to update the sidebar with cart items
+    function updateCartSidebar() {
+        const cart = JSON.parse(localStorage.getItem("cart")) || [];
+        cartItemsContainer.innerHTML = ""; // Clear existing items
+
+        // If the cart is empty, show a message
+        if (cart.length === 0) {
+            cartItemsContainer.innerHTML = '<p class="text-center text-gray-600 dark:text-gray-200">Your cart is empty</p>';
+            totalPriceElement.textContent = '৳0';
+            cartActionButton.classList.add('hidden')
+            return;
+        }
+        else {
+            cartActionButton.classList.remove('hidden');
+        }
+        let total = 0;
+
+        // Render each cart item
+        cart.forEach((item, index) => {
+            const itemTotal = item.price * item.quantity;
+            total += itemTotal;
+
+            const itemHTML = `
+            <div class="flex justify-between gap-4 py-4 border-b border-gray-200 dark:border-gray-700">
+                <img src="${item.image ? item.image : '/static/icons/default-image.webp'}"
+                    class="size-20 object-cover object-top rounded bg-gray-100 dark:bg-gray-700" alt="${item.name}"/>
+                <div class="mr-auto flex flex-col gap-2">
+                    <p class="text-sm text-gray-900 dark:text-gray-100">${item.name}</p>
+                    ${item.variation.color ? `<p class="text-xs text-gray-600 dark:text-gray-300">Color: ${item.variation.color}</p>` : ""}
+                    ${item.variation.size ? `<p class="text-xs text-gray-600 dark:text-gray-300">Size: ${item.variation.size}</p>` : ""}
+                    ${item.variation.weight ? `<p class="text-xs text-gray-600 dark:text-gray-300">Weight: ${item.variation.weight} kg</p>` : ""}
+                
+                    <div class="mt-2 flex items-center gap-2">
+                        <button type="button"
+                            class="h-8 w-8 flex items-center justify-center rounded-md border border-gray-300 dark:border-gray-600 bg-gray-100 dark:bg-gray-700 text-gray-700           dark:text-gray-300 hover:bg-gray-200 dark:hover:bg-gray-600 transition decrease-quantity"
+                            data-index="${index}" aria-label="Decrease Quantity">
+                            -
+                        </button>
+                    
+                        <input type="text"
+                            class="w-10 h-8 text-center border border-gray-300 dark:border-gray-600 bg-white dark:bg-gray-800 text-gray-700 dark:text-gray-100"
+                            value="${item.quantity}" readonly/>
+                    
+                        <button type="button"
+                            class="h-8 w-8 flex items-center justify-center rounded-md border border-gray-300 dark:border-gray-600 bg-gray-100 dark:bg-gray-700 text-gray-700           dark:text-gray-300 hover:bg-gray-200 dark:hover:bg-gray-600 transition increase-quantity"
+                            data-index="${index}" aria-label="Increase Quantity">
+                            +
+                        </button>
+                    </div>
+                </div>
+                <p class="text-sm font-bold text-gray-900 dark:text-gray-100">৳${itemTotal.toFixed(2)}</p>
+            </div>
+            `;
+
+            cartItemsContainer.insertAdjacentHTML("beforeend", itemHTML);
+        });
+        // Update total price
+        totalPriceElement.textContent = `৳${total.toFixed(2)}`;
+
+    }
+
+    // Handle quantity updates in the sidebar
+    cartItemsContainer.addEventListener("click", function (event) {
+        const target = event.target;
+        const index = target.dataset.index;
+
+        if (target.classList.contains("decrease-quantity")) {
+            updateCartItemQuantity(index, -1);
+        } else if (target.classList.contains("increase-quantity")) {
+            updateCartItemQuantity(index, 1);
+        }
+    });
+
+    // Function to update cart item quantity
+    function updateCartItemQuantity(index, change) {
+        const cart = JSON.parse(localStorage.getItem("cart")) || [];
+        const item = cart[index];
+
+        if (item) {
+            item.quantity += change;
+
+            if (item.quantity <= 0) {
+                cart.splice(index, 1); // Remove item if quantity is 0
+            }
+
+            localStorage.setItem("cart", JSON.stringify(cart));
+            updateCartSidebar(); // Refresh the sidebar
+        }
+    }
+
+    // Clear Cart
+    clearCartButton.addEventListener("click", function () {
+        localStorage.removeItem("cart");
+        updateCartSidebar(); // Refresh the sidebar
+        location.reload(); 
+    });
+
+    // Initial update of the sidebar
+    updateCartSidebar();
+});
@@ -0,0 +1,60 @@
+(function () {
+  // dark class
+  const html = document.documentElement;
+  const desktopToggle = document.getElementById('desktopToggle');
+  const mobileToggle = document.getElementById('mobileToggle');
+
+  // Function to apply the user's theme preference
+  function applyThemePreference() {
+    const userPrefersDark = window.matchMedia('(prefers-color-scheme: dark)').matches;
+    const savedTheme = localStorage.getItem('theme');
+
+    if (savedTheme === 'dark' || (!savedTheme && userPrefersDark)) {
+      html.classList.add('dark');
+    } else {
+      html.classList.remove('dark');
+    }
+  }
+
+  function toggleTheme() {
+    html.classList.toggle('dark');
+    if (html.classList.contains('dark')) {
+      localStorage.setItem('theme', 'dark');
+    } else {
+      localStorage.setItem('theme', 'light');
+    }
+  }
+
+  // Initial theme setup on page load
+  applyThemePreference();
+
+  // Desktop and mobile switchers
+  if (desktopToggle) {
+    desktopToggle.addEventListener('click', toggleTheme);
+  }
+  if (mobileToggle) {
+    mobileToggle.addEventListener('click', toggleTheme);
+  }
+
+  // Django messages hide after 4 seconds
+  document.addEventListener('DOMContentLoaded', () => {
+    setTimeout(() => {
+      const msgSection = document.getElementById('django-messages');
+      if (msgSection) {
+        msgSection.remove();
+      }
+    }, 4000);
+  });
+
+  // smooth scrolling
+  if (window.Lenis) {
+    const lenis = new Lenis();
+
+    function raf(time) {
+      lenis.raf(time);
+      requestAnimationFrame(raf);
+    }
+
+    requestAnimationFrame(raf);
+  }
+})();
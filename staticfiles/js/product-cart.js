@@ -0,0 +1,176 @@
+document.addEventListener('DOMContentLoaded', function () {
+    const quantityElement = document.getElementById('quantity');
+    const decreaseQtyButton = document.getElementById('decrease-qty');
+    const increaseQtyButton = document.getElementById('increase-qty');
+    const addToCartButton = document.getElementById('add-to-cart');
+    const buyNowButton = document.getElementById('buy-now');
+    const productPriceElement = document.getElementById('product-price');
+    const variationContainer = document.getElementById('variation-container');
+    const notification = document.getElementById('notification');
+    const productData = document.getElementById('product-data');
+
+    // Only the product page has a quantity picker.
+    if (!productData || !quantityElement) {
+        return;
+    }
+
+    let quantity = 1;
+    let selectedVariation = {};
+
+    const productName = productData.dataset.name;
+    const productId = productData.dataset.id;
+    const product_imageurl = productData.dataset.image;
+    const cart = JSON.parse(localStorage.getItem('cart')) || [];
+
+    function getCurrentDisplayedPrice() {
+        const priceSpans = productPriceElement.querySelectorAll('span');
+        let priceText = '';
+
+        if (priceSpans.length > 1) {
+            priceText = priceSpans[1].textContent;
+        } else if (priceSpans.length === 1) {
+            priceText = priceSpans[0].textContent;
+        } else {
+            priceText = productPriceElement.textContent;
+        }
+
+        return parseFloat(priceText.replace(/[^0-9.]/g, ''));
+    }
+
+    function updateQuantityFromCart() {
+        const existingProduct = cart.find(
+            (item) =>
+                item.name === productName &&
+                JSON.stringify(item.variation) === JSON.stringify(selectedVariation)
+        );
+
+        if (existingProduct) {
+            quantity = existingProduct.quantity;
+            quantityElement.textContent = quantity;
+        } else {
+            quantity = 1;
+            quantityElement.textContent = quantity;
+        }
+    }
+
+    updateQuantityFromCart();
+
+    decreaseQtyButton.addEventListener('click', () => {
+        if (quantity > 1) {
+            quantity--;
+            quantityElement.textContent = quantity;
+        }
+    });
+
+    increaseQtyButton.addEventListener('click', () => {
+        quantity++;
+        quantityElement.textContent = quantity;
+    });
+
+    if (variationContainer) {
+        variationContainer.addEventListener('click', (event) => {
+            const target = event.target;
+
+            if (target.dataset.color) {
+                selectedVariation.color = target.dataset.color;
+            }
+
+            if (target.dataset.size) {
+                selectedVariation.size = target.dataset.size;
+            }
+
+            if (target.dataset.weight) {
+                selectedVariation.weight = target.dataset.weight;
+            }
+
+            updateQuantityFromCart();
+        });
+    }
+
+    // Out-of-stock products have no cart buttons.
+    if (!addToCartButton || !buyNowButton) {
+        return;
+    }
+
+    addToCartButton.addEventListener('click', () => {
+        const product = {
+            product_id: productId,
+            name: productName,
+            image : product_imageurl,
+            price: getCurrentDisplayedPrice(),
+            quantity: quantity,
+            variation: selectedVariation,
+        };
+
+        addToCart(product);
+        showNotification();
+    });
+
+    buyNowButton.addEventListener('click', () => {
+        const product = {
+            product_id: productId,
+            name: productName,
+            image : product_imageurl,
+            price: getCurrentDisplayedPrice(),
+            quantity: quantity,
+            variation: selectedVariation,
+        };
+
+        clearCart();
+        addToCart(product);
+        showNotification();
+        window.location.href = '/checkout_ecommerce';
+    });
+
+    function addToCart(product) {
+        let cart = JSON.parse(localStorage.getItem('cart')) || [];
+        const existingProductIndex = cart.findIndex(
+            (item) =>
+                item.name === product.name &&
+                JSON.stringify(item.variation) === JSON.stringify(product.variation)
+        );
+
+        if (existingProductIndex !== -1) {
+            cart[existingProductIndex].quantity = product.quantity;
+        } else {
+            cart.push(product);
+        }
+
+        localStorage.setItem('cart', JSON.stringify(cart));
+    }
+
+    function updateCart(productName, variation, newQuantity) {
+        let cart = JSON.parse(localStorage.getItem('cart')) || [];
+        const productIndex = cart.findIndex(
+            (item) =>
+                item.name === productName &&
+                JSON.stringify(item.variation) === JSON.stringify(variation)
+        );
+
+        if (productIndex !== -1) {
+            if (newQuantity > 0) {
+                cart[productIndex].quantity = newQuantity;
+            } else {
+                cart.splice(productIndex, 1);
+            }
+            localStorage.setItem('cart', JSON.stringify(cart));
+        }
+    }
+
+    function clearCart() {
+        localStorage.removeItem('cart');
+    }
+
+    function showNotification() {
+        notification.classList.remove('hidden');
+        notification.classList.remove('hide');
+        notification.classList.add('slideIn');
+
+        setTimeout(() => {
+            notification.classList.add('hide');
+            setTimeout(() => {
+                notification.classList.add('hidden');
+            }, 300);
+        }, 3000);
+    }
+});
@@ -1,6 +1,16 @@
 # admin.py
+import os
+
+from django import forms
 from django.contrib import admin
+from django.contrib.auth import get_permission_codename
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
 from .models import *
+from .jobs import cancel, exported_model, job_storage
+from django.utils import timezone
 from django.utils.html import format_html
 from unfold.admin import ModelAdmin
 
@@ -43,3 +53,101 @@ class ContactAdmin(ModelAdmin):
     search_fields = ('name', 'email', 'message')
     list_filter = ('created_at',)
     readonly_fields = ('created_at',) # Ensure created_at can't be changed after creation
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'last_error')
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'sent_at')
+    actions = ['retry_now']
+
+    @admin.action(description="Retry selected emails now")
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=OutboundEmail.SENT).update(
+            status=OutboundEmail.PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"{updated} emails queued for the next send_outbox run.")
+
+
+class ProductImportJobForm(forms.ModelForm):
+    file = forms.FileField(help_text="A product CSV, in the format the Product admin exports.")
+    batch_size = forms.IntegerField(initial=1000, min_value=1)
+    dry_run = forms.BooleanField(required=False, help_text="Import, report, then roll everything back.")
+
+    class Meta:
+        model = Job
+        fields = []
+
+
+@admin.register(Job)
+class JobAdmin(ModelAdmin):
+    list_display = ('__str__', 'status', 'progress_display', 'message', 'created_by', 'created_at', 'finished_at', 'download_link')
+    list_filter = ('status', 'kind', 'created_at')
+    list_select_related = ('created_by',)
+    readonly_fields = (
+        'kind', 'params', 'status', 'cancel_requested', 'progress_display', 'message',
+        'result', 'error', 'download_link', 'created_by', 'created_at', 'started_at', 'finished_at',
+    )
+    actions = ['cancel_jobs']
+
+    # Adding a job from the admin means uploading a product import; exports
+    # are queued from the product, variation and order changelists.
+    def get_form(self, request, obj=None, **kwargs):
+        if obj is None:
+            kwargs['form'] = ProductImportJobForm
+        return super().get_form(request, obj, **kwargs)
+
+    def get_fields(self, request, obj=None):
+        return ('file', 'batch_size', 'dry_run') if obj is None else self.readonly_fields
+
+    def get_readonly_fields(self, request, obj=None):
+        return () if obj is None else self.readonly_fields
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        upload = form.cleaned_data['file']
+        name = job_storage().save(f'imports/{os.path.basename(upload.name)}', upload)
+        obj.kind = 'import_products'
+        obj.params = {'file': name, 'batch_size': form.cleaned_data['batch_size'], 'dry_run': form.cleaned_data['dry_run']}
+        obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+
+    def progress_display(self, obj):
+        if not obj.total:
+            return obj.done or "---"
+        return f"{obj.done}/{obj.total} ({obj.done * 100 // obj.total}%)"
+    progress_display.short_description = "Progress"
+
+    def download_link(self, obj):
+        if not obj.output:
+            return "---"
+        return format_html('<a href="{}">{}</a>', reverse('admin:website_job_download', args=[obj.pk]), os.path.basename(obj.output))
+    download_link.short_description = "Output"
+
+    def get_urls(self):
+        return [
+            path('<int:job_id>/download/', self.admin_site.admin_view(self.download_view), name='website_job_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, job_id):
+        job = get_object_or_404(Job, pk=job_id)
+        if not self.has_view_permission(request, job):
+            raise PermissionDenied
+        # An order export holds customer names, phones and addresses: only
+        # those who may see the exported rows get the file.
+        model = exported_model(job)
+        if model is not None and not request.user.has_perm(
+            f'{model._meta.app_label}.{get_permission_codename("view", model._meta)}'
+        ):
+            raise PermissionDenied
+        if not job.output or not job_storage().exists(job.output):
+            raise Http404
+        return FileResponse(job_storage().open(job.output, 'rb'), as_attachment=True, filename=os.path.basename(job.output))
+
+    @admin.action(description="Cancel selected jobs")
+    def cancel_jobs(self, request, queryset):
+        self.message_user(request, f"{cancel(queryset)} jobs cancelled or asked to stop.")
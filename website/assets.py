@@ -0,0 +1,51 @@
+"""
+Prebuilt CSS/JS bundles (see `manage.py build_assets`).
+
+The build writes content-hashed files to STATIC_ROOT/bundles/ and a
+manifest mapping bundle names to them:
+
+    {"bundles": {"site.js": "bundles/site.1f2e3d4c5b6a.js", ...}}
+
+Hashed names are served with a one-year `immutable` Cache-Control, so a
+page only ever re-downloads a bundle whose contents changed.
+"""
+import json
+import os
+
+from django.conf import settings
+from django.templatetags.static import static
+
+
+BUNDLE_DIR = 'bundles'
+MANIFEST_NAME = f'{BUNDLE_DIR}/manifest.json'
+
+_cache = {}
+
+
+def manifest_path():
+    return os.path.join(settings.STATIC_ROOT, MANIFEST_NAME)
+
+
+def read_manifest():
+    """The current build's manifest, re-read only when the file changes; {} if there is none."""
+    path = manifest_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    if _cache.get('key') != (path, mtime):
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        _cache.update(key=(path, mtime), manifest=manifest)
+    return _cache['manifest']
+
+
+def bundle_url(name):
+    """URL of bundle `name`, or '' when bundles are off or it hasn't been built."""
+    if not getattr(settings, 'USE_ASSET_BUNDLES', False):
+        return ''
+    path = read_manifest().get('bundles', {}).get(name)
+    return static(path) if path else ''
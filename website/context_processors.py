@@ -1,29 +1,23 @@
-from collections import defaultdict
-from products.models import Category
+from django.utils.functional import SimpleLazyObject
 
-def mega_menu_categories(request):
-    parent_categories = Category.objects.filter(parent__isnull=True)
-    structured_mega_menu = {}
-
-    for parent in parent_categories:
-        grouped = defaultdict(list)
-        for child in parent.children.all():
-            group = child.group_name or "Other"
-            grouped[group].append(child)
+from products.category_tree import get_category_tree
+from .middleware import track
 
-            for grandchild in child.children.all():
-                grouped[group].append(grandchild)
+# The tree is only loaded when a template actually renders the navbar or
+# footer; JSON endpoints and redirects never touch it. Loading is tracked
+# under the processor's name so its cost shows up in Server-Timing.
 
-        structured_mega_menu[parent.id] = dict(grouped)
+def _category_tree(processor_name):
+    with track(f'cp.{processor_name}'):
+        return get_category_tree()
 
+def mega_menu_categories(request):
     return {
-        'parent_categories': parent_categories,
-        'structured_mega_menu': structured_mega_menu,
+        'parent_categories': SimpleLazyObject(lambda: _category_tree('mega_menu_categories').roots),
+        'structured_mega_menu': SimpleLazyObject(lambda: _category_tree('mega_menu_categories').mega_menu),
     }
 
 def all_categories(request):
-    footer_categories = Category.objects.filter()
     return {
-        'footer_categories': footer_categories,
+        'footer_categories': SimpleLazyObject(lambda: _category_tree('all_categories').all),
     }
-
@@ -0,0 +1,78 @@
+"""
+Home page content, cached per section until staff change it.
+
+Each section is one key in the `home` namespace; website/signals.py
+deletes exactly the sections a Banner, Testimonial, HomeComponents,
+Product or Category write affects. The timeout only bounds how long a
+missed invalidation (e.g. a queryset.update()) can go unnoticed.
+"""
+from multi_vendor_site.caching import Namespace
+from products.category_tree import get_category_tree
+from products.models import Product
+
+from .models import Banner, HomeComponents, Testimonial
+
+
+HOME_CACHE_TIMEOUT = 60 * 15
+HOME_CACHE = Namespace('home', timeout=HOME_CACHE_TIMEOUT)
+HOME_PRODUCTS = 20
+
+
+def _banners():
+    banners = Banner.objects.filter(is_active=True).order_by('-created_at')
+    return {
+        'desktop_banners': list(banners.filter(for_mobile=False)),
+        'mobile_banners': list(banners.filter(for_mobile=True)),
+    }
+
+
+def _testimonials():
+    testimonials = Testimonial.objects.filter(is_active=True)
+    return {
+        'testimonials_desktop': list(testimonials.filter(for_mobile=False)),
+        'testimonials_mobile': list(testimonials.filter(for_mobile=True)),
+    }
+
+
+def _products():
+    return {
+        'popular_products': list(Product.objects.filter(is_featured=True).with_card_data()[:HOME_PRODUCTS]),
+        'all_products': list(Product.objects.filter(is_active=True).with_card_data()[:HOME_PRODUCTS]),
+    }
+
+
+def _components():
+    # (component, its category's full slug): the tree has every parent
+    # loaded, so the links are resolved here once rather than per request.
+    tree = get_category_tree().by_id
+    components = []
+    for component in HomeComponents.objects.select_related('category')[:2]:
+        category = tree.get(component.category_id, component.category)
+        components.append((component, category.get_full_slug()))
+    return {'home_components': components}
+
+
+SECTIONS = {
+    'banners': _banners,
+    'testimonials': _testimonials,
+    'products': _products,
+    'components': _components,
+}
+
+
+def home_context():
+    """Everything home.html renders; no queries once the sections are cached."""
+    context = {}
+    for name, load in SECTIONS.items():
+        context.update(HOME_CACHE.get_or_set(name, load))
+    # Tree snapshot: parents are already wired up, so category links cost nothing.
+    context['categories'] = get_category_tree().all[:13]
+    return context
+
+
+def invalidate_home(*sections):
+    """Drop `sections`, or every section if none are named."""
+    if not sections:
+        HOME_CACHE.bump()
+    for section in sections:
+        HOME_CACHE.delete(section)
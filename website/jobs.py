@@ -0,0 +1,203 @@
+"""
+Long admin operations (imports, exports, backfills), run by a worker
+instead of inside the request.
+
+A job kind is a function registered under a name:
+
+    @register('export')
+    def export(job, progress, what, format='csv'):
+        ...
+        progress(done, total, "Writing rows")  # raises JobCancelled once cancelled
+        return {'rows': done}                   # kept as job.result
+
+    submit('export', request.user, what='orders')
+
+`manage.py run_jobs` claims queued jobs with a conditional UPDATE (only
+one worker's UPDATE can move a job out of QUEUED), so any number of
+worker threads and processes can share the table, on SQLite too. The Job
+row carries progress, the result or error, and an output file in
+job_storage() for the admin to offer; cancelling sets a flag the job sees
+at its next progress report.
+"""
+import logging
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from multi_vendor_site.exports import EXPORTS, export_stream
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+# Progress is written at most this often (seconds); the final report always is.
+PROGRESS_INTERVAL = 1.0
+# A running job whose heartbeat is older than this has lost its worker.
+STALE_AFTER = timedelta(minutes=30)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def register(kind):
+    def decorator(handler):
+        HANDLERS[kind] = handler
+        return handler
+    return decorator
+
+
+def job_storage():
+    """Where job inputs (uploads) and outputs (exports) live: not under MEDIA_ROOT, they can hold customer data."""
+    return FileSystemStorage(location=settings.JOB_FILES_ROOT)
+
+
+def exported_model(job):
+    """The model whose rows an export job's file holds (None for other kinds)."""
+    if job.kind != 'export':
+        return None
+    return import_string(EXPORTS[job.params['what']])._meta.model
+
+
+def submit(kind, user=None, **params):
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}.")
+    return Job.objects.create(kind=kind, params=params, created_by=user if user and user.pk else None)
+
+
+def cancel(jobs):
+    """Cancel queued jobs now and ask running ones to stop; returns how many were affected."""
+    now = timezone.now()
+    cancelled = jobs.filter(status=Job.QUEUED).update(status=Job.CANCELLED, finished_at=now)
+    return cancelled + jobs.filter(status=Job.RUNNING).update(cancel_requested=True)
+
+
+class Progress:
+    """Passed to handlers: progress(done, total=None, message=None) records how far they got."""
+
+    def __init__(self, job):
+        self.job = job
+        self.written_at = 0
+
+    def __call__(self, done=None, total=None, message=None, force=False):
+        job = self.job
+        if done is not None:
+            job.done = done
+        if total is not None:
+            job.total = total
+        if message is not None:
+            job.message = message[:255]
+        if not force and time.monotonic() - self.written_at < PROGRESS_INTERVAL:
+            return
+        self.written_at = time.monotonic()
+        Job.objects.filter(pk=job.pk).update(
+            done=job.done, total=job.total, message=job.message, heartbeat_at=timezone.now()
+        )
+        if Job.objects.filter(pk=job.pk, cancel_requested=True).exists():
+            raise JobCancelled
+
+
+def fail_stale(now=None):
+    now = now or timezone.now()
+    return Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=now - STALE_AFTER).update(
+        status=Job.FAILED, error="The worker running this job stopped responding.", finished_at=now
+    )
+
+
+def claim_next():
+    """The oldest queued job, now RUNNING and ours, or None."""
+    while True:
+        candidates = list(
+            Job.objects.filter(status=Job.QUEUED).order_by('created_at', 'id').values_list('pk', flat=True)[:10]
+        )
+        if not candidates:
+            return None
+        for pk in candidates:
+            now = timezone.now()
+            if Job.objects.filter(pk=pk, status=Job.QUEUED).update(status=Job.RUNNING, started_at=now, heartbeat_at=now):
+                return Job.objects.get(pk=pk)
+        # Every candidate went to other workers; look again.
+
+
+def run_job(job):
+    progress = Progress(job)
+    try:
+        handler = HANDLERS[job.kind]
+        result = handler(job, progress, **job.params)
+        progress(force=True)
+    except JobCancelled:
+        job.status = Job.CANCELLED
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job.pk, job.kind)
+        job.status = Job.FAILED
+        job.error = ''.join(traceback.format_exception(e))
+    else:
+        job.status = Job.SUCCEEDED
+        job.result = result or {}
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'done', 'total', 'message', 'result', 'output', 'error', 'finished_at'])
+    return job.status
+
+
+def _work(counts, lock):
+    try:
+        while True:
+            job = claim_next()
+            if job is None:
+                return
+            status = run_job(job)
+            with lock:
+                counts[status] = counts.get(status, 0) + 1
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+
+
+def run_pending(workers=1):
+    """Run queued jobs until there are none; returns {status: count}."""
+    fail_stale()
+    counts, lock = {}, threading.Lock()
+    if workers <= 1:
+        _work(counts, lock)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jobs') as pool:
+            for future in [pool.submit(_work, counts, lock) for _ in range(workers)]:
+                future.result()
+    return counts
+
+
+# Exports
+
+@register('export')
+def export(job, progress, what, format='csv', pks=None):
+    """`what` (a key of EXPORTS) to a file; `pks` limits it to those rows."""
+    resource = import_string(EXPORTS[what])()
+    total = len(pks) if pks is not None else resource.get_queryset().count()
+    progress(0, total, f"Exporting {what}", force=True)
+
+    storage = job_storage()
+    name = f'exports/{what}-{job.pk}.{format}'
+    path = storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    blocks = export_stream(resource, format, progress=progress, pks=pks)
+    try:
+        with open(path, 'wb') as f:
+            for block in blocks:
+                f.write(block if isinstance(block, bytes) else block.encode())
+    except BaseException:
+        # Cancelled or failed: don't leave half a file behind.
+        os.remove(path)
+        raise
+    job.output = name
+    return {'rows': job.done, 'bytes': os.path.getsize(path)}
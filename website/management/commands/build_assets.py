@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+
+import rcssmin
+import rjsmin
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+from django.template.utils import get_app_template_dirs
+
+from website.assets import BUNDLE_DIR, MANIFEST_NAME, manifest_path, read_manifest
+from website.management.commands.precompress_static import _compress
+
+
+_CSS_URL_RE = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+# Input for the Tailwind CLI; the same extras _base.html gives the in-browser build.
+TAILWIND_INPUT = """\
+@tailwind base;
+@tailwind components;
+@tailwind utilities;
+
+.transition-colors {
+  transition: background-color 0.3s, color 0.3s;
+}
+"""
+TAILWIND_THEME = {'extend': {'colors': {'clifford': '#da373d'}}}
+
+
+def _rebase_css_urls(css, source, target_dir=BUNDLE_DIR):
+    """Point relative url()s in `source` (a static path) at the same files from `target_dir`."""
+    def rebase(match):
+        quote, url = match.groups()
+        if url.startswith(('data:', '/', '#')) or '://' in url:
+            return match.group(0)
+        url = posixpath.relpath(posixpath.normpath(posixpath.join(posixpath.dirname(source), url)), target_dir)
+        return f'url({quote}{url}{quote})'
+    return _CSS_URL_RE.sub(rebase, css)
+
+
+def _minify(name, source, text):
+    """`text` of static file `source`, minified for bundle `name` unless it already is."""
+    is_css = name.endswith('.css')
+    if is_css:
+        text = _rebase_css_urls(text, source)
+    if '.min.' in posixpath.basename(source):
+        return text
+    if is_css:
+        return rcssmin.cssmin(text, keep_bang_comments=True)
+    return rjsmin.jsmin(text, keep_bang_comments=True)
+
+
+def hashed_name(name, content):
+    stem, extension = posixpath.splitext(name)
+    digest = hashlib.md5(content, usedforsecurity=False).hexdigest()[:12]
+    return f'{BUNDLE_DIR}/{stem}.{digest}{extension}'
+
+
+def tailwind_content_globs():
+    """Everything Tailwind should look for class names in."""
+    template_dirs = [directory for engine in settings.TEMPLATES for directory in engine.get('DIRS', [])]
+    template_dirs += get_app_template_dirs('templates')
+    globs = [os.path.join(str(directory), '**', '*.html') for directory in template_dirs]
+    for directory in settings.STATICFILES_DIRS:
+        globs.append(os.path.join(directory, 'js', '**', '*.js'))
+        # The in-browser compiler itself is full of class-like strings.
+        globs.append('!' + os.path.join(directory, 'js', 'tailwind.js'))
+    base_dir = str(settings.BASE_DIR)
+    for app in apps.get_app_configs():
+        if app.path.startswith(base_dir + os.sep):
+            globs.append(os.path.join(app.path, '**', '*.py'))
+    return globs
+
+
+class Command(BaseCommand):
+    help = (
+        "Concatenate, minify and content-hash settings.ASSET_BUNDLES into STATIC_ROOT/bundles/, "
+        "build a purged tailwind.css if the Tailwind CLI is installed, and write the manifest templates read."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-tailwind', action='store_true', help="Don't build tailwind.css; pages keep the in-browser compiler.")
+
+    def handle(self, *args, **options):
+        os.makedirs(os.path.join(settings.STATIC_ROOT, BUNDLE_DIR), exist_ok=True)
+        bundles = {}
+        for name, sources in settings.ASSET_BUNDLES.items():
+            before, content = self.bundle(name, sources)
+            bundles[name] = self.write(name, content, before)
+
+        if not options['no_tailwind']:
+            tailwind = self.tailwind()
+            if tailwind is not None:
+                runtime = finders.find('js/tailwind.js')
+                bundles['tailwind.css'] = self.write('tailwind.css', tailwind, os.path.getsize(runtime) if runtime else 0)
+
+        previous = read_manifest().get('bundles', {})
+        path = manifest_path()
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'bundles': bundles}, f, indent=2, sort_keys=True)
+        os.replace(path + '.tmp', path)
+        removed = self.prune(set(bundles.values()) | set(previous.values()))
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {len(bundles)} bundles into {MANIFEST_NAME}; removed {removed} stale files."
+        ))
+
+    def bundle(self, name, sources):
+        """(total source bytes, minified bundle bytes)."""
+        parts, before = [], 0
+        for source in sources:
+            path = finders.find(source)
+            if not path:
+                raise CommandError(f"{name}: static file {source!r} not found.")
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+            before += len(text.encode())
+            parts.append(_minify(name, source, text).strip())
+        # `;` keeps a file without a trailing semicolon from running into the next one.
+        separator = '\n' if name.endswith('.css') else '\n;\n'
+        return before, (separator.join(parts) + '\n').encode()
+
+    def write(self, name, content, before):
+        relative = hashed_name(name, content)
+        path = os.path.join(settings.STATIC_ROOT, relative)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(content)
+            _compress(path)
+        gzipped = os.path.getsize(path + '.gz') if os.path.exists(path + '.gz') else len(content)
+        self.stdout.write(f"{name}: {before:,} -> {len(content):,} bytes ({gzipped:,} gzipped) {relative}")
+        return relative
+
+    def tailwind(self):
+        """A purged, minified Tailwind build of every class the site uses, or None without the CLI."""
+        command = shlex.split(settings.TAILWIND_CLI)
+        if not command or not shutil.which(command[0]):
+            self.stderr.write(self.style.WARNING(
+                f"Tailwind CLI {settings.TAILWIND_CLI!r} not found; pages keep the in-browser compiler."
+            ))
+            return None
+        with tempfile.TemporaryDirectory() as tmp:
+            config = os.path.join(tmp, 'tailwind.config.js')
+            with open(config, 'w') as f:
+                f.write('module.exports = ' + json.dumps({
+                    'darkMode': 'class',
+                    'content': tailwind_content_globs(),
+                    'theme': TAILWIND_THEME,
+                }, indent=2) + ';\n')
+            source = os.path.join(tmp, 'input.css')
+            with open(source, 'w') as f:
+                f.write(TAILWIND_INPUT)
+            output = os.path.join(tmp, 'tailwind.css')
+            try:
+                subprocess.run(
+                    command + ['-c', config, '-i', source, '-o', output, '--minify'],
+                    check=True, capture_output=True, text=True, timeout=300,
+                )
+            except subprocess.CalledProcessError as e:
+                raise CommandError(f"Tailwind build failed:\n{e.stderr}")
+            with open(output, 'rb') as f:
+                return f.read()
+
+    def prune(self, keep):
+        """Delete bundles (and their .gz/.br) that neither this build nor the last one uses."""
+        directory = os.path.join(settings.STATIC_ROOT, BUNDLE_DIR)
+        keep = {posixpath.basename(path) for path in keep} | {posixpath.basename(MANIFEST_NAME)}
+        removed = 0
+        for filename in os.listdir(directory):
+            original = re.sub(r'\.(gz|br)$', '', filename)
+            if original not in keep:
+                os.remove(os.path.join(directory, filename))
+                removed += 1
+        return removed
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from multi_vendor_site.caching import read_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Show cache hits, misses, early refreshes and lock waits per namespace, summed over every worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters after printing them.")
+
+    def handle(self, *args, **options):
+        if settings.CACHES['default']['BACKEND'].endswith('LocMemCache'):
+            self.stderr.write("The cache is per-process local memory: these are this command's own (empty) counters.")
+        stats = read_stats()
+        self.stdout.write(f"{'namespace':<24}{'hits':>10}{'misses':>10}{'refreshes':>11}{'waits':>8}{'hit rate':>10}")
+        for name, counts in stats.items():
+            lookups = counts['hits'] + counts['misses'] + counts['refreshes'] + counts['waits']
+            rate = f"{counts['hits'] / lookups:.1%}" if lookups else '-'
+            self.stdout.write(
+                f"{name:<24}{counts['hits']:>10}{counts['misses']:>10}{counts['refreshes']:>11}{counts['waits']:>8}{rate:>10}"
+            )
+        if options['reset']:
+            reset_stats()
+        self.stdout.write(self.style.SUCCESS(f"{len(stats)} namespaces{', counters reset' if options['reset'] else ''}."))
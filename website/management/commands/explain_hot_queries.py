@@ -0,0 +1,105 @@
+import re
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import QueryDict
+from django.utils import timezone
+
+from orders.models import Ecommercecheckouts
+from products.catalog import CatalogQuery
+from products.models import Category, Product, ProductVariation
+from products.pagination import KeysetPaginator
+from website.models import Banner, OutboundEmail, Testimonial
+
+
+# (full table scan, sort without an index) per database vendor.
+PLAN_PATTERNS = {
+    'sqlite': (re.compile(r'\bSCAN (\S+)\s*$', re.M), re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)')),
+    'postgresql': (re.compile(r'Seq Scan on (\S+)'), re.compile(r'(?:^|->\s+)Sort\b', re.M)),
+}
+
+
+def _catalog(category=None, **params):
+    return CatalogQuery(QueryDict(urlencode(params, doseq=True)), category=category, include_descendants=category is not None)
+
+
+def _pages(name, paginator):
+    """The first page of a keyset listing and, if there is one, the page after it."""
+    first = paginator.seek_queryset()
+    yield f'{name}, page 1', first
+    rows = list(first)
+    if rows:
+        last = rows[-1]
+        yield f'{name}, page 2', paginator.seek_queryset(getattr(last, paginator.field), last.pk)
+
+
+def hot_queries():
+    """(name, queryset) for the queries behind the busiest pages, built the way the views build them."""
+    yield 'home: desktop banners', Banner.objects.filter(is_active=True, for_mobile=False).order_by('-created_at')
+    yield 'home: desktop testimonials', Testimonial.objects.filter(is_active=True, for_mobile=False)
+    yield 'home: featured products', Product.objects.filter(is_featured=True).with_card_data(categories=False)[:20]
+    yield 'home: latest products', Product.objects.filter(is_active=True).with_card_data(categories=False)[:20]
+
+    for sort in CatalogQuery.SORT_OPTIONS:
+        yield from _pages(f'shop: sort {sort}', _catalog(sort_by=sort).keyset_paginator())
+    yield from _pages('shop: price range', _catalog(min_price=100, max_price=5000, sort_by='price').keyset_paginator())
+    color = ProductVariation.objects.exclude(color='').exclude(color__isnull=True).values_list('color', flat=True).first()
+    if color:
+        yield from _pages(f'shop: color {color}', _catalog(color=color).keyset_paginator())
+    category = Category.objects.exclude(path='').filter(parent__isnull=True).first()
+    if category:
+        yield from _pages(f'category: {category.slug}', _catalog(category).keyset_paginator())
+
+    product = Product.objects.filter(is_active=True).only('pk', 'slug').first()
+    if product:
+        yield 'product detail', Product.objects.filter(slug=product.slug).select_related('primary_image')
+        yield 'product detail: variations', ProductVariation.objects.filter(product=product)
+
+    yield from _pages(
+        'track order',
+        KeysetPaginator(Ecommercecheckouts.objects.filter(normalized_phone='+8801700000000'), '-created_at', 20),
+    )
+    yield 'admin: orders', Ecommercecheckouts.objects.order_by('-created_at')[:100]
+    yield 'admin: processing orders', Ecommercecheckouts.objects.filter(status='processing').order_by('-created_at')[:100]
+    yield 'outbox: due emails', OutboundEmail.objects.filter(
+        status=OutboundEmail.PENDING, next_attempt_at__lte=timezone.now()
+    ).order_by('next_attempt_at', 'id')[:50]
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the listing, home, tracking and admin queries and flag full table scans and unindexed sorts. "
+        "Run it against a database with realistic data: on PostgreSQL small tables are always scanned."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--strict', action='store_true', help="Exit with an error if any query scans a whole table.")
+
+    def handle(self, *args, **options):
+        full_scan, sort = PLAN_PATTERNS.get(connection.vendor, (None, None))
+        if full_scan is None:
+            self.stderr.write(f"No plan checks for {connection.vendor}; printing plans only.")
+        verbose = options['verbosity'] > 1
+
+        scanned = []
+        for name, queryset in hot_queries():
+            plan = queryset.explain()
+            problems = []
+            if full_scan is not None:
+                problems += [f"full scan of {table}" for table in full_scan.findall(plan)]
+                if sort.search(plan):
+                    problems.append("sorts without an index")
+            if any(problem.startswith('full scan') for problem in problems):
+                scanned.append(name)
+
+            if problems:
+                self.stdout.write(self.style.WARNING(f"{name}: {', '.join(problems)}"))
+            else:
+                self.stdout.write(f"{name}: ok")
+            if verbose or problems:
+                self.stdout.write(''.join(f"    {line}\n" for line in plan.splitlines()))
+
+        if scanned and options['strict']:
+            raise CommandError(f"{len(scanned)} queries scan a whole table: {', '.join(scanned)}")
+        self.stdout.write(self.style.SUCCESS(f"Checked the plans; {len(scanned)} queries scan a whole table."))
@@ -0,0 +1,39 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from multi_vendor_site.exports import CHUNK_SIZE, CONTENT_TYPES, EXPORTS, available_formats, export_stream
+
+
+class Command(BaseCommand):
+    help = "Stream products, variations or orders to a CSV, JSONL or XLSX file without loading them all into memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('what', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=list(CONTENT_TYPES), default='csv')
+        parser.add_argument('--output', '-o', help="File to write (default: stdout).")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        fmt = options['format']
+        if fmt not in available_formats():
+            raise CommandError(f"{fmt} export needs openpyxl installed.")
+        if fmt == 'xlsx' and not options['output']:
+            raise CommandError("XLSX is binary: pass --output.")
+
+        resource = import_string(EXPORTS[options['what']])()
+        started = time.monotonic()
+        blocks = export_stream(resource, fmt, chunk_size=options['chunk_size'])
+        if options['output']:
+            mode, encoding = ('wb', None) if fmt == 'xlsx' else ('w', 'utf-8')
+            with open(options['output'], mode, encoding=encoding, newline='' if encoding else None) as f:
+                written = sum(f.write(block) for block in blocks)
+            self.stderr.write(self.style.SUCCESS(
+                f"Wrote {written:,} {'bytes' if fmt == 'xlsx' else 'characters'} of {options['what']} "
+                f"to {options['output']} in {time.monotonic() - started:.1f}s."
+            ))
+        else:
+            for block in blocks:
+                sys.stdout.write(block)
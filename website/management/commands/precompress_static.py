@@ -0,0 +1,63 @@
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.eot', '.otf'}
+MIN_SIZE = 256
+
+
+def _compress(path):
+    """Write path.gz (and path.br with the `brotli` package) if smaller; returns how many were written."""
+    original = os.stat(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    written = 0
+    variants = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda: brotli.compress(data, quality=11)))
+    for extension, compress in variants:
+        target = path + extension
+        try:
+            if os.stat(target).st_mtime_ns >= original.st_mtime_ns:
+                continue
+        except OSError:
+            pass
+        compressed = compress()
+        if len(compressed) >= len(data) * 0.95:
+            # Not worth a Content-Encoding; drop any stale variant.
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        with open(target, 'wb') as f:
+            f.write(compressed)
+        written += 1
+    return written
+
+
+class Command(BaseCommand):
+    help = "Write .gz (and .br, if the brotli package is installed) next to compressible files in STATIC_ROOT."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        paths = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(settings.STATIC_ROOT)
+            for name in names
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE and os.path.getsize(os.path.join(root, name)) >= MIN_SIZE
+        ]
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            written = sum(pool.map(_compress, paths))
+        if brotli is None:
+            self.stdout.write("brotli isn't installed; wrote gzip variants only.")
+        self.stdout.write(self.style.SUCCESS(f"Checked {len(paths)} files, wrote {written} compressed variants."))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from website.jobs import run_pending
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (admin imports and exports). Run from cron, or with --loop as a long-running worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help="Jobs run at the same time, one thread each.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new jobs instead of exiting.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            counts = run_pending(options['workers'])
+            if counts or not options['loop']:
+                summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items())) or "nothing to do"
+                self.stdout.write(self.style.SUCCESS(f"Ran jobs: {summary}."))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from website.outbox import send_due
+
+
+class Command(BaseCommand):
+    help = "Send queued order/contact emails. Run from cron, or with --loop as a long-running worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new emails instead of exiting.")
+        parser.add_argument('--interval', type=float, default=10, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_due(options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Sent {sent} emails ({failed} failed)."))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
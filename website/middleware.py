@@ -0,0 +1,183 @@
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+
+logger = logging.getLogger('website.requests')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    """SQL, template and Python time for one request, plus named sections."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_sql_time = 0.0
+        # name -> [queries, seconds]; e.g. one per context processor
+        self.sections = {}
+        self._open_sections = []
+        self._template_depth = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.sql_time += duration
+            if self._template_depth:
+                self.template_sql_time += duration
+            for section in self._open_sections:
+                section[0] += 1
+
+    def summary(self):
+        total = time.perf_counter() - self.started
+        template = self.template_time - self.template_sql_time
+        return {
+            'total_ms': round(total * 1000, 1),
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 1),
+            'template_ms': round(template * 1000, 1),
+            'python_ms': round(max(total - self.sql_time - template, 0) * 1000, 1),
+            'sections': {
+                name: {'queries': queries, 'ms': round(seconds * 1000, 1)}
+                for name, (queries, seconds) in self.sections.items()
+            },
+        }
+
+
+@contextmanager
+def track(name):
+    """Attribute the queries and time inside the block to `name` on the current request."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    section = metrics.sections.setdefault(name, [0, 0.0])
+    metrics._open_sections.append(section)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        section[1] += time.perf_counter() - started
+        metrics._open_sections.remove(section)
+
+
+def _tracked_processor(processor):
+    @wraps(processor)
+    def tracked(request):
+        with track(f'cp.{processor.__name__}'):
+            return processor(request)
+    return tracked
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        # Time only the outermost render; includes, extends and templates
+        # rendered from template tags run inside it.
+        metrics = _current.get()
+        if metrics is None or metrics._template_depth:
+            return super().render(context, request)
+        metrics._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            metrics._template_depth -= 1
+
+
+class MetricsDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, reporting to RequestMetricsMiddleware:
+    renders count as template time and each context processor as a
+    section of its own. Outside a request it adds nothing.
+    """
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.engine.template_context_processors = tuple(
+            _tracked_processor(processor) for processor in self.engine.template_context_processors
+        )
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def server_timing(summary):
+    metrics = [
+        f'total;dur={summary["total_ms"]}',
+        f'sql;dur={summary["sql_ms"]};desc="{summary["queries"]} queries"',
+        f'tpl;dur={summary["template_ms"]}',
+        f'py;dur={summary["python_ms"]}',
+    ]
+    for name, section in summary['sections'].items():
+        if not section['queries'] and section['ms'] < 0.1:
+            continue
+        metrics.append(f'{name};dur={section["ms"]};desc="{section["queries"]} queries"')
+    return ', '.join(metrics)
+
+
+class RequestMetricsMiddleware:
+    """
+    Counts queries and splits each request's time into SQL, template
+    rendering and Python, with context processors attributed separately
+    (the last two reported by the MetricsDjangoTemplates backend).
+
+    * logs one JSON line per request to the `website.requests` logger
+    * adds a Server-Timing header (visible in browser dev tools) when
+      settings.SERVER_TIMING is on
+    * checks settings.QUERY_BUDGETS ({view name: max queries}): over budget
+      logs a warning, or fails the request with QueryBudgetExceeded when
+      settings.QUERY_BUDGET_RAISE is on (the test runner turns it on)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        summary = metrics.summary()
+        view_name = request.resolver_match.view_name if request.resolver_match else None
+        logger.info(json.dumps({
+            'method': request.method, 'path': request.path, 'view': view_name,
+            'status': response.status_code, **summary,
+        }))
+        if getattr(settings, 'SERVER_TIMING', False):
+            response['Server-Timing'] = server_timing(summary)
+
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+        if budget is not None and summary['queries'] > budget:
+            message = f"{view_name} ran {summary['queries']} queries, budget is {budget} ({request.get_full_path()})"
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
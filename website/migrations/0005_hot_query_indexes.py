@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0004_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='banner',
+            index=models.Index(condition=models.Q(('for_mobile', False), ('is_active', True)), fields=['created_at'], name='banner_desktop_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='banner',
+            index=models.Index(condition=models.Q(('for_mobile', True), ('is_active', True)), fields=['created_at'], name='banner_mobile_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testimonial',
+            index=models.Index(condition=models.Q(('for_mobile', False), ('is_active', True)), fields=['created_at'], name='testimonial_desktop_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testimonial',
+            index=models.Index(condition=models.Q(('for_mobile', True), ('is_active', True)), fields=['created_at'], name='testimonial_mobile_idx'),
+        ),
+    ]
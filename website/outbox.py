@@ -0,0 +1,135 @@
+"""
+Outgoing email, sent by a worker instead of inside the request.
+
+Views call `queue_mail` (same arguments as django.core.mail.send_mail) in
+the transaction that saves the order or contact message, so the email
+exists exactly when the row it describes does. `manage.py send_outbox`
+then sends due emails in batches over one SMTP connection; failures are
+retried with exponential backoff and, after OUTBOX_MAX_ATTEMPTS, left as
+FAILED for someone to look at in the admin.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+
+logger = logging.getLogger(__name__)
+
+# How long a worker owns the emails it claimed; if it dies mid-batch
+# they become due again after this.
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def queue_mail(subject, message, from_email, recipient_list, html_message=None):
+    return OutboundEmail.objects.create(
+        subject=subject[:255],
+        body=message,
+        html_body=html_message or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(recipient_list),
+    )
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the `attempts`th failure: OUTBOX_RETRY_DELAY, doubled each time."""
+    return getattr(settings, 'OUTBOX_RETRY_DELAY', 60) * 2 ** (attempts - 1)
+
+
+def claim_due(batch_size, now=None):
+    """
+    Up to `batch_size` due emails, pushed CLAIM_TIMEOUT into the future so
+    other workers skip them. On databases with SKIP LOCKED, concurrent
+    workers never wait on each other's rows.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = OutboundEmail.objects.filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+        if db_connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        emails = list(due.order_by('next_attempt_at', 'id')[:batch_size])
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            next_attempt_at=now + CLAIM_TIMEOUT
+        )
+    return emails
+
+
+def _message(email, connection):
+    message = EmailMultiAlternatives(email.subject, email.body, email.from_email, email.to, connection=connection)
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def _mark_sent(email):
+    email.status = OutboundEmail.SENT
+    email.attempts += 1
+    email.sent_at = timezone.now()
+    email.last_error = ''
+    email.save(update_fields=['status', 'attempts', 'sent_at', 'last_error'])
+
+
+def _mark_failed(email, error):
+    email.attempts += 1
+    email.last_error = f'{type(error).__name__}: {error}'
+    if email.attempts >= getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8):
+        email.status = OutboundEmail.FAILED
+        logger.error("Giving up on email %s after %s attempts: %s", email.pk, email.attempts, email.last_error)
+    else:
+        email.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(email.attempts))
+        logger.warning("Email %s failed (attempt %s): %s", email.pk, email.attempts, email.last_error)
+    email.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error'])
+
+
+def send_emails(emails, connection=None):
+    """Send `emails` over one connection; returns (sent, failed)."""
+    connection = connection or get_connection()
+    sent = failed = 0
+    try:
+        connection.open()
+    except Exception as e:
+        # Server unreachable: the whole batch waits for the next attempt.
+        for email in emails:
+            _mark_failed(email, e)
+        return 0, len(emails)
+
+    try:
+        for email in emails:
+            try:
+                if not email.to:
+                    raise ValueError('no recipients')
+                connection.send_messages([_message(email, connection)])
+            except Exception as e:
+                failed += 1
+                _mark_failed(email, e)
+                # The SMTP session may be unusable now; the next send reconnects.
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            else:
+                sent += 1
+                _mark_sent(email)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+    return sent, failed
+
+
+def send_due(batch_size=50, connection=None):
+    """Send everything that is due, a batch at a time; returns (sent, failed)."""
+    sent = failed = 0
+    while True:
+        emails = claim_due(batch_size)
+        if not emails:
+            return sent, failed
+        batch_sent, batch_failed = send_emails(emails, connection)
+        sent += batch_sent
+        failed += batch_failed
@@ -0,0 +1,208 @@
+"""
+Static and media files for deployments without a separate file server.
+
+Replaces django.views.static.serve with:
+
+* precompressed variants: `app.css.br` / `app.css.gz` next to `app.css`
+  (see `manage.py precompress_static`) are sent to clients that accept them
+* far-future `immutable` caching for hashed names (`app.3f1a2b4c5d6e.css`)
+  and a short max-age for everything else
+* ETag/Last-Modified with 304s, and single-range `Range` requests
+* the file object handed to the WSGI server, so gunicorn & co. can use
+  sendfile() instead of copying through Python
+* optionally, only an `X-Accel-Redirect` header, leaving the body to nginx
+  (settings.STATIC_ACCEL_REDIRECT / MEDIA_ACCEL_REDIRECT)
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+
+# ManifestStaticFilesStorage and django-compressor both add 12 hex digits.
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Preferred first.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """`length` bytes of an open file from its current position; keeps fileno() for sendfile."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def _etag(stat_result, suffix=''):
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}{suffix}"'
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(mtime) <= since
+
+
+def _byte_range(request, size, etag, mtime):
+    """(start, end) inclusive for a satisfiable single Range, 'unsatisfiable', or None for the whole file."""
+    header = request.headers.get('Range')
+    if not header:
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range:
+        since = parse_http_date_safe(if_range)
+        if if_range != etag and (since is None or int(mtime) > since):
+            return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        # Malformed or multiple ranges: the whole file is a valid answer.
+        return None
+    start, end = match.groups()
+    if start == '':
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return 'unsatisfiable'
+    return start, end
+
+
+def _accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header; '*' stands for any coding not named."""
+    accepted = {}
+    for part in header.split(','):
+        coding, *params = [piece.strip() for piece in part.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def _pick_encoding(request, fullpath, original):
+    """(path, stat, encoding) of the best precompressed variant the client accepts."""
+    accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+    # The client's preference first, then ours; q=0 means "not this one".
+    candidates = [
+        (accepted.get(encoding, accepted.get('*', 0)), -rank, encoding, extension)
+        for rank, (encoding, extension) in enumerate(ENCODINGS)
+    ]
+    for q, _, encoding, extension in sorted(candidates, reverse=True):
+        if q <= 0:
+            break
+        try:
+            variant = os.stat(fullpath + extension)
+        except OSError:
+            continue
+        # A stale variant (original changed since) is ignored.
+        if variant.st_mtime_ns >= original.st_mtime_ns:
+            return fullpath + extension, variant, encoding
+    return fullpath, original, None
+
+
+def serve(request, path, document_root, max_age=0, accel_location=None):
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    try:
+        fullpath = safe_join(document_root, path)
+        original = os.stat(fullpath)
+    except (OSError, ValueError, SuspiciousFileOperation):
+        raise Http404(f"“{path}” does not exist")
+    if not stat.S_ISREG(original.st_mode):
+        raise Http404(f"“{path}” does not exist")
+
+    content_type, _ = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+    headers = {
+        'Cache-Control': IMMUTABLE if HASHED_NAME_RE.search(path) else f'public, max-age={max_age}',
+        'Vary': 'Accept-Encoding',
+        'Last-Modified': http_date(original.st_mtime),
+    }
+
+    if accel_location:
+        # nginx does ranges, conditionals and sendfile from an `internal` location.
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Accel-Redirect'] = accel_location.rstrip('/') + '/' + path.lstrip('/')
+        return response
+
+    # Ranges are served from the uncompressed file only.
+    filename, file_stat, encoding = fullpath, original, None
+    if 'Range' not in request.headers:
+        filename, file_stat, encoding = _pick_encoding(request, fullpath, original)
+    etag = _etag(file_stat, f'-{encoding}' if encoding else '')
+    headers['ETag'] = etag
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    if _not_modified(request, etag, original.st_mtime):
+        return HttpResponse(status=304, headers=headers)
+
+    size = file_stat.st_size
+    byte_range = None if encoding else _byte_range(request, size, etag, original.st_mtime)
+    if byte_range == 'unsatisfiable':
+        return HttpResponse(status=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+    headers['Accept-Ranges'] = 'bytes'
+
+    if request.method == 'HEAD':
+        return HttpResponse(content_type=content_type, headers={**headers, 'Content-Length': str(size)})
+
+    file = open(filename, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type, headers=headers)
+        response['Content-Length'] = str(size)
+        return response
+    start, end = byte_range
+    file.seek(start)
+    response = FileResponse(FileRange(file, end - start + 1), status=206, content_type=content_type, headers=headers)
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def serve_static(request, path):
+    return serve(
+        request, path, settings.STATIC_ROOT,
+        max_age=getattr(settings, 'STATIC_MAX_AGE', 3600),
+        accel_location=getattr(settings, 'STATIC_ACCEL_REDIRECT', None),
+    )
+
+
+def serve_media(request, path):
+    return serve(
+        request, path, settings.MEDIA_ROOT,
+        max_age=getattr(settings, 'MEDIA_MAX_AGE', 86400),
+        accel_location=getattr(settings, 'MEDIA_ACCEL_REDIRECT', None),
+    )
@@ -0,0 +1,49 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from products.models import Category, Product, ProductImage
+
+from .home import invalidate_home
+from .models import Banner, HomeComponents, Testimonial
+
+
+# Home page
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def invalidate_home_banners(sender, **kwargs):
+    invalidate_home('banners')
+
+
+@receiver(post_save, sender=Testimonial)
+@receiver(post_delete, sender=Testimonial)
+def invalidate_home_testimonials(sender, **kwargs):
+    invalidate_home('testimonials')
+
+
+@receiver(post_save, sender=HomeComponents)
+@receiver(post_delete, sender=HomeComponents)
+def invalidate_home_components(sender, **kwargs):
+    invalidate_home('components')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_home_products(sender, **kwargs):
+    invalidate_home('products')
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def invalidate_home_product_categories(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_home('products')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_home_categories(sender, **kwargs):
+    # Cards list category names and components their category's; the
+    # category strip itself comes from the category tree.
+    invalidate_home('products', 'components')
@@ -0,0 +1,11 @@
+from django import template
+
+from website import assets
+
+register = template.Library()
+
+
+@register.simple_tag
+def bundle_url(name):
+    """{% bundle_url 'site.js' as site_js %}: empty when the page should load the source files."""
+    return assets.bundle_url(name)
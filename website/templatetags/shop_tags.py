@@ -1,6 +1,8 @@
 from django import template
 from urllib.parse import urlencode
 
+from products import renditions
+
 register = template.Library()
 
 @register.simple_tag(takes_context=True)
@@ -51,4 +53,16 @@ def mask_name(full_name):
         last_initial = first_initial # Or handle as needed if only a single name is provided
 
     # Construct the masked name using 5 asterisks for consistency
-    return f"{first_initial}*****{last_initial}"
\ No newline at end of file
+    return f"{first_initial}*****{last_initial}"
+
+
+@register.filter
+def rendition_url(image, rendition='card'):
+    """{{ product.primary_image.image|rendition_url:'thumb' }} -> resized WebP URL."""
+    return renditions.rendition_url(image, rendition)
+
+
+@register.simple_tag
+def rendition_sources(image, rendition='card'):
+    """{% rendition_sources image 'card' as sources %} for <source> tags in a <picture>."""
+    return renditions.rendition_sources(image, rendition)
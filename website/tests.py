@@ -1,3 +1,571 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import smtplib
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from multi_vendor_site import exports
+from multi_vendor_site.caching import Namespace, read_stats, reset_stats
+from orders.inventory import reserve_stock
+from orders.models import OrderItem
+from products.models import Category, Product, ProductImage, ProductVariation
+from .middleware import QueryBudgetExceeded
+from .jobs import HANDLERS, STALE_AFTER, cancel, claim_next, fail_stale, job_storage, register, run_pending, submit
+from .models import Contact, HomeComponents, Job, OutboundEmail, Testimonial
+from .outbox import claim_due, queue_mail, send_due
+
+
+class CategoryTreeContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def add_categories(self, start, stop):
+        for i in range(start, stop):
+            parent = Category.objects.create(name=f'Parent {i}')
+            child = Category.objects.create(name=f'Child {i}', parent=parent, group_name='Group')
+            Category.objects.create(name=f'Grandchild {i}', parent=child)
+
+    def test_templated_page_query_count_is_constant(self):
+        self.add_categories(0, 2)
+        self.client.get(reverse('website:about'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('website:about'))
+        self.assertContains(response, 'parent-1/child-1/grandchild-1')
+
+        # A category write invalidates the snapshot: one query rebuilds it,
+        # however many categories there are.
+        self.add_categories(2, 20)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('website:about'))
+        self.assertContains(response, 'parent-19/child-19/grandchild-19')
+        with self.assertNumQueries(0):
+            self.client.get(reverse('website:about'))
+
+    def test_untemplated_responses_skip_the_tree(self):
+        self.add_categories(0, 2)
+        with self.assertNumQueries(0):
+            self.client.post(
+                reverse('website:wishlist_products_api'), data={'product_ids': []}, content_type='application/json'
+            )
+
+
+class CacheLayerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ns = Namespace('tests', timeout=60)
+
+    def test_keys_are_versioned(self):
+        self.ns.set('a', 1)
+        self.assertEqual(self.ns.get('a'), 1)
+        self.assertTrue(self.ns.key('a').startswith(f'tests:{self.ns.version()}:'))
+        self.ns.bump()
+        self.assertIsNone(self.ns.get('a'))
+        self.assertEqual(self.ns.get_or_set('a', lambda: None), None)
+
+    def test_cold_key_is_computed_once(self):
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.ns.get_or_set('cold', slow))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(len(calls), 1)
+
+    def test_expiring_value_is_refreshed_early(self):
+        # Took 10s to compute and expires in a second: refresh now.
+        cache.set(self.ns.key('warm'), ('old', 10.0, time.time() + 1), 60)
+        self.assertEqual(self.ns.get_or_set('warm', lambda: 'new', beta=1e6), 'new')
+        # Fresh values are left alone.
+        self.assertEqual(self.ns.get_or_set('warm', lambda: 'newer'), 'new')
+
+    def test_stats(self):
+        reset_stats()
+        self.ns.get_or_set('a', lambda: 1)
+        self.ns.get_or_set('a', lambda: 1)
+        self.ns.get('b')
+        self.assertEqual(read_stats()['tests'], {'hits': 1, 'misses': 2, 'refreshes': 0, 'waits': 0})
+        out = StringIO()
+        call_command('cache_stats', '--reset', stdout=out, stderr=StringIO())
+        self.assertRegex(out.getvalue(), r'tests\s+1\s+2\s+0\s+0\s+33.3%')
+        self.assertEqual(read_stats(), {})
+
+
+class HomePageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def add_products(self, count):
+        parent = Category.objects.create(name='Women')
+        child = Category.objects.create(name='Dresses', parent=parent)
+        for i in range(count):
+            product = Product.objects.create(name=f'Dress {i}', regular_price=10, is_featured=i % 2 == 0)
+            product.categories.add(child)
+            ProductImage.objects.create(product=product, image=f'product_images/{i}.jpg')
+        return child
+
+    def test_product_cards_are_bounded(self):
+        self.add_products(40)
+        self.client.get(reverse('website:home'))
+        cache.clear()
+
+        # 40 cards, but images are joined in and categories prefetched per list.
+        with self.assertNumQueries(10):
+            response = self.client.get(reverse('website:home'))
+        self.assertContains(response, 'product_images/39.jpg')
+
+    def test_cached_until_content_changes(self):
+        category = self.add_products(3)
+        HomeComponents.objects.create(title='Evening', image='home_components/1.jpg', category=category)
+        self.client.get(reverse('website:home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('website:home'))
+        self.assertContains(response, reverse('website:category_detail', kwargs={'full_slug': 'women/dresses'}))
+
+        # Each write reloads only the sections it shows up in.
+        Testimonial.objects.create(image='testimonials/1.jpg')
+        with self.assertNumQueries(2):
+            self.client.get(reverse('website:home'))
+
+        Product.objects.create(name='Fresh dress', regular_price=10, is_featured=True)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('website:home'))
+        self.assertContains(response, 'Fresh dress')
+
+        category.name = 'Gowns'
+        category.save()
+        response = self.client.get(reverse('website:home'))
+        self.assertContains(response, 'Gowns')
+        with self.assertNumQueries(0):
+            self.client.get(reverse('website:home'))
+
+
+class ProductDetailCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.women = Category.objects.create(name='Women')
+        self.dresses = Category.objects.create(name='Dresses', parent=self.women)
+        self.dress = Product.objects.create(name='Dress', regular_price=100, stock_quantity=3)
+        self.dress.categories.add(self.dresses)
+        self.red = ProductVariation.objects.create(product=self.dress, color='Red', size='M', price=120, stock=2)
+        ProductVariation.objects.create(product=self.dress, color='Red', size='L', price=130, stock=1)
+        ProductImage.objects.create(product=self.dress, image='product_images/dress.jpg')
+
+    def get(self, slug=None):
+        return self.client.get(reverse('website:product_detail', kwargs={'slug': slug or self.dress.slug}))
+
+    def test_warm_page_runs_no_queries(self):
+        response = self.get()
+        self.assertEqual(response.context['colors'], ['Red'])
+        self.assertEqual(response.context['sizes'], ['M', 'L'])
+        self.assertIn('"price": 120.0', response.context['variations_json'])
+        with self.assertNumQueries(0):
+            response = self.get()
+        self.assertContains(response, 'women/dresses')
+        self.assertContains(response, 'product_images/dress.jpg')
+
+    def test_writes_invalidate_the_product(self):
+        self.get()
+        self.red.price = 99
+        self.red.save()
+        self.assertIn('"price": 99.0', self.get().context['variations_json'])
+
+        self.dresses.name = 'Gowns'
+        self.dresses.save()
+        self.assertContains(self.get(), 'Gowns')
+
+        old_slug = self.dress.slug
+        self.dress.slug = 'red-dress'
+        self.dress.save()
+        self.assertEqual(self.get(old_slug).status_code, 404)
+        self.assertEqual(self.get('red-dress').status_code, 200)
+
+    def test_stock_changes_invalidate_the_product(self):
+        self.get()
+        reserve_stock([OrderItem(product=self.dress, variation=self.red, quantity=2)])
+        self.assertIn('"stock": 0', self.get().context['variations_json'])
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.women = Category.objects.create(name='Women')
+        self.dress = Product.objects.create(name='Dress', regular_price=100)
+        self.dress.categories.add(self.women)
+        ProductVariation.objects.create(product=self.dress, color='Red', size='M', stock=2)
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing_attributes_context_processors(self):
+        with self.assertLogs('website.requests', 'INFO') as logs:
+            response = self.client.get(reverse('website:about'))
+        timing = response['Server-Timing']
+        self.assertIn('sql;dur=', timing)
+        self.assertIn('tpl;dur=', timing)
+        # The cold category tree is one query, charged to the navbar's processor.
+        self.assertIn('cp.mega_menu_categories;dur=', timing)
+        self.assertIn('desc="1 queries"', timing)
+        self.assertIn('"view": "website:about"', logs.output[0])
+        self.assertGreater(json.loads(logs.output[0].split(':', 2)[2])['template_ms'], 0)
+
+    @override_settings(QUERY_BUDGET_RAISE=True, QUERY_BUDGETS={'website:about': 0})
+    def test_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('website:about'))
+        self.client.get(reverse('website:about'))
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_storefront_stays_within_budget(self):
+        for url in [
+            reverse('website:home'),
+            reverse('website:shop') + '?color=Red&size=M&min_price=1&max_price=500&sort_by=price',
+            reverse('website:search') + '?search=dress',
+            reverse('website:category_detail', kwargs={'full_slug': 'women'}) + '?subcategories=1',
+            reverse('website:product_detail', kwargs={'slug': self.dress.slug}),
+        ]:
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+
+class FlakyBackend(EmailBackend):
+    """locmem, except mail to @down.example is refused; counts connections opened."""
+    opened = 0
+
+    def open(self):
+        FlakyBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.endswith('@down.example') for address in message.to):
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b'mailbox unavailable')})
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='website.tests.FlakyBackend', OUTBOX_MAX_ATTEMPTS=3, OUTBOX_RETRY_DELAY=60)
+class OutboxTests(TestCase):
+    def setUp(self):
+        FlakyBackend.opened = 0
+
+    def test_contact_form_queues_instead_of_sending(self):
+        response = self.client.post(reverse('website:contact'), {'name': 'Karim', 'email': 'k@example.com', 'message': 'Hi'})
+        self.assertRedirects(response, reverse('website:contact'))
+        self.assertTrue(Contact.objects.exists())
+        self.assertEqual(mail.outbox, [])
+
+        call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(mail.outbox[0].subject, 'New Contact Form Submission: Karim')
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.SENT)
+
+    def test_batches_share_a_connection(self):
+        for i in range(5):
+            queue_mail(f'Order {i}', 'body', None, ['sales@example.com'], html_message='<p>body</p>')
+        self.assertEqual(send_due(batch_size=2), (5, 0))
+        self.assertEqual(FlakyBackend.opened, 3)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertEqual(send_due(), (0, 0))
+
+    def test_failures_back_off_then_dead_letter(self):
+        with self.assertLogs('website.outbox', 'WARNING') as logs:
+            bad = queue_mail('Bounces', 'body', None, ['nobody@down.example'])
+            good = queue_mail('Fine', 'body', None, ['sales@example.com'])
+            self.assertEqual(send_due(), (1, 1))
+            bad.refresh_from_db()
+            self.assertEqual((bad.status, bad.attempts), (OutboundEmail.PENDING, 1))
+            self.assertIn('SMTPRecipientsRefused', bad.last_error)
+            # Not due again until the delay has passed, and the delay doubles.
+            self.assertEqual(send_due(), (0, 0))
+            for attempt, delay in [(2, 60), (3, 120)]:
+                self.assertAlmostEqual((bad.next_attempt_at - timezone.now()).total_seconds(), delay, delta=5)
+                OutboundEmail.objects.filter(pk=bad.pk).update(next_attempt_at=timezone.now())
+                send_due()
+                bad.refresh_from_db()
+                self.assertEqual(bad.attempts, attempt)
+            self.assertEqual(bad.status, OutboundEmail.FAILED)
+        self.assertIn('Giving up on email', logs.output[-1])
+        good.refresh_from_db()
+        self.assertEqual((good.status, good.attempts), (OutboundEmail.SENT, 1))
+
+    def test_claimed_emails_are_skipped_by_other_workers(self):
+        queue_mail('Order', 'body', None, ['sales@example.com'])
+        self.assertEqual(len(claim_due(10)), 1)
+        self.assertEqual(claim_due(10), [])
+        # A worker that died mid-batch hands its emails back after the claim expires.
+        self.assertEqual(len(claim_due(10, now=timezone.now() + timedelta(minutes=6))), 1)
+
+
+class HotQueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        women = Category.objects.create(name='Women')
+        for i in range(3):
+            product = Product.objects.create(name=f'Dress {i}', regular_price=100 + i, is_featured=True)
+            product.categories.add(women)
+            ProductVariation.objects.create(product=product, color='Red', size='M')
+        out = StringIO()
+        call_command('explain_hot_queries', '--strict', stdout=out)
+        self.assertIn('shop: sort price, page 2: ok', out.getvalue())
+        self.assertNotIn('sorts without an index', out.getvalue())
+
+
+class FileServingTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        self.css = b'body { color: red; }\n' * 100
+        for name in ('app.css', 'app.0123456789ab.css'):
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(self.css)
+        settings = self.settings(STATIC_ROOT=self.root, STATIC_MAX_AGE=60)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def get(self, path, **headers):
+        response = self.client.get(f'/static/{path}', headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_cache_headers_and_conditional_requests(self):
+        response, body = self.get('app.0123456789ab.css')
+        self.assertEqual(body, self.css)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(self.get('app.css')[0]['Cache-Control'], 'public, max-age=60')
+
+        response, body = self.get('app.css', if_none_match=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        etag = self.get('app.css')[0]['ETag']
+        self.assertEqual(self.get('app.css', if_none_match=etag)[0].status_code, 304)
+        self.assertEqual(self.get('app.css', if_modified_since=response['Last-Modified'])[0].status_code, 304)
+        self.assertEqual(self.get('../settings.py')[0].status_code, 404)
+
+    def test_precompressed_variants(self):
+        call_command('precompress_static', stdout=StringIO())
+        response, body = self.get('app.css', accept_encoding='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertEqual(gzip.decompress(body), self.css)
+        # Clients that don't accept it, and range requests, get the original.
+        self.assertEqual(self.get('app.css')[1], self.css)
+        self.assertNotIn('Content-Encoding', self.get('app.css', accept_encoding='gzip;q=0, deflate')[0])
+        self.assertNotIn('Content-Encoding', self.get('app.css', accept_encoding='*, gzip;q=0')[0])
+        self.assertEqual(self.get('app.css', accept_encoding='*;q=0.5, identity')[0]['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Encoding', self.get('app.css', accept_encoding='gzip', range='bytes=0-9')[0])
+
+    def test_ranges(self):
+        response, body = self.get('app.css', range='bytes=5-14')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.css[5:15])
+        self.assertEqual(response['Content-Range'], f'bytes 5-14/{len(self.css)}')
+        self.assertEqual(self.get('app.css', range='bytes=-4')[1], self.css[-4:])
+        self.assertEqual(self.get('app.css', range=f'bytes={len(self.css)}-')[0].status_code, 416)
+        # A changed file answers If-Range with the whole thing.
+        response, body = self.get('app.css', range='bytes=0-1', if_range='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.css))
+
+    def test_accel_redirect(self):
+        with self.settings(STATIC_ACCEL_REDIRECT='/_protected/static/'):
+            response, body = self.get('app.0123456789ab.css')
+        self.assertEqual(response['X-Accel-Redirect'], '/_protected/static/app.0123456789ab.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(body, b'')
+
+
+FAKE_TAILWIND = """
+import sys
+args = sys.argv[1:]
+with open(args[args.index('-o') + 1], 'w') as f:
+    f.write('.flex{display:flex}')
+"""
+
+
+class AssetBundleTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        settings = self.settings(STATIC_ROOT=self.root, USE_ASSET_BUNDLES=True, TAILWIND_CLI='no-such-tailwindcss')
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def build(self, *args):
+        call_command('build_assets', *args, stdout=StringIO(), stderr=StringIO())
+        with open(os.path.join(self.root, 'bundles', 'manifest.json')) as f:
+            return json.load(f)['bundles']
+
+    def test_build_writes_hashed_minified_bundles(self):
+        bundles = self.build()
+        self.assertEqual(set(bundles), {'head.js', 'site.js', 'site.css'})
+        self.assertRegex(bundles['site.js'], r'^bundles/site\.[0-9a-f]{12}\.js$')
+        with open(os.path.join(self.root, bundles['site.js'])) as f:
+            site_js = f.read()
+        self.assertIn('updateCartSidebar', site_js)
+        self.assertNotIn('// Toggle sidebar open/close', site_js)
+        self.assertTrue(os.path.exists(os.path.join(self.root, bundles['site.js'] + '.gz')))
+        # Same sources, same names.
+        self.assertEqual(self.build(), bundles)
+
+    def test_pages_use_bundles_when_built(self):
+        response = self.client.get(reverse('website:about'))
+        self.assertContains(response, '/static/js/cart.js')
+        self.assertContains(response, '/static/js/tailwind.js')
+
+        bundles = self.build()
+        response = self.client.get(reverse('website:about'))
+        self.assertContains(response, f'/static/{bundles["site.js"]}')
+        self.assertContains(response, f'/static/{bundles["site.css"]}')
+        self.assertNotContains(response, '/static/js/cart.js')
+        # No Tailwind CLI here: the in-browser compiler stays.
+        self.assertContains(response, '/static/js/tailwind.js')
+
+        with self.settings(USE_ASSET_BUNDLES=False):
+            self.assertContains(self.client.get(reverse('website:about')), '/static/js/cart.js')
+
+    def test_tailwind_cli_build_replaces_runtime_compiler(self):
+        script = os.path.join(self.root, 'tailwindcss.py')
+        with open(script, 'w') as f:
+            f.write(FAKE_TAILWIND)
+        with self.settings(TAILWIND_CLI=f'{sys.executable} {script}'):
+            bundles = self.build()
+        with open(os.path.join(self.root, bundles['tailwind.css'])) as f:
+            self.assertEqual(f.read(), '.flex{display:flex}')
+        response = self.client.get(reverse('website:about'))
+        self.assertContains(response, f'/static/{bundles["tailwind.css"]}')
+        self.assertNotContains(response, '/static/js/tailwind.js')
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        job_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, job_root)
+        settings_override = self.settings(JOB_FILES_ROOT=job_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(self.admin)
+
+    def register(self, kind, handler):
+        register(kind)(handler)
+        self.addCleanup(HANDLERS.pop, kind)
+
+    def test_export_job_writes_a_file_the_admin_serves(self):
+        for i in range(3):
+            Product.objects.create(name=f'Dress {i}', regular_price=10)
+        response = self.client.post(reverse('admin:products_product_changelist'), {
+            'action': 'export_in_background', '_selected_action': list(Product.objects.values_list('pk', flat=True)[:2]),
+        })
+        self.assertEqual(response.status_code, 302)
+        job = Job.objects.get()
+        self.assertEqual((job.kind, job.status, job.created_by), ('export', Job.QUEUED, self.admin))
+
+        call_command('run_jobs', workers=1, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.done, job.total, job.result['rows']), (Job.SUCCEEDED, 2, 2, 2))
+        response = self.client.get(reverse('admin:website_job_download', args=[job.pk]))
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 3)
+        self.assertEqual(self.client.get(reverse('admin:website_job_changelist')).status_code, 200)
+
+    def test_background_export_of_everything_stores_no_ids(self):
+        for i in range(3):
+            Product.objects.create(name=f'Dress {i}', regular_price=10, is_active=i > 0)
+        changelist = reverse('admin:products_product_changelist')
+        self.client.post(changelist, {
+            'action': 'export_in_background', 'select_across': '1', '_selected_action': [Product.objects.first().pk],
+        })
+        self.assertIsNone(Job.objects.get().params['pks'])
+
+        self.addCleanup(setattr, exports, 'MAX_BACKGROUND_SELECTION', exports.MAX_BACKGROUND_SELECTION)
+        exports.MAX_BACKGROUND_SELECTION = 1
+        response = self.client.post(changelist + '?is_active__exact=1', {
+            'action': 'export_in_background', 'select_across': '1', '_selected_action': [Product.objects.first().pk],
+        }, follow=True)
+        self.assertContains(response, '2 rows selected')
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_download_needs_view_permission_on_the_exported_model(self):
+        job = submit('export', what='orders')
+        run_pending()
+        staff = get_user_model().objects.create_user('staff', password='pw', is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename='view_job'))
+        self.client.force_login(staff)
+        download = reverse('admin:website_job_download', args=[job.pk])
+        self.assertEqual(self.client.get(download).status_code, 403)
+
+        staff.user_permissions.add(Permission.objects.get(codename='view_ecommercecheckouts'))
+        self.assertEqual(self.client.get(download).status_code, 200)
+
+    def test_import_job_submitted_from_the_admin(self):
+        self.assertEqual(self.client.get(reverse('admin:website_job_add')).status_code, 200)
+        csv = 'name,slug,regular_price,category_names\nRed Dress,red-dress,120,Dresses\nShirt,shirt,80,Men\n'
+        response = self.client.post(reverse('admin:website_job_add'), {
+            'file': SimpleUploadedFile('catalog.csv', csv.encode()), 'batch_size': 1,
+        })
+        self.assertEqual(response.status_code, 302)
+        job = Job.objects.get()
+        self.assertEqual(job.kind, 'import_products')
+        self.assertTrue(job_storage().exists(job.params['file']))
+
+        self.assertEqual(run_pending(), {Job.SUCCEEDED: 1})
+        job.refresh_from_db()
+        self.assertEqual((job.done, job.total, job.result['products_created']), (2, 2, 2))
+        self.assertEqual(Product.objects.get(slug='shirt').categories.get().name, 'Men')
+        self.assertEqual(self.client.get(reverse('admin:website_job_change', args=[job.pk])).status_code, 200)
+
+    def test_cancel_queued_and_running_jobs(self):
+        def long_job(job, progress):
+            for done in range(100):
+                if done == 3:
+                    cancel(Job.objects.filter(pk=job.pk))
+                progress(done, 100, force=True)
+        self.register('long', long_job)
+
+        queued = submit('long')
+        self.assertEqual(cancel(Job.objects.filter(pk=queued.pk)), 1)
+        self.assertIsNone(claim_next())
+
+        running = submit('long')
+        self.assertEqual(run_pending(), {Job.CANCELLED: 1})
+        running.refresh_from_db()
+        self.assertEqual((running.status, running.done), (Job.CANCELLED, 3))
+
+    def test_failures_and_lost_workers_are_recorded(self):
+        def broken(job, progress):
+            raise RuntimeError('disk full')
+        self.register('broken', broken)
+
+        job = submit('broken')
+        with self.assertLogs('website.jobs', 'ERROR'):
+            run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('RuntimeError: disk full', job.error)
+
+        stuck = submit('broken')
+        self.assertEqual(claim_next(), stuck)
+        self.assertEqual(fail_stale(timezone.now() + STALE_AFTER + timedelta(seconds=1)), 1)
+        self.assertEqual(Job.objects.get(pk=stuck.pk).status, Job.FAILED)